@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - キーワード検出ベンチマーク
+共有のキーワード分類（MultiPatternMatcher）と、従来の any(k in text) ループの処理時間を比較する
+
+使い方:
+    python bench_matcher.py                # ニュース項目程度の短いテキストで計測
+    python bench_matcher.py --repeat 2000  # 計測回数を指定
+    python bench_matcher.py --pages        # 保存済みページ（bench_pages/）のテキストでも計測
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import keyword_matcher
+from keyword_matcher import KEYWORD_CATEGORIES, KeywordClassifier
+
+DEFAULT_PAGES_DIR = 'bench_pages'
+
+# ニュース一覧の項目（タイトル＋説明文）に相当するテキスト
+SAMPLE_TEXTS = [
+    "Meeting highlights from the Committee for Medicinal Products for Human Use (CHMP) 22-25 January 2024",
+    "EMA recommends approval of new medicine for treatment of rare form of cancer after positive opinion",
+    "New safety information for healthcare professionals on the use of antiviral medicines in children",
+    "Phase III clinical trial results support conditional marketing authorisation of novel therapy",
+    "Management Board meeting: highlights of the March meeting and budget for the coming year",
+    "Shortage of antibiotic medicines: EMA publishes recommendations to prevent future supply disruptions",
+]
+
+def time_call(function, texts, repeat):
+    """テキスト1件あたりの処理時間の最小値（マイクロ秒、他の処理の影響を受けにくい）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            function(text)
+        samples.append((time.perf_counter() - start) * 1e6 / len(texts))
+    return min(samples)
+
+def make_cases(classifier):
+    """(名前, 従来のループ, マッチャー) の組を作成（EMAScraperとDiscordNotifierの呼び出し箇所に合わせる）"""
+    approval_keywords = KEYWORD_CATEGORIES['approval_news']
+    categories = ('clinical', 'drug', 'approval', 'company')
+    all_keywords = [keyword for name in categories for keyword in KEYWORD_CATEGORIES[name]]
+
+    def approval_loop(text):
+        content_text = text.lower()
+        return any(keyword in content_text for keyword in approval_keywords)
+
+    def keywords_loop(text):
+        text_lower = text.lower()
+        return list(set(keyword.title() for keyword in all_keywords if keyword in text_lower))
+
+    return [
+        ('承認関連の判定', approval_loop,
+         lambda text: classifier.has_any(text, 'approval_news')),
+        ('キーワード抽出', keywords_loop,
+         lambda text: [keyword.title() for keyword in classifier.keywords(text, *categories)]),
+    ]
+
+def run(label, texts, repeat):
+    """利用できるバックエンドごとに計測して表示"""
+    backends = [('部分文字列検索', None)]
+    if keyword_matcher.ahocorasick is not None:
+        backends.insert(0, ('Aho-Corasick', keyword_matcher.ahocorasick))
+
+    print(f"\n=== {label} ({len(texts)}件, 平均 {sum(map(len, texts)) // len(texts)} 文字) ===")
+    saved = keyword_matcher.ahocorasick
+    try:
+        for backend_name, module in backends:
+            keyword_matcher.ahocorasick = module
+            classifier = KeywordClassifier(KEYWORD_CATEGORIES)
+            for case_name, loop, matcher in make_cases(classifier):
+                loop_us = time_call(loop, texts, repeat)
+                matcher_us = time_call(matcher, texts, repeat)
+                print(f"{backend_name:>13} {case_name}: any()ループ {loop_us:8.1f} µs / "
+                      f"マッチャー {matcher_us:8.1f} µs ({loop_us / matcher_us:.2f}倍)")
+    finally:
+        keyword_matcher.ahocorasick = saved
+
+def load_page_texts(pages_dir):
+    """保存済みページの本文テキスト"""
+    from bs4 import BeautifulSoup
+
+    texts = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+        with open(path, 'rb') as f:
+            texts.append(' '.join(BeautifulSoup(f.read(), 'html.parser').get_text().split()))
+    return texts
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='キーワード検出ベンチマーク')
+    arg_parser.add_argument('--repeat', type=int, default=500, help='計測回数')
+    arg_parser.add_argument('--pages', action='store_true', help='保存済みページのテキストでも計測')
+    arg_parser.add_argument('--pages-dir', default=DEFAULT_PAGES_DIR, help='保存済みページのディレクトリ')
+    args = arg_parser.parse_args()
+
+    run('ニュース項目', SAMPLE_TEXTS, args.repeat)
+    # ページ1枚分に相当する長いテキスト
+    run('長いテキスト', [' '.join(SAMPLE_TEXTS * 40)], max(1, args.repeat // 10))
+    if args.pages:
+        texts = load_page_texts(args.pages_dir)
+        if not texts:
+            print(f"❌ {args.pages_dir} に保存済みページがありません（python bench_parser.py --save）")
+            return
+        run('保存済みページ', texts, max(1, args.repeat // 10))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - パーサーベンチマーク
+保存済みのEMAページを使って、lxmlとBeautifulSoupの解析時間を比較する
+
+使い方:
+    python bench_parser.py --save          # EMAページを取得して bench_pages/ に保存
+    python bench_parser.py --repeat 20     # 保存済みページで計測
+    python bench_parser.py --processes 4   # プロセスプールでの一括解析と比較
+"""
+
+import argparse
+import glob
+import logging
+import os
+import statistics
+import sys
+import time
+
+from html_parsers import PARSER_BACKENDS, get_parser_backend
+from scraper import EMAScraper
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGES_DIR = 'bench_pages'
+
+def save_pages(pages_dir):
+    """ベンチマーク用にEMAページを取得して保存"""
+    scraper = EMAScraper(cache_file=None)
+    targets = {
+        'news.html': scraper.news_url,
+        'chmp_search.html': f"{scraper.base_url}/en/search?search_api_views_fulltext=CHMP%20highlights",
+    }
+
+    os.makedirs(pages_dir, exist_ok=True)
+    for file_name, url in targets.items():
+        response = scraper.session.get(url, timeout=30)
+        response.raise_for_status()
+        path = os.path.join(pages_dir, file_name)
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        print(f"✅ 保存: {path} ({len(response.content)} バイト)")
+
+def time_backend(backend_name, content, repeat):
+    """指定バックエンドの解析時間と抽出込みの時間を計測（ミリ秒）"""
+    scraper = EMAScraper(cache_file=None, parser=backend_name)
+    parser = scraper.parser
+
+    parse_times = []
+    total_times = []
+    item_count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        doc = parser.parse(content)
+        parsed = time.perf_counter()
+        items = scraper._extract_news_items(doc, parser)
+        finished = time.perf_counter()
+
+        parse_times.append((parsed - start) * 1000)
+        total_times.append((finished - start) * 1000)
+        item_count = len(items)
+
+    return statistics.median(parse_times), statistics.median(total_times), item_count
+
+def time_pool(contents, copies, processes):
+    """ニュース一覧の一括解析をスレッド内とプロセスプールで比較（1ページあたりのミリ秒）"""
+    from parse_pool import ParsePool
+    from scraper import parse_listing_page
+
+    pages = [(f"page-{i}", content) for i in range(copies) for content in contents]
+    parser = get_parser_backend('lxml')
+    start = time.perf_counter()
+    for _, content in pages:
+        parse_listing_page(parser, content)
+    serial_ms = (time.perf_counter() - start) * 1000 / len(pages)
+
+    with ParsePool(processes) as pool:
+        # プロセスの起動時間を除くため1回目は計測しない
+        pool.map('ema_news', pages[:processes])
+        start = time.perf_counter()
+        pool.map('ema_news', pages)
+        pool_ms = (time.perf_counter() - start) * 1000 / len(pages)
+    return serial_ms, pool_ms
+
+def main():
+    """メイン処理"""
+    arg_parser = argparse.ArgumentParser(description='EMAページ解析のパーサー別ベンチマーク')
+    arg_parser.add_argument('--pages', default=DEFAULT_PAGES_DIR, help='保存済みHTMLのディレクトリ')
+    arg_parser.add_argument('--save', action='store_true', help='EMAページを取得して保存する')
+    arg_parser.add_argument('--repeat', type=int, default=10, help='ページごとの計測回数')
+    arg_parser.add_argument('--processes', type=int, default=0, help='プロセスプールでの一括解析と比較する場合のプロセス数')
+    arg_parser.add_argument('--copies', type=int, default=50, help='一括解析で各ページを複製する数')
+    args = arg_parser.parse_args()
+
+    if args.save:
+        save_pages(args.pages)
+
+    pages = sorted(glob.glob(os.path.join(args.pages, '*.html')))
+    if not pages:
+        print(f"❌ {args.pages}/ に保存済みページがありません（--save で取得してください）")
+        return False
+
+    # lxmlが無い環境では比較対象から外す
+    backends = [name for name in PARSER_BACKENDS if get_parser_backend(name).name == name]
+
+    print(f"📊 パーサーベンチマーク（中央値, {args.repeat}回計測）")
+    for path in pages:
+        with open(path, 'rb') as f:
+            content = f.read()
+        print(f"\n📄 {os.path.basename(path)} ({len(content) / 1024:.1f} KiB)")
+
+        results = {}
+        for name in backends:
+            parse_ms, total_ms, item_count = time_backend(name, content, args.repeat)
+            results[name] = total_ms
+            print(f"  - {name:5s}: 解析 {parse_ms:8.2f} ms / 解析+抽出 {total_ms:8.2f} ms ({item_count}件)")
+
+        if 'bs4' in results and 'lxml' in results and results['lxml'] > 0:
+            print(f"  ⚡ lxmlはBeautifulSoupの {results['bs4'] / results['lxml']:.1f} 倍高速")
+
+    if args.processes > 0:
+        contents = []
+        for path in pages:
+            with open(path, 'rb') as f:
+                contents.append(f.read())
+        serial_ms, pool_ms = time_pool(contents, args.copies, args.processes)
+        print(f"\n🧵 一括解析（{len(contents) * args.copies}ページ, 1ページあたり）")
+        print(f"  - スレッド内         : {serial_ms:8.2f} ms")
+        print(f"  - {args.processes}プロセス          : {pool_ms:8.2f} ms")
+        if pool_ms > 0:
+            print(f"  ⚡ プロセスプールは {serial_ms / pool_ms:.1f} 倍")
+
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - オフライン再生ベンチマーク
+記録したEMAのレスポンスをローカルのHTTPサーバーから再生し、スクレイパーの処理時間を計測する
+
+使い方:
+    python bench_replay.py --record         # EMAのレスポンスを bench_corpus/ に記録
+    python bench_replay.py --repeat 20      # 記録済みのレスポンスを再生して計測
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+
+from cbp501_scraper import CBP501Scraper
+from html_parsers import parse_document
+from keyword_matcher import KEYWORD_CLASSIFIER
+from preflight import MONITORED_URLS
+from scraper import EMAScraper
+from watchlist import DEFAULT_WATCH_RULES, Watchlist
+
+try:
+    import resource
+except ImportError:  # Windowsでは最大RSSを計測しない
+    resource = None
+
+# 再生中の警告（治験情報取得の失敗など）で出力が埋もれないようにする
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS_DIR = 'bench_corpus'
+MANIFEST_FILE = 'manifest.json'
+
+def _request_key(url):
+    """URLからパス+クエリのキーを作成（再生時のリクエストパスと一致させる）"""
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+def record_targets():
+    """記録対象のURL一覧（各スクレイパーが実際に取得するURL）"""
+    scraper = EMAScraper(cache_file=None)
+    urls = [
+        scraper.feed.feed_url,
+        scraper.news_url,
+        f"{scraper.base_url}/en/search?search_api_views_fulltext=CHMP%20highlights",
+    ]
+    for url in MONITORED_URLS:
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+def record_corpus(corpus_dir):
+    """EMAのレスポンスを取得してコーパスとして保存"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    session = requests.Session()
+    session.headers.update({'User-Agent': 'EMA-Monitor-Bench/1.0'})
+
+    manifest = {}
+    for url in record_targets():
+        response = session.get(url, timeout=30)
+        if response.status_code != 200:
+            print(f"⚠️ 記録できませんでした: {url} ({response.status_code})")
+            continue
+        key = _request_key(url)
+        file_name = hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest() + '.body'
+        with open(os.path.join(corpus_dir, file_name), 'wb') as f:
+            f.write(response.content)
+        manifest[key] = {
+            'url': url,
+            'file': file_name,
+            'content_type': response.headers.get('Content-Type', 'text/html; charset=utf-8'),
+        }
+        print(f"✅ 記録: {url} ({len(response.content)} バイト)")
+
+    with open(os.path.join(corpus_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+def load_corpus(corpus_dir):
+    """マニフェストと本文を読み込む（キー -> (Content-Type, 本文)）"""
+    with open(os.path.join(corpus_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    corpus = {}
+    for key, entry in manifest.items():
+        with open(os.path.join(corpus_dir, entry['file']), 'rb') as f:
+            corpus[key] = (entry['content_type'], f.read())
+    return corpus
+
+class ReplayServer:
+    """記録済みのレスポンスを返すローカルHTTPサーバー"""
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+        corpus_ref = corpus
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                entry = corpus_ref.get(self.path)
+                if entry is None:
+                    self.send_error(404)
+                    return
+                content_type, body = entry
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def make_scrapers(base_url):
+    """再生サーバーに向けたスクレイパーを作成（HTTPキャッシュは使わない）"""
+    ema = EMAScraper(cache_file=None)
+    ema.base_url = base_url
+    ema.news_url = f"{base_url}/en/news"
+    ema.feed.feed_url = base_url + _request_key(ema.feed.feed_url)
+
+    # 記録していない記事ページを取得しないよう記事ページでの確認は行わず、
+    # 作業ディレクトリの watchlist.json に左右されないよう既定の監視対象を使う
+    cbp501 = CBP501Scraper(cache_file=None, enrich=False,
+                           watchlist=Watchlist.from_config({'compounds': DEFAULT_WATCH_RULES}))
+    cbp501.base_urls = [base_url + _request_key(url) for url in cbp501.base_urls]
+    return ema, cbp501
+
+def percentile(values, pct):
+    """最近接順位法によるパーセンタイル"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def peak_rss_mib():
+    """プロセスの最大RSS（MiB、取得できない場合はNone）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # LinuxはKiB、macOSはバイト単位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def time_calls(func, repeat):
+    """関数の実行時間を計測（ミリ秒のリスト）"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def news_stages(ema):
+    """ニュースページの処理を段階ごとに実行（取得・解析・抽出・分類）"""
+    timings = {}
+
+    start = time.perf_counter()
+    content = ema.session.get(ema.news_url, timeout=30).content
+    timings['fetch'] = time.perf_counter()
+
+    parser, doc = parse_document(ema.parser, content)
+    timings['parse'] = time.perf_counter()
+
+    items = ema._extract_news_items(doc, parser)
+    timings['extract'] = time.perf_counter()
+
+    for item in items:
+        KEYWORD_CLASSIFIER.classify(f"{item['title']} {item.get('description', '')}")
+    timings['classify'] = time.perf_counter()
+
+    return _stage_durations(start, timings)
+
+def chmp_stages(ema):
+    """CHMPハイライト検索の処理を段階ごとに実行（取得・解析・抽出）"""
+    timings = {}
+    url = f"{ema.base_url}/en/search?search_api_views_fulltext=CHMP%20highlights"
+
+    start = time.perf_counter()
+    content = ema.session.get(url, timeout=30).content
+    timings['fetch'] = time.perf_counter()
+
+    parser, doc = parse_document(ema.parser, content)
+    timings['parse'] = time.perf_counter()
+
+    chmp_links = [parser.href(link) for link in parser.links(doc) if 'chmp' in parser.href(link).lower()]
+    timings['extract'] = time.perf_counter()
+
+    logger.debug(f"CHMPハイライトリンク: {len(chmp_links)}件")
+    return _stage_durations(start, timings)
+
+def cbp501_stages(cbp501):
+    """CBP501検出の処理を段階ごとに実行（取得・検出）"""
+    fetch_ms = 0.0
+    scan_ms = 0.0
+    for url in cbp501.base_urls:
+        start = time.perf_counter()
+        response = cbp501._get_request(url, stream=cbp501.streaming)
+        fetched = time.perf_counter()
+        cbp501._scan_page(url, response)
+        finished = time.perf_counter()
+        # ストリーム読み込みでは本文の受信も検出側に含まれる
+        fetch_ms += (fetched - start) * 1000
+        scan_ms += (finished - fetched) * 1000
+    return {'fetch': fetch_ms, 'scan': scan_ms}
+
+def _stage_durations(start, timings):
+    """各段階の終了時刻から所要時間（ミリ秒）を計算"""
+    durations = {}
+    previous = start
+    for stage, finished in timings.items():
+        durations[stage] = (finished - previous) * 1000
+        previous = finished
+    return durations
+
+def print_latency(label, times):
+    """レイテンシとスループットを表示"""
+    total_seconds = sum(times) / 1000
+    throughput = len(times) / total_seconds if total_seconds > 0 else float('inf')
+    print(f"  - {label:32s}: p50 {percentile(times, 50):8.2f} ms / "
+          f"p95 {percentile(times, 95):8.2f} ms / {throughput:7.1f} 回/秒")
+
+def run_benchmark(corpus, repeat):
+    """再生サーバーを起動して各処理を計測"""
+    with ReplayServer(corpus) as server:
+        ema, cbp501 = make_scrapers(server.base_url)
+
+        # 接続の確立などを計測から除くため1回ずつ空実行
+        ema.get_latest_news()
+        ema.get_chmp_highlights()
+        cbp501.search_cbp501_phase3()
+
+        print(f"📊 エンドツーエンド ({repeat}回計測)")
+        print_latency("EMAScraper.get_latest_news", time_calls(ema.get_latest_news, repeat))
+        print_latency("EMAScraper.get_chmp_highlights", time_calls(ema.get_chmp_highlights, repeat))
+        print_latency("CBP501 search_cbp501_phase3", time_calls(cbp501.search_cbp501_phase3, repeat))
+
+        print(f"\n📊 段階別 (中央値, {repeat}回計測)")
+        for label, func in (
+            ("ニュース", lambda: news_stages(ema)),
+            ("CHMPハイライト", lambda: chmp_stages(ema)),
+            ("CBP501検出", lambda: cbp501_stages(cbp501)),
+        ):
+            runs = [func() for _ in range(repeat)]
+            stages = " / ".join(
+                f"{stage} {statistics.median(run[stage] for run in runs):7.2f} ms"
+                for stage in runs[0]
+            )
+            print(f"  - {label}: {stages}")
+
+    rss = peak_rss_mib()
+    if rss is not None:
+        print(f"\n💾 最大RSS: {rss:.1f} MiB")
+
+def main():
+    """メイン処理"""
+    arg_parser = argparse.ArgumentParser(description='記録済みEMAレスポンスの再生によるベンチマーク')
+    arg_parser.add_argument('--corpus', default=DEFAULT_CORPUS_DIR, help='記録済みレスポンスのディレクトリ')
+    arg_parser.add_argument('--record', action='store_true', help='EMAのレスポンスを取得して記録する')
+    arg_parser.add_argument('--repeat', type=int, default=10, help='処理ごとの計測回数')
+    args = arg_parser.parse_args()
+
+    if args.record:
+        record_corpus(args.corpus)
+
+    if not os.path.exists(os.path.join(args.corpus, MANIFEST_FILE)):
+        print(f"❌ {args.corpus}/ に記録済みレスポンスがありません（--record で記録してください）")
+        return False
+
+    run_benchmark(load_corpus(args.corpus), max(1, args.repeat))
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
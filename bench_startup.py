@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+CBP501三相治験監視アプリケーション - 起動時間ベンチマーク
+python -X importtime でモジュールの読み込み時間を計測し、起動前チェックの経路が重いライブラリを読み込まないことを確認する
+
+使い方:
+    python bench_startup.py                  # 読み込み時間と起動時間を計測
+    python bench_startup.py --budget-ms 80   # main の読み込みが80msを超えたら終了コード1
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 計測する読み込み経路（表示名, 実行する文）
+SCENARIOS = [
+    ('起動前チェック（main のみ）', 'import main'),
+    ('通常チェック（スクレイパー・通知処理まで）',
+     'import main, cbp501_scraper, cbp501_notifier, snapshots, transport'),
+]
+
+# 起動前チェックの経路で読み込まれてはいけないモジュール
+HEAVY_MODULES = ('requests', 'bs4', 'lxml', 'httpx', 'pytz', 'dotenv')
+
+def _run_python(args, work_dir):
+    """リポジトリをインポートパスに加えて別プロセスのPythonを実行"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    # main.py はログファイルを作成するため、作業ディレクトリは一時ディレクトリにする
+    return subprocess.run(
+        [sys.executable] + args, cwd=work_dir, env=env, capture_output=True, text=True, check=True
+    )
+
+def import_profile(statement, work_dir):
+    """-X importtime の出力を (自身の時間μs, 累積μs, 階層, モジュール名) のリストにする"""
+    result = _run_python(['-X', 'importtime', '-c', statement], work_dir)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return entries
+
+def wall_time_ms(statement, work_dir, repeat):
+    """プロセス起動から終了までの時間の中央値（ミリ秒）"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _run_python(['-c', statement], work_dir)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def main():
+    """メイン処理"""
+    arg_parser = argparse.ArgumentParser(description='-X importtime による起動時間ベンチマーク')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='起動時間の計測回数')
+    arg_parser.add_argument('--top', type=int, default=10, help='表示する重いモジュールの数')
+    arg_parser.add_argument('--budget-ms', type=float, default=100.0, help='main の読み込み時間の上限（ミリ秒）')
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        baseline_ms = wall_time_ms('pass', work_dir, args.repeat)
+        print(f"🐍 インタプリタ起動のみ: {baseline_ms:.1f} ms（中央値, {args.repeat}回）")
+
+        main_import_ms = None
+        for label, statement in SCENARIOS:
+            entries = import_profile(statement, work_dir)
+            # 最上位の読み込みの累積時間の合計（site など起動時に必ず読み込まれるものを除く）
+            top_level = [e for e in entries if e[2] == 0 and e[3] not in ('site', 'encodings')]
+            import_ms = sum(e[1] for e in top_level) / 1000
+            process_ms = wall_time_ms(statement, work_dir, args.repeat)
+            loaded = {e[3] for e in entries}
+            heavy = [name for name in HEAVY_MODULES if name in loaded]
+
+            print(f"\n📦 {label}")
+            print(f"  - 読み込み時間: {import_ms:8.1f} ms（{len(entries)}モジュール）")
+            print(f"  - プロセス全体: {process_ms:8.1f} ms")
+            print(f"  - 重いライブラリ: {', '.join(heavy) if heavy else 'なし'}")
+            print(f"  - 読み込みに時間がかかるモジュール（自身の時間）:")
+            for self_us, cumulative_us, _, name in sorted(entries, reverse=True)[:args.top]:
+                print(f"      {name:40s} {self_us / 1000:7.2f} ms（累積 {cumulative_us / 1000:7.2f} ms）")
+
+            if main_import_ms is None:
+                main_import_ms = import_ms
+                if heavy:
+                    print(f"  ❌ 起動前チェックの経路で {', '.join(heavy)} が読み込まれています")
+                    return False
+
+    if main_import_ms > args.budget_ms:
+        print(f"\n❌ main の読み込み時間 {main_import_ms:.1f} ms が上限 {args.budget_ms:.0f} ms を超えています")
+        return False
+    print(f"\n✅ main の読み込み時間 {main_import_ms:.1f} ms（上限 {args.budget_ms:.0f} ms）")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
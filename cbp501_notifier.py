@@ -4,65 +4,55 @@ CBP501三相治験監視アプリケーション - Discord通知処理
 CBP501三相治験情報の発見・未発見をDiscordに通知
 """
 
-import requests
 import logging
 import json
-import time
 from datetime import datetime
+from delivery_queue import TokenBucket, WebhookDeliveryQueue, deliver_webhook
+from transport import get_transport
 
 logger = logging.getLogger(__name__)
 
 class CBP501Notifier:
     """CBP501専用Discord通知クラス"""
     
-    def __init__(self, webhook_url):
+    def __init__(self, webhook_url, async_delivery=False, transport=None):
+        """async_deliveryがTrueの場合、送信はバックグラウンドで行い各送信メソッドはFutureを返す"""
         self.webhook_url = webhook_url
-        self.session = requests.Session()
-        self.session.headers.update({
+        # 共有の接続プールとサーキットブレーカーを使うセッション
+        self.session = (transport or get_transport()).session({
             'Content-Type': 'application/json',
             'User-Agent': 'CBP501-Monitor-Bot/1.0'
         })
+        # Discordのレート制限ヘッダーに従うトークンバケット
+        self.rate_limiter = TokenBucket()
+        self.delivery_queue = None
+        if async_delivery:
+            self.delivery_queue = WebhookDeliveryQueue(self.session, self.webhook_url, self.rate_limiter)
     
     def _send_webhook(self, payload, max_retries=3):
         """Discord Webhookにメッセージを送信"""
-        for attempt in range(max_retries):
-            try:
-                response = self.session.post(
-                    self.webhook_url,
-                    json=payload,
-                    timeout=30
-                )
-                
-                if response.status_code == 204:
-                    return True
-                elif response.status_code == 429:
-                    # レート制限の場合は少し待つ
-                    logger.warning("レート制限に達しました。5秒待機します。")
-                    time.sleep(5)
-                    continue
-                else:
-                    logger.error(f"Discord送信エラー: {response.status_code} - {response.text}")
-                    return False
-                    
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Discord送信リクエストエラー (試行 {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                else:
-                    return False
-        
-        return False
+        if self.delivery_queue:
+            return self.delivery_queue.submit(payload)
+        return deliver_webhook(self.session, self.webhook_url, payload, self.rate_limiter, max_retries)
+    
+    def close(self):
+        """配信キューに残っている通知を送信し終えてから終了"""
+        if self.delivery_queue:
+            self.delivery_queue.close()
+            self.delivery_queue = None
     
     def send_cbp501_found_notification(self, cbp501_details):
-        """CBP501三相治験発見時の緊急通知"""
+        """監視対象（CBP501など）の治験情報発見時の緊急通知（1つの化合物の項目をまとめて送る）"""
         try:
             # 最も信頼度の高いアイテムを選択
             best_item = max(cbp501_details, key=lambda x: x.get('confidence', 'low') == 'high')
+            compound = best_item.get('compound', 'CBP501')
+            phases = best_item.get('phase3_keywords') or []
             
             embed = {
-                "title": "🚨 CBP501三相治験情報を発見！",
+                "title": f"🚨 {compound}治験情報を発見！",
                 "description": f"**{best_item['title']}**\n\n{best_item['content'][:300]}{'...' if len(best_item['content']) > 300 else ''}",
-                "url": best_item['url'] if best_item['url'] else best_item['source'],
+                "url": best_item.get('detail_url') or best_item['url'] or best_item['source'],
                 "color": 0xFF0000,  # 赤色（緊急）
                 "timestamp": datetime.utcnow().isoformat(),
                 "footer": {
@@ -72,12 +62,12 @@ class CBP501Notifier:
                 "fields": [
                     {
                         "name": "🎯 薬剤名",
-                        "value": "CBP501",
+                        "value": compound,
                         "inline": True
                     },
                     {
                         "name": "📊 治験段階",
-                        "value": "Phase III（三相）",
+                        "value": ", ".join(phases) if phases else "指定なし",
                         "inline": True
                     },
                     {
@@ -107,7 +97,7 @@ class CBP501Notifier:
             if best_item.get('phase3_keywords') or best_item.get('start_keywords'):
                 keywords = []
                 if best_item.get('phase3_keywords'):
-                    keywords.extend([f"Phase3: {kw}" for kw in best_item['phase3_keywords'][:3]])
+                    keywords.extend([f"Phase: {kw}" for kw in best_item['phase3_keywords'][:3]])
                 if best_item.get('start_keywords'):
                     keywords.extend([f"Start: {kw}" for kw in best_item['start_keywords'][:3]])
                 
@@ -118,7 +108,7 @@ class CBP501Notifier:
                 })
             
             payload = {
-                "content": "@everyone 🚨 **CBP501三相治験情報発見！** 🚨",
+                "content": f"@everyone 🚨 **{compound}治験情報発見！** 🚨",
                 "embeds": [embed]
             }
             
@@ -257,6 +247,109 @@ class CBP501Notifier:
             logger.error(f"状態変化通知の構築に失敗: {e}")
             return False
     
+    def send_content_change_notification(self, compound, page_diff, added, removed, max_lines=5):
+        """監視対象に言及する行（added / removed）が監視ページで追加・削除された場合の通知"""
+        try:
+            fields = [
+                {
+                    "name": "🌐 ページ",
+                    "value": page_diff.url,
+                    "inline": False
+                },
+                {
+                    "name": "📊 類似度",
+                    "value": f"{page_diff.similarity:.0%}",
+                    "inline": True
+                },
+                {
+                    "name": "⏰ 検出時刻",
+                    "value": datetime.now().strftime('%Y-%m-%d %H:%M:%S JST'),
+                    "inline": True
+                }
+            ]
+            if added:
+                fields.append({
+                    "name": "➕ 追加された行",
+                    "value": '\n'.join(line[:200] for line in added[:max_lines])[:1024],
+                    "inline": False
+                })
+            if removed:
+                fields.append({
+                    "name": "➖ 削除された行",
+                    "value": '\n'.join(line[:200] for line in removed[:max_lines])[:1024],
+                    "inline": False
+                })
+            
+            embed = {
+                "title": f"📝 {compound}に関する記載の変化",
+                "description": f"監視ページで{compound}に言及する記載が変化しました。",
+                "color": 0x3498DB,
+                "timestamp": datetime.utcnow().isoformat(),
+                "footer": {
+                    "text": "CBP501 Content Change Alert"
+                },
+                "fields": fields
+            }
+            
+            payload = {
+                "embeds": [embed]
+            }
+            
+            return self._send_webhook(payload)
+        
+        except Exception as e:
+            logger.error(f"記載変化通知の構築に失敗: {e}")
+            return False
+    
+    def send_site_status_notification(self, available, detail=""):
+        """EMAサイトの障害・復旧の通知（障害中は毎回ではなく状態が変わったときだけ送る）"""
+        try:
+            if available:
+                title = "✅ EMAサイトが復旧しました"
+                description = "EMAサイトへの接続が回復したため、通常の監視を再開しました。"
+                color = 0x00FF00
+                content = None
+            else:
+                title = "🚧 EMAサイトに接続できません"
+                description = "EMAサイトが応答しないため、復旧するまでチェック間隔を伸ばし、死活確認のみ行います。"
+                color = 0xFFA500
+                content = "@here EMAサイトに接続できません"
+            
+            embed = {
+                "title": title,
+                "description": description,
+                "color": color,
+                "timestamp": datetime.utcnow().isoformat(),
+                "footer": {
+                    "text": "CBP501 Monitor - Site Status"
+                },
+                "fields": [
+                    {
+                        "name": "⏰ 検出時刻",
+                        "value": datetime.now().strftime('%Y-%m-%d %H:%M:%S JST'),
+                        "inline": True
+                    }
+                ]
+            }
+            if detail:
+                embed["fields"].append({
+                    "name": "📝 詳細",
+                    "value": detail[:1024],
+                    "inline": False
+                })
+            
+            payload = {
+                "embeds": [embed]
+            }
+            if content:
+                payload["content"] = content
+            
+            return self._send_webhook(payload)
+        
+        except Exception as e:
+            logger.error(f"サイト状態通知の構築に失敗: {e}")
+            return False
+    
     def send_error_notification(self, error_message):
         """エラー通知を送信"""
         try:
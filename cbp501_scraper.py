@@ -1,84 +1,451 @@
 #!/usr/bin/env python3
 """
 CBP501三相治験監視アプリケーション - スクレイピング処理
-EMA（欧州医薬品庁）のウェブサイトからCBP501の三相治験情報を取得
+EMA（欧州医薬品庁）のウェブサイトからCBP501をはじめとする監視対象の治験情報を取得
 """
 
 import logging
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse
 import requests
 from bs4 import BeautifulSoup
+from enrichment import DetailEnricher
+from fingerprint import normalize_url
+from http_cache import HTTPValidatorCache
+from metrics import FETCH_BYTES, FETCH_SECONDS, ITEMS_EXTRACTED, PARSE_SECONDS
+from preflight import MONITORED_URLS, REQUEST_HEADERS
+from transport import DEFAULT_TIMEOUT, get_transport
+from watchlist import DEFAULT_WATCHLIST_FILE, load_watchlist
 
 logger = logging.getLogger(__name__)
 
+# 監視対象リスト導入前の結果（化合物名なし）の扱い
+LEGACY_COMPOUND = 'CBP501'
+
+# ストリーム読み込みのチャンクサイズと、一致箇所の前後に解析する範囲（バイト）
+STREAM_CHUNK_SIZE = 64 * 1024
+HIT_REGION_SIZE = 2048
+
+# 一致箇所の周辺から拾う記事ページ候補の最大数
+MAX_CANDIDATE_LINKS = 3
+
+class SiteUnavailableError(Exception):
+    """監視対象のページがすべて取得できなかった場合の例外（EMAサイトの障害など）"""
+
 class CBP501Scraper:
     """CBP501治験情報スクレイパークラス"""
 
-    def __init__(self):
-        """初期化"""
-        self.base_urls = [
-            'https://www.ema.europa.eu/en/news',
-            'https://www.ema.europa.eu/en/events/upcoming-events'
-        ]
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        self.session = requests.Session()
-        self.session.headers.update(self.headers)
+    def __init__(self, cache_file='cbp501_http_cache.json', max_workers=8, max_per_host=2, streaming=True,
+                 enrich=True, watchlist=None, transport=None):
+        """watchlistを省略した場合は watchlist.json（無ければCBP501のみ）を監視する"""
+        # 監視ページとヘッダーは起動前チェック（preflight）と共通
+        self.base_urls = list(MONITORED_URLS)
+        self.headers = dict(REQUEST_HEADERS)
+        # 共有の接続プール・再試行方針を使うセッション
+        self.session = (transport or get_transport()).session(self.headers)
+        self.http_cache = HTTPValidatorCache(cache_file)
 
-    def _get_request(self, url, max_retries=3):
-        """リクエストを送信"""
-        logger.info(f"リクエスト送信: {url} (試行 1/{max_retries})")
-        for attempt in range(max_retries):
-            try:
-                response = self.session.get(url, timeout=30)
-                response.raise_for_status()
-                return response
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"リクエスト失敗 (試行 {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
+        # 並列取得の設定（ホストごとの同時接続数で負荷を抑える）
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+
+        # ストリーム検出モード（Falseの場合はページ全体を解析する従来方式）
+        self.streaming = streaming
+        # 全監視対象の別名・治験段階を1つのマッチャーで検出する
+        self.watchlist = watchlist or load_watchlist()
+
+        # 一覧ページで見つかった場合にリンク先の記事ページで確認する
+        self.enricher = None
+        if enrich:
+            self.enricher = DetailEnricher(self.session, max_workers=max_workers, max_per_host=max_per_host)
+
+        # ページ本文の変化の検出（SnapshotTrackerを設定した場合のみ）
+        self.snapshots = None
+        # 検出した項目を蓄積する全文索引（NewsArchive、Noneなら蓄積しない）
+        self.archive = None
+        self.last_page_diffs = {}
+        self._page_bodies = {}
+        self._page_lines = {}
+
+        # ページの解析をまとめて別プロセスで行う場合のParsePool（Noneならスレッド内で解析する）
+        self.parse_pool = None
+        self._pending_pages = {}
+
+        # 今回の検索で取得できなかったURL
+        self._failed_urls = set()
+
+    def _get_request(self, url, stream=False):
+        """リクエストを送信（前回の検証子があれば条件付きGET、再試行は共有の通信基盤が行う）"""
+        logger.info(f"リクエスト送信: {url}")
+        headers = self.http_cache.conditional_headers(url)
+        response = None
+        try:
+            # ストリーム読み込みの場合はヘッダー受信までの時間
+            with FETCH_SECONDS.time(url=url):
+                response = self.session.get(url, headers=headers, timeout=DEFAULT_TIMEOUT, stream=stream)
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            if response is not None:
+                response.close()
+            logger.warning(f"リクエスト失敗 ({url}): {e}")
+            return None
+
+    def reload_watchlist(self, file_path=DEFAULT_WATCHLIST_FILE):
+        """監視対象リストを読み込み直す（前回の解析結果は監視対象が変わると使えないため破棄する）"""
+        self.watchlist = load_watchlist(file_path)
+        self.http_cache.clear()
+
+    def probe(self):
+        """監視対象サイトが応答するかをHEADリクエスト1回で確認"""
+        return self.session.transport.probe(self.base_urls[0])
+
+    def host_health(self):
+        """監視対象サイトの (応答状況のEWMA, サーキットブレーカーの状態)"""
+        host = urlparse(self.base_urls[0]).netloc
+        transport = self.session.transport
+        return transport.health(host), transport.breaker(host).state
+
+    def _host_semaphore(self, url):
+        """ホストごとの同時接続数制限を取得"""
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_limits[host]
+
+    def _fetch(self, url):
+        """ホストの同時接続数制限内でページを取得・解析"""
+        with self._host_semaphore(url):
+            # プロセスプールで解析する場合は本文全体が必要なためストリーム読み込みしない
+            response = self._get_request(url, stream=self.streaming and self.parse_pool is None)
+            return self._scan_page(url, response)
+
+    def _scan_page(self, url, response):
+        """取得したページからCBP501三相治験情報を検出"""
+        if response is not None and response.status_code == 304:
+            # 未変更ページは解析せず前回の結果を再利用
+            logger.info(f"{url}は前回から更新されていません。前回の結果を再利用します")
+            response.close()
+            return self.http_cache.get_result(url) or []
+
+        if not response:
+            # 取得できなかったページは前回の結果を使い、一時的な障害で「未発見」に変わらないようにする
+            logger.warning(f"検索エラー ({url}): リクエストに失敗しました。前回の結果を使用します")
+            self._failed_urls.add(url)
+            return self.http_cache.get_result(url) or []
+
+        try:
+            if self.parse_pool is not None:
+                # 解析は取得が終わってからまとめて行う（_scan_pending）
+                FETCH_BYTES.inc(len(response.content), url=url)
+                self._pending_pages[url] = response
+                return []
+
+            with PARSE_SECONDS.time(source='cbp501'):
+                if self.streaming:
+                    page_items = self._scan_stream(url, response)
                 else:
-                    return None
+                    page_items = self._scan_full(url, response)
 
-    def search_cbp501_phase3(self):
-        """CBP501の三相治験情報を検索"""
-        logger.info("CBP501三相治験情報の検索を開始")
-        found_items = []
+            ITEMS_EXTRACTED.inc(len(page_items), source='cbp501')
+            self.http_cache.store(url, response, page_items)
+            return page_items
+        except Exception as e:
+            logger.error(f"{url}の解析中にエラー: {e}")
+            return []
+        finally:
+            response.close()
+
+    def _scan_full(self, url, response):
+        """ページ全体のDOMを構築して検出（従来方式）"""
+        FETCH_BYTES.inc(len(response.content), url=url)
+        self._keep_body(url, response.content)
+        return self._scan_document(url, response, response.content)
+
+    def _scan_document(self, url, response, body):
+        """ページ全体のDOMを構築し、本文のテキストで検出"""
+        soup = BeautifulSoup(body, 'html.parser')
+        # 治験情報が含まれる可能性のある要素を広く検索（&nbsp;や改行を挟んだ表記も一致するよう空白を揃える）
+        search_text = ' '.join(soup.get_text().split())
+
+        matches = self.watchlist.evaluate(self.watchlist.search(search_text.encode('utf-8')))
+        raw_hits = self.watchlist.search(body) if matches else {}
+        items = []
+        for match in matches:
+            logger.info(f"{url}で{match.rule.name}の治験情報が見つかりました")
+            links = self._candidate_links(url, body, match.alias, self.watchlist.positions(raw_hits, match.alias))
+            items.append(self._build_item(url, response, *self._head_fields(soup), match, links))
+        return items
+
+    def _scan_stream(self, url, response):
+        """レスポンスをチャンク単位で走査し、候補がある場合のみ部分的にDOMを構築"""
+        scanner = self.watchlist.stream()
+        chunks = []
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            scanner.feed(chunk)
+            chunks.append(chunk)
+            FETCH_BYTES.inc(len(chunk), url=url)
+
+        body = None
+        if self.snapshots is not None:
+            body = b''.join(chunks)
+            self._keep_body(url, body)
+
+        # どのパターンも出現しない場合はDOMを構築しない
+        if not scanner.hits:
+            return []
+
+        # 生のHTML上の一致がタグ属性などではなく本文中にあるかを一致箇所の周辺だけで確認
+        if body is None:
+            body = b''.join(chunks)
+        matches = []
+        if self.watchlist.evaluate(scanner.hits):
+            matches = self.watchlist.evaluate(
+                scanner.hits, lambda pattern, position: self._hit_in_text(body, pattern, position)
+            )
+
+        # 別名・治験段階の表記がタグや文字参照で分断されているルールは、ページ全体のテキストで確認する
+        # （分断されていない表記だけのページでは、一致しなかったルールのためにDOMを構築しない）
+        if self.watchlist.split_rules(scanner.hits, body, matches):
+            return self._scan_document(url, response, body)
+        if not matches:
+            return []
+
+        # タイトルと説明文は<head>部分だけを解析して取得
+        head_end = body.find(b'</head>')
+        head = body[:head_end + len(b'</head>')] if head_end >= 0 else body
+        head_soup = BeautifulSoup(head, 'html.parser')
+        items = []
+        for match in matches:
+            logger.info(f"{url}で{match.rule.name}の治験情報が見つかりました")
+            links = self._candidate_links(url, body, match.alias, self.watchlist.positions(scanner.hits, match.alias))
+            items.append(self._build_item(url, response, *self._head_fields(head_soup), match, links))
+        return items
 
+    def _scan_summary(self, url, response, summary):
+        """ワーカープロセスで求めたページの要約（summarize_page）から検出"""
+        search_text = ' '.join(summary['text'].split())
+        matches = self.watchlist.evaluate(self.watchlist.search(search_text.encode('utf-8')))
+        if not matches:
+            return []
+        if summary['description'] is None:
+            raise ValueError("説明文（meta description）がありません")
+
+        raw_hits = self.watchlist.search(response.content)
+        items = []
+        for match in matches:
+            logger.info(f"{url}で{match.rule.name}の治験情報が見つかりました")
+            links = self._candidate_links(url, response.content, match.alias, self.watchlist.positions(raw_hits, match.alias))
+            items.append(self._build_item(url, response, summary['title'], summary['description'], match, links))
+        return items
+
+    def _scan_pending(self):
+        """保留したページをプロセスプールでまとめて解析し、URL -> 検出項目 を返す"""
+        pending = self._pending_pages
+        self._pending_pages = {}
+        if not pending:
+            return {}
+
+        urls = list(pending)
+        with PARSE_SECONDS.time(source='cbp501'):
+            summaries = self.parse_pool.map('page_summary', [(url, pending[url].content) for url in urls])
+
+        results = {}
+        for url, summary in zip(urls, summaries):
+            response = pending[url]
+            results[url] = []
+            if summary is None:
+                continue
+            self._keep_body(url, response.content)
+            if self.snapshots is not None:
+                self._page_lines[url] = summary['lines']
+            try:
+                page_items = self._scan_summary(url, response, summary)
+            except Exception as e:
+                logger.error(f"{url}の解析中にエラー: {e}")
+                continue
+            ITEMS_EXTRACTED.inc(len(page_items), source='cbp501')
+            self.http_cache.store(url, response, page_items)
+            results[url] = page_items
+        return results
+
+    def _keep_body(self, url, body):
+        """スナップショット比較用にページ本文を保持（状態ストアへの保存はメインスレッドで行う）"""
+        if self.snapshots is not None:
+            self._page_bodies[url] = body
+
+    def _update_snapshots(self):
+        """今回取得したページ本文でスナップショットを更新し、URL -> PageDiff を返す"""
+        diffs = {}
         for url in self.base_urls:
-            logger.info(f"検索対象: {url}")
-            response = self._get_request(url)
+            body = self._page_bodies.pop(url, None)
+            if body is None:
+                continue
+            try:
+                diff = self.snapshots.update(url, body, lines=self._page_lines.pop(url, None))
+            except Exception as e:
+                logger.error(f"{url}のスナップショット更新に失敗: {e}")
+                continue
+            if diff is not None:
+                diffs[url] = diff
+        return diffs
+
+    def _hit_region(self, body, pattern, position):
+        """一致箇所の前後の範囲を解析する"""
+        start = max(0, position - HIT_REGION_SIZE)
+        # タグの途中から解析しないよう直前の'<'まで戻す
+        tag_start = body.rfind(b'<', 0, start + 1)
+        if tag_start >= 0:
+            start = tag_start
+        end = position + len(pattern) + HIT_REGION_SIZE
+        return BeautifulSoup(body[start:end], 'html.parser')
+
+    def _hit_in_text(self, body, pattern, position):
+        """一致箇所の周辺だけを解析し、テキストとして含まれるかを判定"""
+        region_text = self._hit_region(body, pattern, position).get_text()
+        return self.watchlist.contains(pattern, region_text)
+
+    def _candidate_links(self, url, body, pattern, positions):
+        """化合物名の一致箇所の周辺にある記事ページへのリンクを集める"""
+        page_key = normalize_url(url)
+        links = []
+        for position in positions:
+            region = self._hit_region(body, pattern, position)
+            for anchor in region.find_all('a', href=True):
+                link = urljoin(url, anchor['href'])
+                if not link.startswith(('http://', 'https://')) or normalize_url(link) == page_key:
+                    continue
+                if link not in links:
+                    links.append(link)
+            if len(links) >= MAX_CANDIDATE_LINKS:
+                break
+        return links[:MAX_CANDIDATE_LINKS]
+
+    def _confirm_with_details(self, items):
+        """候補の記事ページを並列に取得し、本文で確認できた項目に情報を付加して信頼度を決める
+
+        通知済みかどうかの判定に使う url・source は変えず、確認できた記事ページは detail_url に記録する。
+        前回確認済みの項目（未変更ページのキャッシュから再利用したもの）は取得し直さない。
+        """
+        if not self.enricher:
+            return
+        items = [item for item in items if not item.get('detail_url')]
+        candidates = [link for item in items for link in item.get('candidate_links', [])]
+        if not candidates:
+            return
+
+        details = self.enricher.fetch_all(candidates)
+        for item in items:
+            links = item.get('candidate_links', [])
+            if not links:
+                continue
+            matched = item.get('matched_keywords') or [item.get('compound', LEGACY_COMPOUND)]
+            keywords = [keyword.encode('utf-8') for keyword in matched]
+            for link in links:
+                fields = details.get(link)
+                if fields and all(self.watchlist.contains(keyword, fields['full_text']) for keyword in keywords):
+                    logger.info(f"記事ページで{item.get('compound', LEGACY_COMPOUND)}の治験情報を確認しました: {link}")
+                    item.update(fields)
+                    item['detail_url'] = link
+                    item['confidence'] = 'high'
+                    break
+            else:
+                # 一覧ページでは一致したが記事ページでは確認できなかった
+                item['confidence'] = 'medium'
+
+    def _head_fields(self, soup):
+        """ページのタイトルと説明文"""
+        # 詳細情報を抽出（サンプル）
+        title = soup.title.string
+        content = soup.find('meta', attrs={'name': 'description'})['content']
+        return title, content
 
-            if response:
+    def _build_item(self, url, response, title, content, match, candidate_links=None):
+        """検出結果の項目を構築"""
+        keywords = match.keywords
+
+        return {
+            'source': url,
+            'title': title,
+            'content': content,
+            'url': response.url,
+            'compound': match.rule.name,
+            'matched_keywords': keywords,
+            'confidence': 'high',
+            'phase3_keywords': keywords[1:],
+            'start_keywords': [],
+            'candidate_links': candidate_links or []
+        }
+
+    def search_watchlist(self):
+        """全監視対象の治験情報を検索（各URLを1回だけ取得・解析）
+
+        監視対象の名前 -> 見つかった項目リスト の辞書を返す（見つからなかった対象は空リスト）
+        すべてのページが取得できなかった場合は SiteUnavailableError を送出する。
+        """
+        logger.info(f"監視対象 {len(self.watchlist.rules)}件の治験情報の検索を開始")
+        page_results = {}
+        self._failed_urls = set()
+
+        workers = max(1, min(self.max_workers, len(self.base_urls)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for url in self.base_urls:
+                logger.info(f"検索対象: {url}")
+                futures[executor.submit(self._fetch, url)] = url
+
+            for future in as_completed(futures):
+                url = futures[future]
                 try:
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                    # 治験情報が含まれる可能性のある要素を広く検索
-                    search_text = soup.get_text()
-
-                    if "CBP501" in search_text and "Phase III" in search_text:
-                        logger.info(f"{url}でCBP501の三相治験情報が見つかりました")
-                        # 詳細情報を抽出（サンプル）
-                        title = soup.title.string
-                        content = soup.find('meta', attrs={'name': 'description'})['content']
-                        
-                        found_items.append({
-                            'source': url,
-                            'title': title,
-                            'content': content,
-                            'url': response.url,
-                            'confidence': 'high',
-                            'phase3_keywords': ['Phase III'],
-                            'start_keywords': []
-                        })
+                    page_results[url] = future.result()
                 except Exception as e:
-                    logger.error(f"{url}の解析中にエラー: {e}")
-            else:
-                logger.warning(f"検索エラー ({url}): リクエストに失敗しました")
+                    logger.error(f"{url}の取得中にエラー: {e}")
+                    page_results[url] = []
+
+        if self.parse_pool is not None:
+            page_results.update(self._scan_pending())
+        if self._failed_urls.issuperset(self.base_urls):
+            self.http_cache.save()
+            raise SiteUnavailableError(f"監視対象のページを1件も取得できませんでした ({len(self.base_urls)}件)")
+        self.last_page_diffs = self._update_snapshots() if self.snapshots is not None else {}
+
+        # 結果は監視対象URLの順序で並べる
+        found_items = []
+        for url in self.base_urls:
+            found_items.extend(page_results.get(url, []))
+        self._confirm_with_details(found_items)
+        # キャッシュの項目は検出結果と同じ辞書のため、記事ページで確認した情報も含めて保存される
+        self.http_cache.save()
+        if self.archive is not None and found_items:
+            try:
+                self.archive.add_items(found_items, 'cbp501')
+            except Exception as e:
+                logger.warning(f"全文索引への追加に失敗: {e}")
+
+        results = {rule.name: [] for rule in self.watchlist.rules}
+        for item in found_items:
+            results.setdefault(item.get('compound', LEGACY_COMPOUND), []).append(item)
+        return results
+
+    def search_cbp501_phase3(self):
+        """監視対象の治験情報を検索し、(見つかったか, 全項目) を返す
+
+        EMAサイトに接続できない場合も例外は送出せず、(False, []) を返す（障害の判定は search_watchlist を使う）。
+        """
+        try:
+            results = self.search_watchlist()
+        except SiteUnavailableError as e:
+            logger.error(f"EMAサイトに接続できません: {e}")
+            return False, []
+        found_items = [item for items in results.values() for item in items]
 
         if found_items:
-            logger.info(f"{len(found_items)}件のCBP501三相治験関連情報が見つかりました")
+            logger.info(f"{len(found_items)}件の治験関連情報が見つかりました")
             return True, found_items
         else:
-            logger.info("CBP501に関する情報は見つかりませんでした")
+            logger.info("監視対象に関する情報は見つかりませんでした")
             return False, []
\ No newline at end of file
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - CHMPハイライト解析
+CHMP会議のハイライトページを並列に取得し、推奨された医薬品（製品名・一般名・適応・意見の種類）を構造化した記録にする
+
+使い方:
+    python chmp.py                 # サイト検索で見つかった最新の会議を解析して表示
+    python chmp.py URL [URL ...]   # 指定したハイライトページを解析して表示
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from enrichment import DetailEnricher, DetailPageCache
+from fingerprint import fingerprint_hex, normalize_url
+from html_parsers import get_parser_backend, parse_document
+from metrics import ITEMS_EXTRACTED, PARSE_SECONDS
+from transport import get_transport
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_FILE = 'chmp_highlights.json'
+
+# 解析方法を変えたら上げる（古い版で解析した会議は解析し直す）
+PARSER_VERSION = 1
+
+# 見出しから判定する節の種類（先に一致したものを使う）
+SECTION_TYPES = (
+    ('negative', ('negative opinion', 'refusal')),
+    ('re_examination', ('re-examination', 're-examinations')),
+    ('withdrawal', ('withdrawal', 'withdrawn')),
+    ('extension', ('extension', 'new indication')),
+    ('positive', ('recommended for approval', 'recommendation for approval', 'new medicines', 'positive opinion')),
+)
+
+# 新規承認の節の中で、文の言い回しから細分する意見の種類
+POSITIVE_SUBTYPES = (
+    ('conditional', ('conditional marketing authorisation', 'conditional approval')),
+    ('exceptional_circumstances', ('exceptional circumstances',)),
+    ('biosimilar', ('biosimilar',)),
+    ('generic', ('generic',)),
+    ('hybrid', ('hybrid',)),
+)
+
+# 「製品名 (一般名)」（製品名は大文字で始まる4語まで、直後の * はオーファン等の注記）
+PRODUCT_PATTERN = re.compile(
+    r'\b([A-Z][\w-]*(?: [A-Z0-9][\w-]*){0,3})\*?\s*\(([a-z][a-z0-9 ,/+-]{2,80}?)\)'
+)
+
+# 適応を示す言い回し（この語句以降を文末または次の製品名までを適応とする）
+INDICATION_PATTERN = re.compile(
+    r'\b(?:for the (?:treatment|prevention|prophylaxis|diagnosis) of|to (?:treat|prevent)|intended for|'
+    r'indicated for|for use in|for)\s+(.+)', re.IGNORECASE
+)
+
+# 会議の日付（例: "22-25 July 2024"）
+MEETING_DATE_PATTERN = re.compile(
+    r'\b(?:\d{1,2}\s*[-–]\s*)?\d{1,2}\s+(January|February|March|April|May|June|July|August|September|'
+    r'October|November|December)\s+(\d{4})\b'
+)
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.;])\s+(?=[A-Z])')
+
+BLOCK_TAGS = ('h2', 'h3', 'h4', 'p', 'li')
+
+def _classify(text, types):
+    """語句の対応表から種類を判定（一致しなければNone）"""
+    lowered = text.lower()
+    for name, phrases in types:
+        if any(phrase in lowered for phrase in phrases):
+            return name
+    return None
+
+def _block_text(parser, element):
+    """要素のテキストを空白を揃えて返す（インライン要素の区切りに空白を入れない）"""
+    return ' '.join(parser.raw_text(element).split())
+
+def _meeting_month(title):
+    """会議名の日付から 'YYYY-MM' を求める（見つからなければNone）"""
+    match = MEETING_DATE_PATTERN.search(title or '')
+    if not match:
+        return None
+    return datetime.strptime(f"{match.group(1)} {match.group(2)}", '%B %Y').strftime('%Y-%m')
+
+def parse_sentence(sentence, opinion_type):
+    """1文から (製品名, 一般名, 適応, 意見の種類) のリストを抽出"""
+    if opinion_type == 'positive':
+        opinion_type = _classify(sentence, POSITIVE_SUBTYPES) or opinion_type
+
+    matches = list(PRODUCT_PATTERN.finditer(sentence))
+    results = []
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(sentence)
+        remainder = sentence[match.end():end]
+        indication = INDICATION_PATTERN.search(remainder)
+        indication = indication.group(1).strip(' ,;.') if indication else ''
+        results.append((match.group(1), ' '.join(match.group(2).split()), indication[:300], opinion_type))
+    return results
+
+def parse_highlights(parser, content, url):
+    """ハイライトページを解析し、会議の情報と推奨された医薬品の記録を返す
+
+    見出しで節の種類（新規承認・適応追加・否定的意見など）を判定し、その節の段落・箇条書きから記録を作る。
+    「次の後発医薬品:」のように「:」で終わる段落の言い回しは、続く箇条書きにも引き継ぐ。
+    """
+    parser, doc = parse_document(parser, content)
+
+    title = None
+    container = doc
+    for element in parser.iter_elements(doc, ('title', 'h1', 'main', 'article')):
+        tag = parser.tag(element)
+        if tag in ('title', 'h1') and (title is None or tag == 'h1'):
+            title = _block_text(parser, element) or title
+        elif tag in ('main', 'article') and container is doc:
+            container = element
+
+    meeting = _meeting_month(title)
+    records = []
+    seen = set()
+    section = None
+    lead = ''
+    for element in parser.iter_elements(container, BLOCK_TAGS):
+        tag = parser.tag(element)
+        text = _block_text(parser, element)
+        if not text:
+            continue
+        if tag in ('h2', 'h3', 'h4'):
+            section = _classify(text, SECTION_TYPES)
+            lead = ''
+            continue
+        if section is None:
+            continue
+
+        if tag == 'p':
+            lead = text if text.endswith(':') else ''
+        for sentence in SENTENCE_SPLIT.split(text):
+            # 箇条書きの項目は直前の段落の言い回し（後発医薬品など）で種類を判定する
+            context = f"{lead} {sentence}" if tag == 'li' else sentence
+            for name, inn, indication, opinion_type in parse_sentence(context, section):
+                key = (name.lower(), opinion_type)
+                if key in seen or name.lower() == inn:
+                    continue
+                seen.add(key)
+                records.append({
+                    'meeting': meeting,
+                    'meeting_title': title,
+                    'url': url,
+                    'name': name,
+                    'inn': inn,
+                    'indication': indication,
+                    'opinion_type': opinion_type,
+                    'orphan': 'orphan' in context.lower(),
+                })
+
+    return {'meeting': meeting, 'title': title, 'url': url, 'records': records}
+
+def to_news_item(record):
+    """記録を通知処理で使うニュース項目の形式にする"""
+    title = f"{record['name']} ({record['inn']})"
+    description = f"CHMP {record['opinion_type']}"
+    if record['indication']:
+        description += f": {record['indication']}"
+    return {
+        'id': fingerprint_hex(f"{title} {record['opinion_type']}", record['url']),
+        'title': title,
+        'link': record['url'],
+        'date': record['meeting'] or '',
+        'description': description[:200],
+        'is_approval_related': record['opinion_type'] not in ('negative', 'withdrawal')
+    }
+
+class HighlightsCache:
+    """会議ごとの解析結果を保存する永続キャッシュクラス（公開後の会議ページは1回だけ解析する）"""
+
+    def __init__(self, file_path=DEFAULT_CACHE_FILE):
+        """file_pathがNoneの場合はファイルに保存しない"""
+        self.file_path = file_path
+        self.entries = self._load()
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """キャッシュファイルを読み込む"""
+        try:
+            if self.file_path and os.path.exists(self.file_path):
+                with open(self.file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    return data
+        except Exception as e:
+            logger.warning(f"{self.file_path} の読み込みに失敗: {e}")
+        return {}
+
+    def get(self, url):
+        """解析済みの会議（未解析・古い版で解析した場合はNone）"""
+        entry = self.entries.get(normalize_url(url))
+        if not entry or entry.get('version') != PARSER_VERSION:
+            return None
+        return entry['meeting']
+
+    def put(self, url, meeting):
+        """会議の解析結果を保存"""
+        with self._lock:
+            self.entries[normalize_url(url)] = {'version': PARSER_VERSION, 'meeting': meeting}
+            self._dirty = True
+
+    def save(self):
+        """変更があればキャッシュファイルに書き出す"""
+        with self._lock:
+            if not self._dirty or not self.file_path:
+                return
+            try:
+                tmp_path = f"{self.file_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.entries, f, ensure_ascii=False)
+                os.replace(tmp_path, self.file_path)
+                self._dirty = False
+            except Exception as e:
+                logger.error(f"{self.file_path} の保存に失敗: {e}")
+
+class CHMPHighlights:
+    """CHMPハイライトページを並列に取得・解析するクラス"""
+
+    def __init__(self, session=None, cache=None, parser='lxml', max_workers=4, max_per_host=2, transport=None):
+        self.session = session or (transport or get_transport()).session()
+        self.cache = cache if cache is not None else HighlightsCache()
+        self.parser = get_parser_backend(parser) if isinstance(parser, str) else parser
+        self.max_workers = max_workers
+        # 解析を分散するプロセスプール（ParsePool、Noneなら取得したスレッドで解析）
+        self.parse_pool = None
+        # 取得はホストごとの同時接続数制限を持つ記事ページの取得処理を使う（本文は解析後に捨てる）
+        self.fetcher = DetailEnricher(self.session, cache=DetailPageCache(cache_dir=None), parser=self.parser,
+                                      max_workers=max_workers, max_per_host=max_per_host)
+
+    def _fetch_meeting(self, url):
+        """ハイライトページを取得して解析（取得・解析できない場合はNone）"""
+        content = self.fetcher.fetch(url)
+        if content is None:
+            return None
+        try:
+            with PARSE_SECONDS.time(source='chmp_highlights'):
+                return parse_highlights(self.parser, content, url)
+        except Exception as e:
+            logger.warning(f"CHMPハイライトの解析に失敗 ({url}): {e}")
+            return None
+
+    def fetch_meetings(self, urls):
+        """ハイライトページの会議を指定順に返す（未解析のページだけを並列に取得する）"""
+        urls = list(dict.fromkeys(url for url in urls if url))
+        missing = [url for url in urls if self.cache.get(url) is None]
+        if missing:
+            workers = max(1, min(self.max_workers, len(missing)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                if self.parse_pool is None:
+                    meetings = list(executor.map(self._fetch_meeting, missing))
+                else:
+                    contents = list(executor.map(self.fetcher.fetch, missing))
+            if self.parse_pool is not None:
+                # 取得はスレッドで並列に行い、解析はまとめてプロセスプールに渡す
+                pages = [(url, content) for url, content in zip(missing, contents) if content is not None]
+                with PARSE_SECONDS.time(source='chmp_highlights'):
+                    parsed = dict(zip((url for url, _ in pages), self.parse_pool.map('chmp_highlights', pages)))
+                meetings = [parsed.get(url) for url in missing]
+            for url, meeting in zip(missing, meetings):
+                if meeting is not None:
+                    self.cache.put(url, meeting)
+                    ITEMS_EXTRACTED.inc(len(meeting['records']), source='chmp_highlights')
+                    logger.info(f"CHMPハイライトを解析しました: {meeting['title']} ({len(meeting['records'])}件)")
+            self.cache.save()
+        logger.info(f"CHMPハイライト {len(urls)}件中 {len(urls) - len(missing)}件は解析済みのため再利用しました")
+        return [meeting for meeting in (self.cache.get(url) for url in urls) if meeting is not None]
+
+    def fetch_records(self, urls):
+        """ハイライトページの推奨医薬品の記録をまとめて返す"""
+        return [record for meeting in self.fetch_meetings(urls) for record in meeting['records']]
+
+def main():
+    """メイン処理"""
+    arg_parser = argparse.ArgumentParser(description='CHMPハイライトの解析')
+    arg_parser.add_argument('urls', nargs='*', help='ハイライトページのURL（省略時はサイト検索の結果）')
+    arg_parser.add_argument('--cache-file', default=DEFAULT_CACHE_FILE, help='解析結果のキャッシュファイル')
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    urls = args.urls
+    if not urls:
+        from scraper import EMAScraper
+        urls = [link['url'] for link in EMAScraper(feed_url=None).get_chmp_highlights()]
+    if not urls:
+        logger.error("CHMPハイライトのページが見つかりません")
+        return False
+
+    highlights = CHMPHighlights(cache=HighlightsCache(args.cache_file))
+    for meeting in highlights.fetch_meetings(urls):
+        print(f"\n📋 {meeting['title']} ({meeting['meeting'] or '日付不明'})")
+        for record in meeting['records']:
+            orphan = ' [orphan]' if record['orphan'] else ''
+            print(f"  - [{record['opinion_type']}] {record['name']} ({record['inn']}){orphan}: {record['indication'] or '-'}")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -4,11 +4,11 @@ EMA承認監視アプリケーション - デバッグ用スクレイピング
 EMAサイトの構造を詳しく分析する
 """
 
-import requests
 import logging
 from bs4 import BeautifulSoup
 import re
 from urllib.parse import urljoin
+from transport import get_transport
 
 # ログ設定
 logging.basicConfig(level=logging.DEBUG)
@@ -20,9 +20,7 @@ class EMADebugScraper:
     def __init__(self):
         self.base_url = "https://www.ema.europa.eu"
         self.news_url = f"{self.base_url}/en/news"
-        self.session = requests.Session()
-        
-        self.session.headers.update({
+        self.session = get_transport().session({
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
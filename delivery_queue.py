@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - Discord配信キュー
+Discordのレート制限ヘッダーに従って送信し、必要に応じてバックグラウンドで配信する
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import requests
+from metrics import WEBHOOK_RATE_LIMITED, WEBHOOK_RETRIES, WEBHOOK_SECONDS
+from transport import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Discordのレート制限ヘッダーに追従するトークンバケットクラス"""
+
+    def __init__(self, capacity=5, refill_seconds=2.0, clock=time.monotonic):
+        """capacity件をrefill_seconds秒で補充する（ヘッダーを受け取ると上書き）"""
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.updated_at = clock()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        """経過時間に応じてトークンを補充"""
+        rate = self.capacity / self.refill_seconds
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+
+    def reserve(self):
+        """トークンを1つ予約し、送信可能になるまでの待ち時間（秒）を返す"""
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            wait = max(0.0, self.blocked_until - now)
+            if self.tokens < 1:
+                rate = self.capacity / self.refill_seconds
+                wait = max(wait, (1 - self.tokens) / rate)
+            self.tokens -= 1
+            return wait
+
+    def block(self, seconds):
+        """指定秒数のあいだ送信を止める（Retry-Afterなど）"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+    def update_from_headers(self, headers):
+        """X-RateLimit-* ヘッダーからバケットの状態を更新"""
+        try:
+            limit = headers.get('X-RateLimit-Limit')
+            remaining = headers.get('X-RateLimit-Remaining')
+            reset_after = headers.get('X-RateLimit-Reset-After')
+            with self._lock:
+                now = self.clock()
+                if limit:
+                    self.capacity = max(1, int(limit))
+                if reset_after:
+                    self.refill_seconds = max(0.1, float(reset_after))
+                if remaining is not None:
+                    self.tokens = float(remaining)
+                    self.updated_at = now
+                    if int(remaining) == 0 and reset_after:
+                        self.blocked_until = max(self.blocked_until, now + float(reset_after))
+        except (TypeError, ValueError) as e:
+            logger.debug(f"レート制限ヘッダーの解析に失敗: {e}")
+
+def retry_after_seconds(response, default=5.0):
+    """429レスポンスから待機秒数を取得"""
+    try:
+        body = response.json()
+        if isinstance(body, dict) and body.get('retry_after') is not None:
+            return float(body['retry_after'])
+    except ValueError:
+        pass
+    try:
+        return float(response.headers.get('Retry-After', default))
+    except (TypeError, ValueError):
+        return default
+
+def deliver_webhook(session, webhook_url, payload, bucket, max_retries=3, sleep=time.sleep):
+    """レート制限に従ってDiscord Webhookに送信（成功時はTrue）"""
+    attempt = 0
+    while attempt < max_retries:
+        wait = bucket.reserve()
+        if wait > 0:
+            sleep(wait)
+
+        start = time.perf_counter()
+        try:
+            response = session.post(webhook_url, json=payload, timeout=30)
+        except requests.exceptions.RequestException as e:
+            WEBHOOK_SECONDS.observe(time.perf_counter() - start, status='error')
+            logger.error(f"Discord送信リクエストエラー (試行 {attempt + 1}): {e}")
+            attempt += 1
+            if attempt < max_retries:
+                WEBHOOK_RETRIES.inc()
+                sleep(backoff_delay(attempt - 1))
+            continue
+
+        WEBHOOK_SECONDS.observe(time.perf_counter() - start, status=response.status_code)
+        bucket.update_from_headers(response.headers)
+
+        if response.status_code in (200, 204):
+            return True
+        elif response.status_code == 429:
+            # Retry-After に従って待機（グローバル制限の場合も同じバケットで止める）
+            retry_after = retry_after_seconds(response)
+            scope = "グローバル" if response.headers.get('X-RateLimit-Global') else "Webhook"
+            logger.warning(f"{scope}レート制限に達しました。{retry_after:.1f}秒後に再送します。")
+            bucket.block(retry_after)
+            WEBHOOK_RATE_LIMITED.inc()
+            attempt += 1
+            if attempt < max_retries:
+                WEBHOOK_RETRIES.inc()
+        elif response.status_code >= 500:
+            logger.warning(f"Discordサーバーエラー (試行 {attempt + 1}): {response.status_code}")
+            attempt += 1
+            if attempt < max_retries:
+                WEBHOOK_RETRIES.inc()
+                sleep(backoff_delay(attempt - 1))
+        else:
+            logger.error(f"Discord送信エラー: {response.status_code} - {response.text}")
+            return False
+
+    return False
+
+class WebhookDeliveryQueue:
+    """Discord Webhookの送信をバックグラウンドのワーカーで行う配信キュークラス"""
+
+    def __init__(self, session, webhook_url, bucket=None, max_retries=5):
+        self.session = session
+        self.webhook_url = webhook_url
+        self.bucket = bucket or TokenBucket()
+        self.max_retries = max_retries
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='discord-delivery', daemon=True)
+        self._worker.start()
+
+    def submit(self, payload):
+        """ペイロードをキューに追加し、送信結果（bool）のFutureを返す"""
+        future = Future()
+        self._queue.put((payload, future))
+        return future
+
+    def _run(self):
+        """キューからペイロードを取り出して順に送信"""
+        while True:
+            payload, future = self._queue.get()
+            try:
+                if payload is None:
+                    return
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(deliver_webhook(
+                        self.session, self.webhook_url, payload, self.bucket, self.max_retries
+                    ))
+                except Exception as e:
+                    logger.error(f"Discord配信中にエラー: {e}")
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """キュー内のペイロードがすべて処理されるまで待機"""
+        self._queue.join()
+
+    def close(self, timeout=None):
+        """残りを送信し終えてからワーカーを停止"""
+        self._queue.put((None, None))
+        self._worker.join(timeout)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - 記事ページの取得と情報付加
+ニュース項目のリンク先を並列に取得し、本文・日付・製品名を項目に付加する
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+from fingerprint import normalize_url
+from html_parsers import get_parser_backend, parse_document
+from metrics import FETCH_BYTES, FETCH_SECONDS, ITEMS_EXTRACTED, PARSE_SECONDS
+from transport import DEFAULT_TIMEOUT, get_transport
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = 'detail_cache'
+INDEX_FILE = 'index.json'
+
+# 付加する本文の最大文字数
+MAX_FULL_TEXT_CHARS = 20000
+
+# 公開日を示すmetaタグ（先に見つかったものを使う）
+DATE_META_NAMES = ('article:published_time', 'dcterms.date', 'dcterms.issued', 'date')
+
+# 「製品名 (一般名)」の形で書かれた製品名（例: Keytruda (pembrolizumab)）
+PRODUCT_NAME_PATTERN = re.compile(r'\b([A-Z][A-Za-z0-9-]{2,})\s*\(([a-z][a-z0-9-]+(?: [a-z0-9-]+){0,2})\)')
+
+# 本文に含めない要素
+NON_CONTENT_TAGS = ('script', 'style', 'noscript', 'nav', 'header', 'footer')
+
+class DetailPageCache:
+    """記事ページをハッシュ値で保存するディスクキャッシュクラス
+
+    本文はBLAKE2のハッシュ値をファイル名として圧縮保存し、URLからハッシュ値への索引を別に持つ。
+    同じ内容のページは1回だけ保存される。cache_dirがNoneの場合はメモリ上だけで保持する。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._index = {}
+        self._objects = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """索引ファイルを読み込む"""
+        if not self.cache_dir:
+            return
+        try:
+            path = os.path.join(self.cache_dir, INDEX_FILE)
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+        except Exception as e:
+            logger.warning(f"記事キャッシュの索引の読み込みに失敗: {e}")
+            self._index = {}
+
+    def _object_path(self, digest):
+        """ハッシュ値に対応するファイルのパス"""
+        return os.path.join(self.cache_dir, 'objects', digest[:2], f"{digest[2:]}.z")
+
+    def __contains__(self, url):
+        with self._lock:
+            return normalize_url(url) in self._index
+
+    def get(self, url):
+        """URLに対応するページの本文（未取得の場合はNone）"""
+        with self._lock:
+            digest = self._index.get(normalize_url(url))
+            if digest is None:
+                return None
+            if digest in self._objects:
+                return self._objects[digest]
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                return zlib.decompress(f.read())
+        except (OSError, zlib.error) as e:
+            logger.warning(f"記事キャッシュの読み込みに失敗 ({url}): {e}")
+            return None
+
+    def put(self, url, content):
+        """ページの本文を保存してハッシュ値を返す"""
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        with self._lock:
+            self._index[normalize_url(url)] = digest
+            self._dirty = True
+            if not self.cache_dir:
+                self._objects[digest] = content
+                return digest
+
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(zlib.compress(content))
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.error(f"記事キャッシュの保存に失敗 ({url}): {e}")
+        return digest
+
+    def save(self):
+        """索引を書き出す"""
+        with self._lock:
+            if not self.cache_dir or not self._dirty:
+                return
+            index = dict(self._index)
+            self._dirty = False
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = os.path.join(self.cache_dir, INDEX_FILE)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"記事キャッシュの索引の保存に失敗: {e}")
+
+def extract_detail_fields(parser, content):
+    """記事ページから本文・公開日・製品名を抽出"""
+    parser, doc = parse_document(parser, content)
+
+    published_date = None
+    main_element = None
+    removable = []
+    for element in list(parser.iter_elements(doc, ('meta', 'time', 'main', 'article') + NON_CONTENT_TAGS)):
+        tag = parser.tag(element)
+        if tag == 'meta' and published_date is None:
+            name = parser.attribute(element, 'property') or parser.attribute(element, 'name')
+            if name in DATE_META_NAMES:
+                published_date = parser.attribute(element, 'content')
+        elif tag == 'time' and published_date is None:
+            published_date = parser.attribute(element, 'datetime') or parser.text(element)
+        elif tag in ('main', 'article') and main_element is None:
+            main_element = element
+        elif tag in NON_CONTENT_TAGS:
+            removable.append(element)
+
+    for element in removable:
+        try:
+            parser.remove(element)
+        except Exception:
+            # 既に取り除いた要素の子孫など
+            continue
+
+    full_text = parser.joined_strings(main_element if main_element is not None else doc)
+    product_names = []
+    for brand, inn in PRODUCT_NAME_PATTERN.findall(full_text):
+        name = f"{brand} ({inn})"
+        if name not in product_names:
+            product_names.append(name)
+
+    return {
+        'full_text': full_text[:MAX_FULL_TEXT_CHARS],
+        'published_date': published_date,
+        'product_names': product_names,
+    }
+
+class DetailEnricher:
+    """記事ページを同時接続数を制限して並列に取得し、項目に情報を付加するクラス"""
+
+    def __init__(self, session=None, cache=None, parser='lxml', max_workers=4, max_per_host=2):
+        self.session = session or get_transport().session()
+        self.cache = cache if cache is not None else DetailPageCache()
+        self.parser = get_parser_backend(parser) if isinstance(parser, str) else parser
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self._host_limits = {}
+        self._host_lock = threading.Lock()
+        # 解析を分散するプロセスプール（ParsePool、Noneなら取得したスレッドで解析）
+        self.parse_pool = None
+
+    def _host_semaphore(self, url):
+        """ホストごとの同時接続数制限を取得"""
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_limits[host]
+
+    def fetch(self, url):
+        """記事ページの本文を取得（キャッシュ済みの場合はダウンロードしない）"""
+        content = self.cache.get(url)
+        if content is not None:
+            return content
+
+        with self._host_semaphore(url):
+            try:
+                with FETCH_SECONDS.time(url=url):
+                    response = self.session.get(url, timeout=DEFAULT_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"記事ページの取得に失敗 ({url}): {e}")
+                return None
+
+        if response.status_code != 200:
+            logger.warning(f"記事ページの取得に失敗 ({url}): {response.status_code}")
+            return None
+
+        FETCH_BYTES.inc(len(response.content), url=url)
+        self.cache.put(url, response.content)
+        return response.content
+
+    def fetch_fields(self, url):
+        """記事ページを取得して抽出した情報を返す（取得できない場合はNone）"""
+        content = self.fetch(url)
+        if content is None:
+            return None
+        try:
+            with PARSE_SECONDS.time(source='detail'):
+                return extract_detail_fields(self.parser, content)
+        except Exception as e:
+            logger.warning(f"記事ページの解析に失敗 ({url}): {e}")
+            return None
+
+    def fetch_all(self, urls):
+        """複数の記事ページを並列に取得し、URL -> 抽出情報 の辞書を返す"""
+        unique_urls = list(dict.fromkeys(url for url in urls if url))
+        if not unique_urls:
+            return {}
+
+        workers = max(1, min(self.max_workers, len(unique_urls)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if self.parse_pool is None:
+                results = dict(zip(unique_urls, executor.map(self.fetch_fields, unique_urls)))
+            else:
+                contents = dict(zip(unique_urls, executor.map(self.fetch, unique_urls)))
+        if self.parse_pool is not None:
+            # 取得はスレッドで並列に行い、解析はまとめてプロセスプールに渡す
+            pages = [(url, content) for url, content in contents.items() if content is not None]
+            with PARSE_SECONDS.time(source='detail'):
+                parsed = self.parse_pool.map('detail', pages)
+            results = dict.fromkeys(unique_urls)
+            results.update((url, fields) for (url, _), fields in zip(pages, parsed))
+        self.cache.save()
+
+        found = sum(1 for fields in results.values() if fields)
+        ITEMS_EXTRACTED.inc(found, source='detail')
+        logger.info(f"記事ページ {found}/{len(unique_urls)}件の情報を取得しました")
+        return results
+
+    def enrich(self, items, url_key='link'):
+        """項目のリンク先を取得し、full_text・published_date・product_names を付加して返す"""
+        results = self.fetch_all(item.get(url_key) for item in items)
+        for item in items:
+            fields = results.get(item.get(url_key))
+            if fields:
+                item.update(fields)
+        return items
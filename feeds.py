@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - フィード取得
+EMAのRSS/Atom（およびJSON Feed）を逐次解析し、HTMLスクレイピングと同じ形式のニュース項目を返す
+"""
+
+import html
+import json
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+try:
+    from lxml import etree
+except ImportError:  # lxmlが無い環境では標準ライブラリで逐次解析する
+    import xml.etree.ElementTree as etree
+
+from fingerprint import fingerprint_hex
+from http_cache import HTTPValidatorCache
+from keyword_matcher import KEYWORD_CLASSIFIER
+from metrics import FETCH_BYTES, FETCH_SECONDS, ITEMS_EXTRACTED, PARSE_SECONDS
+from transport import DEFAULT_TIMEOUT, get_transport
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FEED_URL = 'https://www.ema.europa.eu/en/news.xml'
+
+# 最新項目がこれより古いフィードは更新が止まっているとみなしてHTMLで取得し直す
+FEED_MAX_AGE_HOURS = 72
+
+# 項目として扱う要素（RSSのitemとAtomのentry）
+ITEM_TAGS = ('item', 'entry')
+
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+def _local_name(tag):
+    """名前空間を除いた要素名"""
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+def _parse_date(value):
+    """RSS（RFC 822）・Atom（ISO 8601）の日付をタイムゾーン付きdatetimeに変換"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _plain_text(value):
+    """HTMLを含む説明文をプレーンテキストにする"""
+    return ' '.join(html.unescape(TAG_PATTERN.sub(' ', value or '')).split())
+
+class _CountingReader:
+    """読み込んだバイト数を数えながらレスポンス本文を渡すラッパー"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        return data
+
+def make_news_item(title, link, published, description):
+    """フィードの項目を _parse_link_item と同じ形式のニュース項目にする"""
+    title = ' '.join((title or '').split())
+    description = _plain_text(description)[:200]
+    return {
+        'id': fingerprint_hex(title, link),
+        'title': title,
+        'link': link,
+        'date': published.strftime('%d %B %Y') if published else "",
+        'description': description,
+        'is_approval_related': KEYWORD_CLASSIFIER.has_any(
+            f"{title} {description}", 'approval_news', 'approval_news_extended'
+        )
+    }
+
+def _item_fields(element):
+    """RSSのitem / Atomのentryから (タイトル, リンク, 公開日時, 説明文) を取り出す"""
+    title = link = description = date_text = None
+    for child in element:
+        name = _local_name(child.tag)
+        if name == 'title':
+            title = child.text
+        elif name == 'link':
+            # Atomはhref属性（rel="alternate" または rel省略）、RSSは本文
+            if child.get('href') and child.get('rel', 'alternate') == 'alternate':
+                link = child.get('href')
+            elif child.text and not link:
+                link = child.text.strip()
+        elif name in ('description', 'summary') or (name == 'content' and description is None):
+            description = child.text
+        elif name in ('pubDate', 'published', 'date') or (name == 'updated' and date_text is None):
+            date_text = child.text
+    return title, link, _parse_date(date_text), description
+
+def iter_feed_entries(source, max_items=None):
+    """RSS/Atomを逐次解析し、(ニュース項目, 公開日時) を文書順に返す
+
+    解析済みの要素はすぐに解放するため、フィードの大きさに関わらずメモリ使用量は一定に保たれる。
+    """
+    count = 0
+    for _, element in etree.iterparse(source, events=('end',)):
+        if _local_name(element.tag) not in ITEM_TAGS:
+            continue
+        title, link, published, description = _item_fields(element)
+        element.clear()
+        # lxmlでは処理済みの兄弟要素も親から外してメモリを解放する
+        if hasattr(element, 'getprevious'):
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+        if title and link:
+            yield make_news_item(title, link, published, description), published
+            count += 1
+            if max_items and count >= max_items:
+                return
+
+def iter_json_feed_entries(content, max_items=None):
+    """JSON Feedの項目を (ニュース項目, 公開日時) の形で返す"""
+    feed = json.loads(content)
+    for entry in feed.get('items', [])[:max_items or None]:
+        link = entry.get('url') or entry.get('external_url')
+        if not entry.get('title') or not link:
+            continue
+        published = _parse_date(entry.get('date_published') or entry.get('date_modified'))
+        description = entry.get('summary') or entry.get('content_text') or entry.get('content_html')
+        yield make_news_item(entry['title'], link, published, description), published
+
+class FeedSource:
+    """条件付きGETでフィードを取得し、更新が止まっていないかを判定するクラス"""
+
+    def __init__(self, feed_url=DEFAULT_FEED_URL, session=None, http_cache=None,
+                 max_age_hours=FEED_MAX_AGE_HOURS):
+        self.feed_url = feed_url
+        self.session = session or get_transport().session()
+        self.http_cache = http_cache if http_cache is not None else HTTPValidatorCache()
+        self.max_age = timedelta(hours=max_age_hours)
+
+    def _is_fresh(self, newest):
+        """最新項目が十分に新しいかどうか"""
+        if newest is None:
+            return False
+        return datetime.now(timezone.utc) - newest <= self.max_age
+
+    def _parse_response(self, response, max_items):
+        """レスポンスを形式に応じて解析し、(項目リスト, 最新の公開日時) を返す"""
+        content_type = response.headers.get('Content-Type', '')
+        if 'json' in content_type:
+            content = response.content
+            FETCH_BYTES.inc(len(content), url=self.feed_url)
+            entries = list(iter_json_feed_entries(content, max_items))
+        else:
+            response.raw.decode_content = True
+            reader = _CountingReader(response.raw)
+            entries = list(iter_feed_entries(reader, max_items))
+            FETCH_BYTES.inc(reader.bytes_read, url=self.feed_url)
+
+        items = [item for item, _ in entries]
+        dates = [published for _, published in entries if published]
+        return items, max(dates) if dates else None
+
+    def fetch(self, max_items=None):
+        """フィードの項目を取得（取得できない・更新が止まっている場合はNoneを返す）"""
+        url = self.feed_url
+        try:
+            headers = self.http_cache.conditional_headers(url)
+            with FETCH_SECONDS.time(url=url):
+                response = self.session.get(url, headers=headers, timeout=DEFAULT_TIMEOUT, stream=True)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"フィードの取得に失敗: {e}")
+            return None
+
+        try:
+            if response.status_code == 304:
+                cached = self.http_cache.get_result(url) or {}
+                items = list(cached.get('items', []))
+                newest = _parse_date(cached.get('newest'))
+                logger.info("フィードは前回から更新されていません")
+            elif response.status_code == 200:
+                with PARSE_SECONDS.time(source='feed'):
+                    items, newest = self._parse_response(response, max_items)
+                ITEMS_EXTRACTED.inc(len(items), source='feed')
+                self.http_cache.store(url, response, {
+                    'items': items,
+                    'newest': newest.isoformat() if newest else None
+                })
+                self.http_cache.save()
+            else:
+                logger.warning(f"フィードの取得に失敗: {response.status_code}")
+                return None
+        except Exception as e:
+            logger.warning(f"フィードの解析に失敗: {e}")
+            return None
+        finally:
+            response.close()
+
+        if not items or not self._is_fresh(newest):
+            logger.info(f"フィードの更新が止まっているためHTMLから取得します (最新: {newest})")
+            return None
+
+        logger.info(f"フィードから{len(items)}件の項目を取得しました")
+        return items
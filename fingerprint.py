@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - コンテンツ識別子
+正規化したURLとタイトルから実行をまたいで同一となる識別子を作成し、既知の識別子を管理する
+"""
+
+import hashlib
+import logging
+import os
+from urllib.parse import urljoin, urlparse
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SIZE = 16
+
+def normalize_url(href, base_url=None):
+    """比較用にURLを正規化（絶対URL化・スキーム/ホストの小文字化・フラグメント除去）"""
+    full_url = urljoin(base_url, href) if base_url else href
+    parsed = urlparse(full_url.strip())
+    return parsed._replace(
+        scheme=parsed.scheme.lower(),
+        netloc=parsed.netloc.lower(),
+        path=parsed.path.rstrip('/') or '/',
+        fragment=''
+    ).geturl()
+
+def normalize_title(title):
+    """比較用にタイトルの空白を揃える"""
+    return ' '.join((title or '').split())
+
+def fingerprint(title, url):
+    """タイトルとURLからBLAKE2の識別子（バイト列）を作成"""
+    key = f"{normalize_url(url or '')}\n{normalize_title(title)}"
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+def fingerprint_hex(title, url):
+    """識別子を16進文字列で返す"""
+    return fingerprint(title, url).hex()
+
+def item_fingerprint(item):
+    """ニュース・治験項目の識別子を16進文字列で返す"""
+    url = item.get('url') or item.get('link') or item.get('source') or ''
+    return fingerprint_hex(item.get('title'), url)
+
+class FingerprintSet:
+    """既知の識別子を保持する集合クラス
+
+    ファイルには固定長（16バイト）の識別子をそのまま連結して保存し、
+    メモリ上では集合として保持するため所属判定は定数時間で行える。
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path
+        self._digests = set()
+        self._pending = []
+        self._load()
+
+    def _load(self):
+        """識別子ファイルを読み込む"""
+        try:
+            if self.file_path and os.path.exists(self.file_path):
+                with open(self.file_path, 'rb') as f:
+                    data = f.read()
+                usable = len(data) - len(data) % DIGEST_SIZE
+                self._digests = {
+                    data[i:i + DIGEST_SIZE] for i in range(0, usable, DIGEST_SIZE)
+                }
+        except Exception as e:
+            logger.warning(f"{self.file_path} の読み込みに失敗: {e}")
+
+    @staticmethod
+    def _to_digest(value):
+        """16進文字列またはバイト列を識別子のバイト列に変換"""
+        return bytes.fromhex(value) if isinstance(value, str) else bytes(value)
+
+    def __contains__(self, value):
+        return self._to_digest(value) in self._digests
+
+    def __len__(self):
+        return len(self._digests)
+
+    def add(self, value):
+        """識別子を追加（新規の場合はTrue）"""
+        digest = self._to_digest(value)
+        if digest in self._digests:
+            return False
+        self._digests.add(digest)
+        self._pending.append(digest)
+        return True
+
+    def filter_new(self, items, mark=True):
+        """前回までに見ていない項目だけを返す（markがTrueなら既知として追加）"""
+        new_items = []
+        for item in items:
+            digest = self._to_digest(item_fingerprint(item))
+            if digest in self._digests:
+                continue
+            new_items.append(item)
+            if mark:
+                self.add(digest)
+        return new_items
+
+    def save(self):
+        """追加された識別子をファイル末尾に書き出す"""
+        if not self._pending or not self.file_path:
+            return
+        try:
+            with open(self.file_path, 'ab') as f:
+                f.write(b''.join(self._pending))
+            self._pending = []
+        except Exception as e:
+            logger.error(f"{self.file_path} の保存に失敗: {e}")
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - HTMLパーサーバックエンド
+lxml（XPath）とBeautifulSoupを同じ操作で扱えるようにする
+"""
+
+import logging
+from bs4 import BeautifulSoup
+from bs4.element import PreformattedString
+
+try:
+    import lxml.html
+except ImportError:  # lxmlが無い環境ではBeautifulSoupのみ使用
+    lxml = None
+
+logger = logging.getLogger(__name__)
+
+class SoupBackend:
+    """BeautifulSoup（html.parser）によるバックエンド"""
+
+    name = 'bs4'
+
+    def parse(self, content):
+        """HTMLを解析してドキュメントを返す"""
+        return BeautifulSoup(content, 'html.parser')
+
+    def iter_elements(self, doc, tags):
+        """指定タグの要素を文書順に1回の走査で返す"""
+        return doc.find_all(list(tags))
+
+    def is_descendant(self, element, ancestor):
+        """elementがancestorの子孫かどうか"""
+        return any(parent is ancestor for parent in element.parents)
+
+    def tag(self, element):
+        """タグ名"""
+        return element.name
+
+    def class_names(self, element):
+        """class属性のクラス名一覧"""
+        return element.get('class') or []
+
+    def links(self, doc):
+        """href属性を持つ全リンク"""
+        return doc.find_all('a', href=True)
+
+    def href(self, element):
+        """リンクのhref属性"""
+        return element.get('href')
+
+    def attribute(self, element, name):
+        """任意の属性値（無い場合はNone）"""
+        return element.get(name)
+
+    def remove(self, element):
+        """要素を文書から取り除く"""
+        element.decompose()
+
+    def text(self, element):
+        """前後の空白を除いたテキストを連結して返す"""
+        return element.get_text(strip=True)
+
+    def parent(self, element):
+        """親要素"""
+        return element.parent
+
+    def joined_strings(self, element):
+        """テキストノードを空白区切りで連結して返す"""
+        return ' '.join(t.strip() for t in element.find_all(text=True) if t.strip())
+
+    def strings(self, element):
+        """空でないテキストノードを文書順に返す"""
+        # コメント・DOCTYPEなどはlxmlと同様に除外する
+        return [
+            t for t in element.find_all(text=True)
+            if t.strip() and not isinstance(t, PreformattedString)
+        ]
+
+    def raw_text(self, element):
+        """加工していないテキストを返す"""
+        return element.get_text()
+
+class LxmlBackend:
+    """lxml.html とXPathによる高速バックエンド"""
+
+    name = 'lxml'
+
+    def parse(self, content):
+        """HTMLを解析してドキュメントを返す"""
+        return lxml.html.document_fromstring(content)
+
+    def iter_elements(self, doc, tags):
+        """指定タグの要素を文書順に1回の走査で返す"""
+        return doc.iter(*tags)
+
+    def is_descendant(self, element, ancestor):
+        """elementがancestorの子孫かどうか"""
+        return any(parent is ancestor for parent in element.iterancestors())
+
+    def tag(self, element):
+        """タグ名"""
+        return element.tag
+
+    def class_names(self, element):
+        """class属性のクラス名一覧"""
+        return (element.get('class') or '').split()
+
+    def links(self, doc):
+        """href属性を持つ全リンク"""
+        return doc.xpath('//a[@href]')
+
+    def href(self, element):
+        """リンクのhref属性"""
+        return element.get('href')
+
+    def attribute(self, element, name):
+        """任意の属性値（無い場合はNone）"""
+        return element.get(name)
+
+    def remove(self, element):
+        """要素を文書から取り除く（後続のテキストは残す）"""
+        element.drop_tree()
+
+    def text(self, element):
+        """前後の空白を除いたテキストを連結して返す"""
+        return ''.join(t.strip() for t in element.xpath('.//text()'))
+
+    def parent(self, element):
+        """親要素"""
+        return element.getparent()
+
+    def joined_strings(self, element):
+        """テキストノードを空白区切りで連結して返す"""
+        return ' '.join(t.strip() for t in element.xpath('.//text()') if t.strip())
+
+    def strings(self, element):
+        """空でないテキストノードを文書順に返す"""
+        return [t for t in element.xpath('.//text()') if t.strip()]
+
+    def raw_text(self, element):
+        """加工していないテキストを返す"""
+        return ''.join(element.xpath('.//text()'))
+
+PARSER_BACKENDS = {
+    SoupBackend.name: SoupBackend,
+    LxmlBackend.name: LxmlBackend,
+}
+
+def get_parser_backend(name='lxml'):
+    """名前からパーサーバックエンドを取得（lxmlが使えない場合はBeautifulSoup）"""
+    if name not in PARSER_BACKENDS:
+        raise ValueError(f"不明なパーサーバックエンド: {name}")
+    if name == LxmlBackend.name and lxml is None:
+        logger.warning("lxmlが利用できないためBeautifulSoupを使用します")
+        name = SoupBackend.name
+    return PARSER_BACKENDS[name]()
+
+def parse_document(backend, content):
+    """指定バックエンドで解析し、失敗した場合はBeautifulSoupで解析し直す
+
+    (実際に使用したバックエンド, ドキュメント) を返す
+    """
+    try:
+        return backend, backend.parse(content)
+    except Exception as e:
+        if backend.name == SoupBackend.name:
+            raise
+        logger.warning(f"{backend.name}での解析に失敗したためBeautifulSoupで再解析します: {e}")
+        fallback = SoupBackend()
+        return fallback, fallback.parse(content)
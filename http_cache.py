@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+CBP501三相治験監視アプリケーション - HTTP検証子キャッシュ
+ETag / Last-Modified を永続化し、条件付きGETで未変更ページの再解析を省略する
+"""
+
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+class HTTPValidatorCache:
+    """HTTP検証子と前回の解析結果を保存する永続キャッシュクラス"""
+
+    def __init__(self, file_path=None):
+        """file_pathがNoneの場合はファイルに保存しない"""
+        self.file_path = file_path
+        self.entries = self._load()
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """キャッシュファイルを読み込む"""
+        try:
+            if self.file_path and os.path.exists(self.file_path):
+                with open(self.file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    return data
+        except Exception as e:
+            logger.warning(f"{self.file_path} の読み込みに失敗: {e}")
+        return {}
+
+    def conditional_headers(self, url):
+        """条件付きGET用のリクエストヘッダーを返す"""
+        entry = self.entries.get(url)
+        # 前回結果がなければ304を受けても再利用できないため通常のGETにする
+        if not entry or 'result' not in entry:
+            return {}
+
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def get_result(self, url):
+        """前回の解析結果を返す"""
+        entry = self.entries.get(url)
+        return entry.get('result') if entry else None
+
+    def store(self, url, response, result):
+        """レスポンスの検証子と解析結果を保存"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+
+        with self._lock:
+            if not etag and not last_modified:
+                # 検証子がないページは条件付きGETできないのでキャッシュしない
+                if self.entries.pop(url, None) is not None:
+                    self._dirty = True
+                return
+
+            self.entries[url] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'result': result
+            }
+            self._dirty = True
+
+    def clear(self):
+        """保存済みの検証子と解析結果をすべて破棄（解析の条件が変わった場合）"""
+        with self._lock:
+            if self.entries:
+                self.entries = {}
+                self._dirty = True
+
+    def save(self):
+        """変更があればキャッシュファイルに書き出す"""
+        with self._lock:
+            if not self._dirty or not self.file_path:
+                return
+            try:
+                tmp_path = f"{self.file_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.entries, f, ensure_ascii=False)
+                os.replace(tmp_path, self.file_path)
+                self._dirty = False
+            except Exception as e:
+                logger.error(f"{self.file_path} の保存に失敗: {e}")
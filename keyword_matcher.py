@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+CBP501三相治験監視アプリケーション - 複数キーワード検出
+複数のパターンの出現位置をまとめて検出し、スクレイパーと通知処理で共有するキーワード分類を提供する
+"""
+
+from metrics import CLASSIFICATION_HITS
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasickが無い環境ではパターンごとの部分文字列検索で走査
+    ahocorasick = None
+
+class MultiPatternMatcher:
+    """複数パターンの全出現位置を検出するマッチャークラス
+
+    pyahocorasickがあればAho-Corasick法のオートマトンを構築し、パターン数によらず
+    テキストを1回走査するだけで全パターンの出現を得る。
+    無い場合はパターンごとにCの部分文字列検索を繰り返す（O(テキスト長×パターン数)）。
+    数十語程度の現在のキーワード数では、どちらも従来の any(k in text) のループと同程度の速さになる
+    （bench_matcher.py で計測）。
+    """
+
+    def __init__(self, patterns, ignore_case=False):
+        self.patterns = list(dict.fromkeys(patterns))
+        if not self.patterns or not all(self.patterns):
+            raise ValueError("空でないパターンを1つ以上指定してください")
+
+        self.ignore_case = ignore_case
+        self.max_length = max(len(p) for p in self.patterns)
+
+        self._keys = {self._normalize(p): p for p in self.patterns}
+        # 同じ位置で始まる一致はパターンの登録順に並べる
+        self._order = {key: order for order, key in enumerate(self._keys)}
+
+        # バイト列はlatin-1で1バイト1文字の文字列に読み替えてオートマトンに登録する（位置は変わらない）
+        self._automaton = None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for key, pattern in self._keys.items():
+                automaton.add_word(self._as_text(key), (self._order[key], len(key), pattern))
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def _normalize(self, value):
+        """大文字小文字を無視する場合は小文字に揃える（位置がずれないよう長さは変えない）"""
+        if not self.ignore_case:
+            return value
+        lowered = value.lower()
+        if len(lowered) != len(value):
+            # 小文字化で長さが変わる文字（例: 'İ'）はそのまま残す
+            lowered = ''.join(char if len(char.lower()) != 1 else char.lower() for char in value)
+        return lowered
+
+    @staticmethod
+    def _as_text(value):
+        """オートマトンで扱う文字列に変換"""
+        return value.decode('latin-1') if isinstance(value, bytes) else value
+
+    def finditer(self, data, offset=0):
+        """(パターン, 位置) を出現順に返す（同じ位置ではパターンの登録順）"""
+        text = self._normalize(data)
+        if self._automaton is not None:
+            found = [
+                (end - length + 1, order, pattern)
+                for end, (order, length, pattern) in self._automaton.iter(self._as_text(text))
+            ]
+        else:
+            found = []
+            for key, pattern in self._keys.items():
+                position = text.find(key)
+                while position >= 0:
+                    found.append((position, self._order[key], pattern))
+                    position = text.find(key, position + 1)
+        found.sort()
+        for start, _, pattern in found:
+            yield pattern, start + offset
+
+    def first_occurrences(self, data):
+        """出現したパターンを (パターン, 最初の位置) で出現順に返す（パターンごとに1回の部分文字列検索）"""
+        text = self._normalize(data)
+        present = [key for key in self._keys if key in text]
+        found = sorted((text.find(key), self._order[key], key) for key in present)
+        return [(self._keys[key], position) for position, _, key in found]
+
+    def contains_any(self, data, patterns):
+        """指定パターンのいずれかが出現するかどうか（見つかった時点で検索を終える）"""
+        text = self._normalize(data)
+        return any(self._normalize(pattern) in text for pattern in patterns)
+
+    def search_all(self, data):
+        """パターンごとの出現位置リストを返す"""
+        hits = {}
+        for pattern, position in self.finditer(data):
+            hits.setdefault(pattern, []).append(position)
+        return hits
+
+    def stream(self, max_positions=50):
+        """チャンク単位で走査するストリームスキャナーを作成"""
+        return StreamScanner(self, max_positions)
+
+class StreamScanner:
+    """チャンク境界をまたぐ一致も検出するストリーム走査クラス"""
+
+    def __init__(self, matcher, max_positions=50):
+        self.matcher = matcher
+        self.max_positions = max_positions
+        self.hits = {}
+        self.total_length = 0
+        self._tail = None
+
+    def feed(self, chunk):
+        """チャンクを追加で走査"""
+        if not chunk:
+            return
+
+        # 前回チャンクの末尾（最長パターン長-1）を重ねて境界をまたぐ一致を拾う
+        tail = self._tail if self._tail is not None else chunk[:0]
+        data = tail + chunk
+        data_start = self.total_length - len(tail)
+
+        for pattern, position in self.matcher.finditer(data, data_start):
+            positions = self.hits.setdefault(pattern, [])
+            # 重ね合わせ部分で同じ一致を二重に数えない
+            if positions and positions[-1] >= position:
+                continue
+            if len(positions) < self.max_positions:
+                positions.append(position)
+
+        self.total_length += len(chunk)
+        keep = self.matcher.max_length - 1
+        self._tail = data[-keep:] if keep > 0 else data[:0]
+
+    def found(self, pattern):
+        """指定パターンが検出済みかどうか"""
+        return pattern in self.hits
+
+    def found_all(self):
+        """全パターンが検出済みかどうか"""
+        return all(pattern in self.hits for pattern in self.matcher.patterns)
+
+# カテゴリごとのキーワード定義（すべて小文字）
+KEYWORD_CATEGORIES = {
+    # 治験・臨床試験関連キーワード
+    'clinical': [
+        'phase i', 'phase ii', 'phase iii', 'phase 1', 'phase 2', 'phase 3',
+        'clinical trial', 'clinical study', 'investigational', 'protocol',
+        'cbp501', 'first-in-human', 'dose-escalation', 'pivotal',
+        'enrollment', 'endpoint', 'efficacy', 'safety'
+    ],
+    # 医薬品関連キーワード
+    'drug': [
+        'vaccine', 'treatment', 'therapy', 'medicine', 'drug',
+        'cancer', 'oncology', 'diabetes', 'cardiovascular',
+        'antibiotic', 'antiviral', 'biosimilar', 'generic',
+        'compound', 'candidate', 'novel therapy'
+    ],
+    # 承認関連キーワード（通知のキーワード表示用）
+    'approval': [
+        'approved', 'authorisation', 'recommendation', 'chmp',
+        'positive opinion', 'marketing authorisation', 'conditional',
+        'breakthrough', 'fast track', 'priority review',
+        'orphan designation', 'scientific advice'
+    ],
+    # 企業名キーワード
+    'company': [
+        'pfizer', 'roche', 'novartis', 'gsk', 'astrazeneca',
+        'merck', 'sanofi', 'johnson', 'bayer', 'takeda',
+        'moderna', 'biogen', 'gilead', 'amgen'
+    ],
+    # ニュース項目の承認関連判定用キーワード
+    'approval_news': [
+        'recommended for approval', 'positive opinion', 'marketing authorisation',
+        'new medicine', 'chmp', 'committee for medicinal products',
+        'approved', 'authorisation', 'recommendation'
+    ],
+    # view-content内のリンク項目でのみ追加で判定するキーワード
+    'approval_news_extended': [
+        'conditional marketing', 'orphan medicine', 'biosimilar', 'generic medicine'
+    ],
+    # 治験情報かどうかの判定用キーワード
+    'trial': [
+        'phase', 'trial', 'study', 'clinical', 'cbp501'
+    ],
+    'trial_extended': [
+        'investigational', 'protocol'
+    ]
+}
+
+class KeywordClassifier:
+    """全カテゴリのキーワードを1つのマッチャーで分類するクラス"""
+
+    def __init__(self, categories):
+        self.categories = {name: list(keywords) for name, keywords in categories.items()}
+        self._keyword_categories = {}
+        for name, keywords in self.categories.items():
+            for keyword in keywords:
+                self._keyword_categories.setdefault(keyword, []).append(name)
+        self.matcher = MultiPatternMatcher(list(self._keyword_categories), ignore_case=True)
+        self._matchers = {}
+
+    def classify(self, text):
+        """カテゴリごとの (キーワード, 位置) リストを返す"""
+        hits = {}
+        if not text:
+            return hits
+        for keyword, position in self.matcher.finditer(text):
+            for name in self._keyword_categories[keyword]:
+                hits.setdefault(name, []).append((keyword, position))
+        for name in hits:
+            CLASSIFICATION_HITS.inc(category=name)
+        return hits
+
+    def has_any(self, text, *categories):
+        """指定カテゴリのキーワードを1つでも含むかどうか（指定カテゴリのキーワードだけを調べる）"""
+        for name in categories:
+            if text and self.matcher.contains_any(text, self.categories[name]):
+                CLASSIFICATION_HITS.inc(category=name)
+                return True
+        return False
+
+    def keywords(self, text, *categories):
+        """一致したキーワードを出現順・重複なしで返す（カテゴリ指定なしは全カテゴリ）"""
+        return [keyword for keyword, _ in self._category_matcher(categories).first_occurrences(text or '')]
+
+    def _category_matcher(self, categories):
+        """指定カテゴリのキーワードだけのマッチャー（カテゴリの組ごとに一度だけ作成）"""
+        if not categories:
+            return self.matcher
+        matcher = self._matchers.get(categories)
+        if matcher is None:
+            keywords = [keyword for keyword, names in self._keyword_categories.items()
+                        if any(name in categories for name in names)]
+            matcher = self._matchers.setdefault(categories, MultiPatternMatcher(keywords, ignore_case=True))
+        return matcher
+
+# インポート時に一度だけコンパイルする共有インスタンス
+KEYWORD_CLASSIFIER = KeywordClassifier(KEYWORD_CATEGORIES)
@@ -4,13 +4,28 @@ CBP501三相治験監視アプリケーション - メインプログラム
 CBP501の三相治験開始のニュースがあるかどうかのみを判定・報告
 """
 
+import argparse
 import logging
+import signal
 import sys
+import threading
+import time
 from datetime import datetime
+from zoneinfo import ZoneInfo
 import os
-import pytz
-from cbp501_scraper import CBP501Scraper
-from cbp501_notifier import CBP501Notifier
+from metrics import METRICS, RUN_SECONDS
+from preflight import MONITORED_URLS, cached_results, load_validators, pages_unchanged
+from scheduler import AdaptiveScheduler
+from state_store import StateStore
+
+# スクレイパー・通知処理・通信基盤（requests・BeautifulSoup・lxmlなど）は、起動前チェックで
+# 変化が無いと分かった場合に読み込まずに済むよう、使う直前にインポートする
+
+JST = ZoneInfo('Asia/Tokyo')
+
+HTTP_CACHE_FILE = 'cbp501_http_cache.json'
+NEWS_INDEX_FILE = 'news_index.db'
+WATCHLIST_FILE = 'watchlist.json'
 
 # ログ設定
 logging.basicConfig(
@@ -27,8 +42,10 @@ logger = logging.getLogger(__name__)
 def load_environment():
     """環境変数の読み込み"""
     try:
-        from dotenv import load_dotenv
-        load_dotenv()
+        # GitHub Actionsなどで環境変数が設定済みの場合は .env を読まない（python-dotenvの読み込みを省く）
+        if not os.getenv('DISCORD_WEBHOOK_URL'):
+            from dotenv import load_dotenv
+            load_dotenv()
         
         discord_webhook = os.getenv('DISCORD_WEBHOOK_URL')
         if not discord_webhook:
@@ -39,37 +56,146 @@ def load_environment():
         logger.error(f"環境変数の読み込みに失敗: {e}")
         sys.exit(1)
 
-def load_last_run_data(file_path):
-    """最終実行データを読み込む"""
-    try:
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read().strip()
-        return None
-    except Exception as e:
-        logger.warning(f"{file_path} の読み込みに失敗: {e}")
-        return None
+def parse_args():
+    """コマンドライン引数の解析"""
+    parser = argparse.ArgumentParser(description='CBP501三相治験監視アプリケーション')
+    parser.add_argument(
+        '--daemon', action='store_true',
+        help='常駐モードで定期的にチェックする（指定しない場合は1回だけ実行）'
+    )
+    parser.add_argument(
+        '--interval', type=float, default=float(os.getenv('POLL_INTERVAL_MINUTES', '5')),
+        help='常駐モードのチェック間隔（分）'
+    )
+    parser.add_argument(
+        '--jitter', type=float, default=float(os.getenv('POLL_JITTER_SECONDS', '30')),
+        help='チェック間隔の揺らぎ（秒）'
+    )
+    parser.add_argument(
+        '--max-interval', type=float, default=float(os.getenv('MAX_POLL_INTERVAL_MINUTES', '60')),
+        help='EMAサイトの障害中に伸ばすチェック間隔の上限（分）'
+    )
+    parser.add_argument(
+        '--checkpoint-interval', type=float,
+        default=float(os.getenv('CHECKPOINT_INTERVAL_MINUTES', '15')),
+        help='常駐モードで状態をディスクに書き出す間隔（分）'
+    )
+    parser.add_argument(
+        '--metrics-file', default=os.getenv('METRICS_TEXTFILE'),
+        help='チェックのたびにPrometheus形式のメトリクスを書き出すファイル'
+    )
+    parser.add_argument(
+        '--metrics-port', type=int, default=int(os.getenv('METRICS_PORT', '0')),
+        help='常駐モードで /metrics を公開するポート（0の場合は公開しない）'
+    )
+    parser.add_argument(
+        '--no-preflight', action='store_true',
+        default=os.getenv('PREFLIGHT', '1').lower() in ('0', 'false', 'no'),
+        help='起動前チェック（監視ページが未変更なら解析せずに終了）を行わない'
+    )
+    parser.add_argument(
+        '--http2', action='store_true',
+        default=os.getenv('HTTP2', '').lower() in ('1', 'true', 'yes'),
+        help='HTTP/2で接続を多重化する（httpx[http2] が必要）'
+    )
+    parser.add_argument(
+        '--parse-workers', type=int, default=int(os.getenv('PARSE_WORKERS', '0')),
+        help='ページの解析に使うプロセス数（0の場合はスレッド内で解析する）'
+    )
+    return parser.parse_args()
 
-def save_run_data(file_path, data):
-    """実行データを保存"""
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(str(data))
-    except Exception as e:
-        logger.error(f"{file_path} の保存に失敗: {e}")
+def survival_check_due(store):
+    """日本時間の21時台で今日の生存確認をまだ送っていなければ (True, 今日の日付) を返す"""
+    now_jst = datetime.now(JST)
+    today_str = now_jst.strftime('%Y-%m-%d')
+    return now_jst.hour == 21 and store.get_value('last_survival_check') != today_str, today_str
 
-def main():
-    """メイン処理"""
-    logger.info("=== CBP501三相治験監視アプリ開始 ===")
-    
-    config = load_environment()
-    notifier = CBP501Notifier(config['discord_webhook'])
-    
-    # 実行回数を読み込んで1加算
+def watchlist_stamp():
+    """監視対象リストの更新時刻（変更の検出用）"""
     try:
-        execution_count = int(load_last_run_data('execution_counter.txt') or 0) + 1
-    except ValueError:
-        execution_count = 1
+        return str(os.stat(WATCHLIST_FILE).st_mtime_ns)
+    except OSError:
+        return ''
+
+def run_preflight(store, cache_file=HTTP_CACHE_FILE, urls=MONITORED_URLS):
+    """スクレイパーを読み込まずに「変化なし」と判定できれば実行を記録してTrueを返す
+
+    保存済みの検証子による条件付きHEADリクエストで、すべての監視ページが未変更と確認できた場合のみ終了する。
+    初回実行・EMAサイトの障害中・生存確認の時間帯・監視対象リストの変更後・未通知の項目がある場合は通常のチェックを行う。
+    未通知かどうかは通知時と同じ識別子（監視ページのURLとタイトル）で判定するため、記事ページでの確認の有無に左右されない。
+    """
+    if not store.get_value('execution_count') or store.get_value('ema_site_status', 'up') == 'down':
+        return False
+    if survival_check_due(store)[0]:
+        return False
+    if store.get_value('watchlist_stamp', '') != watchlist_stamp():
+        return False
+
+    entries = load_validators(cache_file)
+    items = cached_results(entries, urls)
+    if store.filter_unseen(items) or not pages_unchanged(entries, urls):
+        return False
+
+    execution_count = store.increment('execution_count')
+    run_id = store.start_run(execution_count)
+    store.finish_run(run_id, 'unchanged', found_count=len(items))
+    logger.info("監視ページは前回から更新されていません（起動前チェック）。解析を省略して終了します")
+    return True
+
+def backoff_active(store):
+    """EMAサイトの障害による待ち時間中であれば、スクレイパーを読み込まずに実行を記録してTrueを返す"""
+    next_check_after = store.get_value('next_check_after', '')
+    if not next_check_after or time.time() >= float(next_check_after):
+        return False
+
+    execution_count = store.increment('execution_count')
+    run_id = store.start_run(execution_count)
+    store.finish_run(run_id, 'backoff')
+    resume_at = datetime.fromtimestamp(float(next_check_after), JST).strftime('%Y-%m-%d %H:%M')
+    logger.info(f"EMAサイトの障害中のため、{resume_at} (JST) までチェックを省略します")
+    return True
+
+def schedule_backoff(scraper, store, args, status):
+    """1回だけ実行する場合に、次回チェックできる時刻（next_check_after）を状態ストアに保存する
+
+    常駐モードと同じ規則（AdaptiveScheduler）で、障害中・応答が遅い間は待ち時間を前回の2倍（1.5倍）ずつ
+    max_interval まで伸ばし、その間のcronでの実行ではチェックを省略する。正常に戻れば待ち時間を消去する。
+    """
+    scheduler = AdaptiveScheduler(args.interval * 60, 0, args.max_interval * 60)
+    scheduler.interval = float(store.get_value('backoff_seconds') or scheduler.base_interval)
+    health, circuit_state = scraper.host_health()
+    if status == 'unavailable' and circuit_state == 'closed':
+        # 今回接続できなかった場合は、ブレーカーが開くほど失敗していなくても障害中として扱う
+        circuit_state = 'open'
+    interval = scheduler.adapt(health, circuit_state)
+
+    if interval == scheduler.base_interval:
+        store.set_value('backoff_seconds', '')
+        store.set_value('next_check_after', '')
+    else:
+        store.set_value('backoff_seconds', interval)
+        store.set_value('next_check_after', time.time() + interval)
+
+def delivery_succeeded(result):
+    """通知の送信結果を判定（非同期配信の場合はFutureの配信完了を待って成否を返す）"""
+    if hasattr(result, 'result'):
+        try:
+            return bool(result.result())
+        except Exception as e:
+            logger.error(f"通知の配信に失敗: {e}")
+            return False
+    return bool(result)
+
+def run_check(scraper, notifier, store):
+    """1回分の監視処理
+
+    実行履歴と同じ結果（'success' / 'unavailable'（EMAサイトの障害） / 'error'）を返す。
+    """
+    from cbp501_scraper import LEGACY_COMPOUND, SiteUnavailableError
+
+    # 実行回数を1加算
+    execution_count = store.increment('execution_count')
+    run_id = store.start_run(execution_count)
     
     # 初回実行の場合、ステータスレポートを送信
     if execution_count == 1:
@@ -78,36 +204,82 @@ def main():
         notifier.send_status_report(False, [], 0)
 
     try:
-        # 治験情報のスクレイピング
-        scraper = CBP501Scraper()
-        logger.info("CBP501三相治験情報の検索を開始")
-        cbp501_found, cbp501_details = scraper.search_cbp501_phase3()
+        # 前回EMAサイトに接続できなかった場合は、HEADリクエスト1回で復旧を確認してから検索する
+        if store.get_value('ema_site_status', 'up') == 'down' and not scraper.probe():
+            logger.warning("EMAサイトは引き続き応答しません。今回のチェックを省略します")
+            store.finish_run(run_id, 'unavailable')
+            return 'unavailable'
+        
+        # 治験情報のスクレイピング（監視対象すべてを1回の取得・走査で判定）
+        logger.info("監視対象の治験情報の検索を開始")
+        results = scraper.search_watchlist()
+        if store.record_status('ema_site', 'up', default='up') == 'down':
+            logger.info("EMAサイトが復旧しました")
+            notifier.send_site_status_notification(True)
+        cbp501_details = [item for items in results.values() for item in items]
+        cbp501_found = bool(cbp501_details)
         
-        current_status = "発見" if cbp501_found else "未発見"
-        last_status = load_last_run_data('cbp501_status.txt') or "未発見"
+        # 監視対象ごとに発見・未発見の状態遷移を記録
+        last_statuses = {}
+        for rule in scraper.watchlist.rules:
+            current_status = "発見" if results.get(rule.name) else "未発見"
+            last_status = store.record_status(rule.subject, current_status, default="未発見")
+            last_statuses[rule.subject] = last_status
+            if last_status != current_status:
+                logger.info(f"{rule.name}: {last_status} → {current_status}")
         
-        # 治験情報が新たに見つかった場合に通知
-        if cbp501_found and current_status != last_status:
-            logger.info("🎉 CBP501三相治験情報を新規発見！")
-            notifier.send_cbp501_found_notification(cbp501_details)
+        # テキストファイルから移行した直後で既に発見済みの場合は、通知済みとして扱う
+        # （旧バージョンのステータスは監視対象リスト導入前の対象についてのみ記録されている）
+        legacy_rule = next((rule for rule in scraper.watchlist.rules if rule.name == LEGACY_COMPOUND), None)
+        if legacy_rule and last_statuses.get(legacy_rule.subject) == "発見" and store.count_seen() == 0:
+            store.mark_seen(results.get(legacy_rule.name, []))
         
-        # 状態を保存
-        save_run_data('cbp501_status.txt', current_status)
+        # 通知済みでない治験情報が見つかった場合のみ通知
+        new_details = store.filter_unseen(cbp501_details)
+        if cbp501_found and new_details:
+            new_by_compound = {}
+            for item in new_details:
+                new_by_compound.setdefault(item.get('compound', LEGACY_COMPOUND), []).append(item)
+            for compound, items in new_by_compound.items():
+                logger.info(f"🎉 {compound}の治験情報を新規発見！")
+                # 配信に成功した場合のみ通知済みにする（失敗した項目は次回再通知する）
+                if delivery_succeeded(notifier.send_cbp501_found_notification(items)):
+                    store.mark_seen(items)
 
-        # 日本時間の21時台に生存確認を1日1回送信
-        jst = pytz.timezone('Asia/Tokyo')
-        now_jst = datetime.now(jst)
-        today_str = now_jst.strftime('%Y-%m-%d')
-        last_survival_check_date = load_last_run_data('last_survival_check.txt')
+        # 監視ページの本文の変化のうち、監視対象に言及する行の追加・削除を通知
+        for url, page_diff in scraper.last_page_diffs.items():
+            logger.info(f"{url} の内容の変化:\n{page_diff.summary()}")
+            for rule in scraper.watchlist.rules:
+                added, removed = page_diff.lines_matching(
+                    lambda line: scraper.watchlist.mentions(rule, line)
+                )
+                if added or removed:
+                    logger.info(f"📝 {rule.name}に関する記載が変化しました ({url})")
+                    notifier.send_content_change_notification(rule.name, page_diff, added, removed)
 
-        if now_jst.hour == 21 and last_survival_check_date != today_str:
+        # 日本時間の21時台に生存確認を1日1回送信
+        due, today_str = survival_check_due(store)
+        if due:
             logger.info("生存確認通知を送信します。")
             # 修正箇所：引数を正しく渡す
             notifier.send_status_report(cbp501_found, cbp501_details, execution_count)
-            save_run_data('last_survival_check.txt', today_str)
+            store.set_value('last_survival_check', today_str)
+
+        store.set_value('watchlist_stamp', watchlist_stamp())
+        store.finish_run(run_id, 'success', found_count=len(cbp501_details))
+        return 'success'
+
+    except SiteUnavailableError as e:
+        # サイトの障害はエラー通知を繰り返さず、障害の開始時に1回だけ通知する
+        logger.warning(f"EMAサイトに接続できません: {e}")
+        store.finish_run(run_id, 'unavailable', error=str(e))
+        if store.record_status('ema_site', 'down', default='up') != 'down':
+            notifier.send_site_status_notification(False, str(e))
+        return 'unavailable'
 
     except Exception as e:
         logger.error(f"メイン処理でエラーが発生: {e}", exc_info=True)
+        store.finish_run(run_id, 'error', error=str(e))
         try:
             error_message = f"❌ **CBP501監視エラー**\n\n"
             error_message += f"エラー内容: `{str(e)}`\n"
@@ -115,10 +287,139 @@ def main():
             notifier.send_error_notification(error_message)
         except Exception as notify_error:
             logger.error(f"エラー通知の送信に失敗: {notify_error}")
-        sys.exit(1)
+        return 'error'
+
+def run_check_with_metrics(scraper, notifier, store, args):
+    """監視処理を実行し、所要時間を記録してメトリクスを書き出す（結果は run_check と同じ）"""
+    started_at = time.perf_counter()
+    status = run_check(scraper, notifier, store)
+    RUN_SECONDS.observe(time.perf_counter() - started_at, result=status)
+    if args.metrics_file:
+        METRICS.write_textfile(args.metrics_file)
+    return status
+
+def run_daemon(scraper, notifier, store, args):
+    """常駐モード：セッションを維持したまま定期的にチェックする"""
+    stop_event = threading.Event()
+    
+    def request_stop(signum, frame):
+        logger.info(f"停止シグナルを受信しました ({signum})")
+        stop_event.set()
+    
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    
+    # EMAサイトの障害中・応答が遅い間はチェック間隔を max_interval まで伸ばす
+    scheduler = AdaptiveScheduler(args.interval * 60, args.jitter, args.max_interval * 60)
+    checkpoint_interval = args.checkpoint_interval * 60
+    last_checkpoint = time.monotonic()
+    stamp = watchlist_stamp()
+    logger.info(f"常駐モードで開始します（間隔: {args.interval}分, 揺らぎ: ±{scheduler.jitter:.0f}秒）")
+    
+    metrics_server = METRICS.start_http_server(args.metrics_port) if args.metrics_port else None
+    try:
+        while not stop_event.is_set():
+            # 監視対象リストが変更されていれば、再起動せずに読み込み直す
+            current_stamp = watchlist_stamp()
+            if current_stamp != stamp:
+                logger.info(f"{WATCHLIST_FILE} の変更を検出しました。監視対象リストを読み込み直します")
+                scraper.reload_watchlist(WATCHLIST_FILE)
+                stamp = current_stamp
+            
+            started_at = time.monotonic()
+            run_check_with_metrics(scraper, notifier, store, args)
+            scheduler.adapt(*scraper.host_health())
+            scheduler.schedule_next(started_at)
+            
+            # メモリ上の状態を定期的にディスクへ書き出す
+            if time.monotonic() - last_checkpoint >= checkpoint_interval:
+                store.checkpoint()
+                last_checkpoint = time.monotonic()
+            
+            if not scheduler.wait(stop_event):
+                break
+    finally:
+        if metrics_server:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+
+def run_monitor(store, args, config):
+    """スクレイパー・通知処理を読み込んで監視を実行（結果は run_check と同じ）"""
+    from cbp501_notifier import CBP501Notifier
+    from cbp501_scraper import CBP501Scraper
+    from news_index import NewsArchive
+    from snapshots import SnapshotTracker
+    from transport import configure_transport
+    
+    # スクレイパーと通知処理で接続プール・再試行方針・サーキットブレーカーを共有する
+    transport = configure_transport(http2=args.http2)
+    notifier = CBP501Notifier(config['discord_webhook'], transport=transport)
+    scraper = CBP501Scraper(cache_file=HTTP_CACHE_FILE, transport=transport)
+    # 監視対象リストが前回のチェックから変わった場合は、前回の解析結果（304時に再利用する）を破棄する
+    if store.get_value('watchlist_stamp', '') != watchlist_stamp():
+        scraper.http_cache.clear()
+    # 監視ページのスナップショットを状態ストアに保存し、前回との差分を検出する
+    # 検出項目と最新のページ本文は全文索引に蓄積し、news_index.py で後から検索できるようにする
+    archive = NewsArchive(NEWS_INDEX_FILE)
+    scraper.archive = archive
+    scraper.snapshots = SnapshotTracker(store, archive=archive)
+    # 監視ページが多い場合は、取得したページの解析を複数のプロセスに分散する
+    parse_pool = None
+    if args.parse_workers > 0:
+        from parse_pool import ParsePool
+        parse_pool = ParsePool(args.parse_workers)
+        scraper.parse_pool = parse_pool
+        if scraper.enricher:
+            scraper.enricher.parse_pool = parse_pool
+    
+    try:
+        if args.daemon:
+            run_daemon(scraper, notifier, store, args)
+            return 'success'
+        status = run_check_with_metrics(scraper, notifier, store, args)
+        schedule_backoff(scraper, store, args, status)
+        return status
+    finally:
+        notifier.close()
+        transport.close()
+        archive.close()
+        if parse_pool:
+            parse_pool.close()
+
+def main():
+    """メイン処理"""
+    args = parse_args()
+    logger.info("=== CBP501三相治験監視アプリ開始 ===")
+    
+    config = load_environment()
+    
+    # 状態ストアを開き、旧バージョンのテキストファイルがあれば取り込む
+    # 常駐モードではメモリ上で更新し、定期的にチェックポイントを保存する
+    store = StateStore(in_memory=args.daemon)
+    store.migrate_text_files()
+    
+    try:
+        # 1回だけ実行する場合は、EMAサイトの障害による待ち時間中か、監視ページが未変更なら
+        # スクレイパーを読み込まずに終了する
+        started_at = time.perf_counter()
+        status = None
+        if not args.daemon:
+            if backoff_active(store):
+                status = 'backoff'
+            elif not args.no_preflight and run_preflight(store):
+                status = 'unchanged'
+        if status:
+            RUN_SECONDS.observe(time.perf_counter() - started_at, result=status)
+            if args.metrics_file:
+                METRICS.write_textfile(args.metrics_file)
+        else:
+            status = run_monitor(store, args, config)
     finally:
-        # 実行回数を保存
-        save_run_data('execution_counter.txt', execution_count)
+        store.close()
+    
+    # EMAサイトの障害は監視処理の失敗として扱わない（cronの実行を失敗させない）
+    if status == 'error':
+        sys.exit(1)
     
     logger.info("=== CBP501三相治験監視アプリ終了 ===")
 
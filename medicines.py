@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - 医薬品データセット
+EMAが公開する医薬品一覧（XLSX/CSV）を逐次解析して索引を作り、前回のスナップショットとの差分から新規承認・ステータス変更を検出する
+
+使い方:
+    python medicines.py                          # EMAからダウンロードして前回との差分を表示
+    python medicines.py --file medicines.xlsx    # 手元のファイルを取り込む
+    python medicines.py --notify                 # 新規承認・ステータス変更をDiscordに通知
+    python medicines.py --inn pembrolizumab      # 取り込んだデータセットをINNで検索
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import zipfile
+from datetime import date, timedelta
+
+try:
+    from lxml import etree
+except ImportError:  # lxmlが無い環境では標準ライブラリで逐次解析する
+    import xml.etree.ElementTree as etree
+
+from fingerprint import fingerprint_hex
+from state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET_URL = 'https://www.ema.europa.eu/en/documents/report/medicines-output-medicines-report_en.xlsx'
+DEFAULT_CACHE_FILE = 'medicines_http_cache.json'
+
+# 表題などの前置き行を読み飛ばして見出し行を探す範囲
+HEADER_SEARCH_ROWS = 50
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# 列名（小文字・空白を揃えたもの）から正規化したフィールド名への対応
+COLUMN_ALIASES = {
+    'category': ('category',),
+    'name': ('name of medicine', 'medicine name', 'product name', 'name'),
+    'product_number': ('ema product number', 'product number'),
+    'status': ('medicine status', 'authorisation status', 'status'),
+    'inn': ('international non-proprietary name (inn) / common name', 'inn / common name', 'inn'),
+    'active_substance': ('active substance',),
+    'therapeutic_area': ('therapeutic area (mesh)', 'therapeutic area'),
+    'mah': ('marketing authorisation developer / applicant / holder', 'marketing authorisation holder',
+            'marketing authorisation holder/company name', 'mah'),
+    'authorisation_date': ('marketing authorisation date', 'european commission decision date'),
+    'url': ('medicine url', 'url'),
+}
+FIELDS = tuple(COLUMN_ALIASES)
+
+AUTHORISED_STATUS = 'authorised'
+
+# Excelの日付シリアル値の起点（1900年のうるう年の誤りを含めた値）
+EXCEL_EPOCH = date(1899, 12, 30)
+
+# 配合剤のINN（例: "dolutegravir / lamivudine"）を成分ごとにも索引する区切り
+INN_SEPARATOR = re.compile(r'\s*[/;+]\s*')
+
+def _local_name(tag):
+    """名前空間を除いた要素名"""
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+def _release(element):
+    """解析済みの要素を解放（lxmlでは処理済みの兄弟要素も親から外す）"""
+    element.clear()
+    if hasattr(element, 'getprevious'):
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+def _normalize(value):
+    """比較・索引用に空白を揃えて小文字にする"""
+    return ' '.join(str(value or '').split()).lower()
+
+def _column_index(reference):
+    """セル参照（例: 'AB12'）から0始まりの列番号を求める"""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+def _text_runs(element):
+    """共有文字列・インライン文字列の本文（ふりがな rPh は除く）"""
+    parts = []
+    for child in element:
+        name = _local_name(child.tag)
+        if name == 't':
+            parts.append(child.text or '')
+        elif name == 'r':
+            parts.extend(t.text or '' for t in child if _local_name(t.tag) == 't')
+    return ''.join(parts)
+
+def _shared_strings(archive):
+    """共有文字列テーブルを逐次解析して読み込む"""
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as f:
+        for _, element in etree.iterparse(f, events=('end',)):
+            if _local_name(element.tag) == 'si':
+                strings.append(_text_runs(element))
+                _release(element)
+    return strings
+
+def _first_sheet(archive):
+    """最初のワークシートのパス"""
+    sheets = sorted(name for name in archive.namelist()
+                    if name.startswith('xl/worksheets/') and name.endswith('.xml'))
+    if not sheets:
+        raise ValueError("ワークシートが見つかりません")
+    return 'xl/worksheets/sheet1.xml' if 'xl/worksheets/sheet1.xml' in sheets else sheets[0]
+
+def _cell_value(cell, strings):
+    """セルの値を文字列で返す"""
+    cell_type = cell.get('t')
+    if cell_type == 'inlineStr':
+        return next((_text_runs(child) for child in cell if _local_name(child.tag) == 'is'), '')
+    value = next((child.text or '' for child in cell if _local_name(child.tag) == 'v'), '')
+    if cell_type == 's' and value:
+        return strings[int(value)]
+    if cell_type == 'b':
+        return 'TRUE' if value == '1' else 'FALSE'
+    return value
+
+def iter_xlsx_rows(source):
+    """XLSXの最初のシートを1行ずつ（セル値のリストとして）返す
+
+    行を読み終えるたびに要素を解放するため、行数に関わらずメモリ使用量はほぼ一定に保たれる。
+    """
+    with zipfile.ZipFile(source) as archive:
+        strings = _shared_strings(archive)
+        with archive.open(_first_sheet(archive)) as f:
+            for _, element in etree.iterparse(f, events=('end',)):
+                if _local_name(element.tag) != 'row':
+                    continue
+                values = []
+                for cell in element:
+                    if _local_name(cell.tag) != 'c':
+                        continue
+                    # 空のセルは省略されるため、セル参照の列まで空文字で埋める
+                    reference = cell.get('r')
+                    index = _column_index(reference) if reference else len(values)
+                    values.extend([''] * (index - len(values)))
+                    values.append(_cell_value(cell, strings))
+                _release(element)
+                yield values
+
+def iter_csv_rows(source):
+    """CSV（バイナリのファイルオブジェクト）を1行ずつ返す"""
+    with io.TextIOWrapper(source, encoding='utf-8-sig', newline='') as text:
+        yield from csv.reader(text)
+
+def _excel_date(value):
+    """Excelの日付シリアル値をISO形式の日付にする（シリアル値でなければそのまま返す）"""
+    try:
+        serial = float(value)
+    except ValueError:
+        return value
+    return (EXCEL_EPOCH + timedelta(days=int(serial))).isoformat()
+
+def _header_columns(row):
+    """見出し行なら (列番号, フィールド名) のリストを返す（名前の列が無ければNone）"""
+    lookup = {alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    columns = []
+    used = set()
+    for index, value in enumerate(row):
+        field = lookup.get(_normalize(value))
+        if field and field not in used:
+            columns.append((index, field))
+            used.add(field)
+    return columns if 'name' in used else None
+
+def iter_records(rows):
+    """行の並びから見出し行を探し、以降の行を正規化したレコード（辞書）にして返す"""
+    rows = iter(rows)
+    columns = None
+    for _, row in zip(range(HEADER_SEARCH_ROWS), rows):
+        columns = _header_columns(row)
+        if columns:
+            break
+    if not columns:
+        raise ValueError(f"先頭{HEADER_SEARCH_ROWS}行に見出し行が見つかりません")
+
+    for row in rows:
+        record = dict.fromkeys(FIELDS, '')
+        for index, field in columns:
+            if index < len(row):
+                record[field] = ' '.join(str(row[index]).split())
+        if not record['name']:
+            continue
+        if record['authorisation_date']:
+            record['authorisation_date'] = _excel_date(record['authorisation_date'])
+        yield record
+
+def iter_dataset_records(file_path):
+    """ファイル形式（XLSXかCSV）を判別してレコードを逐次返す"""
+    if zipfile.is_zipfile(file_path):
+        yield from iter_records(iter_xlsx_rows(file_path))
+    else:
+        with open(file_path, 'rb') as f:
+            yield from iter_records(iter_csv_rows(f))
+
+def record_key(record):
+    """レコードのキー（EMAの製品番号、無い場合は区分と名前）"""
+    if record.get('product_number'):
+        return record['product_number'].upper()
+    return f"{_normalize(record.get('category'))}:{_normalize(record.get('name'))}"
+
+def row_hash(record):
+    """レコード全体のハッシュ値（前回との比較用）"""
+    payload = json.dumps([record.get(field, '') for field in FIELDS], ensure_ascii=False)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+def is_authorised(record):
+    """承認済みのレコードかどうか"""
+    return _normalize(record.get('status')) == AUTHORISED_STATUS
+
+class MedicinesIndex:
+    """医薬品データセットのメモリ上の索引クラス（INN・製品名・販売承認取得者・ステータスで検索できる）"""
+
+    def __init__(self):
+        self.records = {}
+        self.hashes = {}
+        self.by_inn = {}
+        self.by_name = {}
+        self.by_mah = {}
+        self.by_status = {}
+        self.duplicates = 0
+
+    @classmethod
+    def from_records(cls, records):
+        """レコードの並びから索引を作成"""
+        index = cls()
+        for record in records:
+            index.add(record)
+        if index.duplicates:
+            logger.warning(f"キーが重複する{index.duplicates}行を無視しました")
+        return index
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, record):
+        """レコードを追加（同じキーのレコードが既にあれば最初のものを残す）"""
+        key = record_key(record)
+        if key in self.records:
+            self.duplicates += 1
+            return
+        self.records[key] = record
+        self.hashes[key] = row_hash(record)
+
+        inns = {_normalize(record['inn'])}
+        inns.update(_normalize(part) for part in INN_SEPARATOR.split(record['inn']))
+        for value in inns:
+            if value:
+                self.by_inn.setdefault(value, []).append(key)
+        for index, field in ((self.by_name, 'name'), (self.by_mah, 'mah'), (self.by_status, 'status')):
+            value = _normalize(record[field])
+            if value:
+                index.setdefault(value, []).append(key)
+
+    def _lookup(self, index, value):
+        return [self.records[key] for key in index.get(_normalize(value), [])]
+
+    def find_by_inn(self, inn):
+        """INN（配合剤の場合は成分のいずれか）で検索"""
+        return self._lookup(self.by_inn, inn)
+
+    def find_by_name(self, name):
+        """製品名で検索"""
+        return self._lookup(self.by_name, name)
+
+    def find_by_mah(self, mah):
+        """販売承認取得者で検索"""
+        return self._lookup(self.by_mah, mah)
+
+    def find_by_status(self, status):
+        """ステータス（例: 'Authorised', 'Withdrawn'）で検索"""
+        return self._lookup(self.by_status, status)
+
+    def status_counts(self):
+        """ステータスごとの件数"""
+        return {status: len(keys) for status, keys in self.by_status.items()}
+
+class DatasetDiff:
+    """前回のスナップショットとの差分"""
+
+    def __init__(self, added, removed, changed):
+        """changedは (前回のレコード, 今回のレコード) のリスト"""
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    @property
+    def status_changes(self):
+        """ステータスが変わったレコード（(前回, 今回) のリスト）"""
+        return [(old, new) for old, new in self.changed
+                if _normalize(old.get('status')) != _normalize(new.get('status'))]
+
+    @property
+    def newly_authorised(self):
+        """新たに承認済みになったレコード（新規追加と、承認済みへのステータス変更）"""
+        added = [record for record in self.added if is_authorised(record)]
+        return added + [new for old, new in self.status_changes if is_authorised(new)]
+
+    def summary(self):
+        """差分の要約（ログ用）"""
+        return (f"追加 {len(self.added)}件 / 削除 {len(self.removed)}件 / 変更 {len(self.changed)}件 "
+                f"(うちステータス変更 {len(self.status_changes)}件, 新規承認 {len(self.newly_authorised)}件)")
+
+def compare_snapshot(store, index):
+    """索引を状態ストアのスナップショットと行のハッシュ値で比較する（スナップショットは更新しない）
+
+    前回の行そのものは、変更・削除されたキーの分だけを読み込む。
+    初めて取り込む場合は比較対象が無いため None を返す。
+    """
+    previous = store.get_medicine_hashes()
+    if not previous:
+        return None
+    added_keys = [key for key in index.hashes if key not in previous]
+    changed_keys = [key for key, value in index.hashes.items() if key in previous and previous[key] != value]
+    removed_keys = [key for key in previous if key not in index.hashes]
+
+    old_records = {
+        key: json.loads(record)
+        for key, record in store.get_medicine_records(changed_keys + removed_keys).items()
+    }
+    return DatasetDiff(
+        [index.records[key] for key in added_keys],
+        [old_records[key] for key in removed_keys if key in old_records],
+        [(old_records[key], index.records[key]) for key in changed_keys if key in old_records]
+    )
+
+def save_snapshot(store, index):
+    """索引の内容で状態ストアのスナップショットを更新（ハッシュ値が変わった行だけを書き込む）"""
+    previous = store.get_medicine_hashes()
+    store.update_medicine_records(
+        [(key, value, json.dumps(index.records[key], ensure_ascii=False))
+         for key, value in index.hashes.items() if previous.get(key) != value],
+        [key for key in previous if key not in index.hashes]
+    )
+    if not previous:
+        logger.info(f"医薬品データセットのスナップショットを作成しました ({len(index)}件)")
+
+def diff_snapshot(store, index):
+    """前回のスナップショットと比較してからスナップショットを更新する（初回はNone）"""
+    diff = compare_snapshot(store, index)
+    save_snapshot(store, index)
+    return diff
+
+def load_saved_index(store):
+    """状態ストアに保存したスナップショットから索引を作成（データセットが未変更の場合の検索用）"""
+    records = store.get_medicine_records(store.get_medicine_hashes())
+    return MedicinesIndex.from_records(json.loads(record) for record in records.values())
+
+def to_news_item(record, previous=None):
+    """レコードを通知処理で使うニュース項目の形式にする"""
+    substance = record['inn'] or record['active_substance']
+    title = f"{record['name']} ({substance})" if substance else record['name']
+    if previous is not None:
+        description = f"ステータス変更: {previous.get('status') or '-'} → {record['status'] or '-'}"
+    else:
+        description = f"新規掲載: {record['status'] or '-'}"
+    if record['mah']:
+        description += f" / 販売承認取得者: {record['mah']}"
+    if record['therapeutic_area']:
+        description += f" / 対象: {record['therapeutic_area']}"
+    link = record['url'] or DEFAULT_DATASET_URL
+    return {
+        'id': fingerprint_hex(title, link),
+        'title': title,
+        'link': link,
+        'date': record['authorisation_date'],
+        'description': description[:200],
+        'is_approval_related': is_authorised(record)
+    }
+
+def notification_items(diff):
+    """通知するニュース項目（新規掲載とステータス変更）"""
+    items = [to_news_item(record) for record in diff.added]
+    items.extend(to_news_item(new, old) for old, new in diff.status_changes)
+    return items
+
+class MedicinesDataset:
+    """条件付きGETで医薬品データセットをダウンロードするクラス"""
+
+    def __init__(self, url=DEFAULT_DATASET_URL, session=None, http_cache=None, transport=None):
+        from http_cache import HTTPValidatorCache
+        from transport import get_transport
+
+        self.url = url
+        self.session = session or (transport or get_transport()).session({
+            'User-Agent': 'EMA-Monitor-Bot/1.0'
+        })
+        self.http_cache = http_cache if http_cache is not None else HTTPValidatorCache()
+
+    def download(self, target_dir):
+        """データセットをtarget_dirに保存してパスを返す（前回から未変更ならNone）
+
+        本文はチャンクごとにファイルへ書き出すため、データセット全体をメモリに載せない。
+        """
+        from metrics import FETCH_BYTES, FETCH_SECONDS
+        from transport import DEFAULT_TIMEOUT
+
+        url = self.url
+        headers = self.http_cache.conditional_headers(url)
+        with FETCH_SECONDS.time(url=url):
+            response = self.session.get(url, headers=headers, timeout=DEFAULT_TIMEOUT, stream=True)
+        try:
+            if response.status_code == 304:
+                logger.info("医薬品データセットは前回から更新されていません")
+                return None
+            response.raise_for_status()
+
+            extension = '.csv' if 'csv' in response.headers.get('Content-Type', '') else '.xlsx'
+            file_path = os.path.join(target_dir, f"medicines{extension}")
+            size = 0
+            with open(file_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    size += len(chunk)
+            FETCH_BYTES.inc(size, url=url)
+            logger.info(f"医薬品データセットをダウンロードしました ({size:,}バイト)")
+        finally:
+            response.close()
+
+        # 差分は状態ストアに保存するため、キャッシュには検証子だけを残す
+        self.http_cache.store(url, response, {'bytes': size})
+        return file_path
+
+def load_index(file_path):
+    """ファイルを取り込んで索引を作成"""
+    from metrics import ITEMS_EXTRACTED, PARSE_SECONDS
+
+    with PARSE_SECONDS.time(source='medicines'):
+        index = MedicinesIndex.from_records(iter_dataset_records(file_path))
+    ITEMS_EXTRACTED.inc(len(index), source='medicines')
+    logger.info(f"医薬品データセットを取り込みました ({len(index)}件)")
+    return index
+
+def print_records(records):
+    """検索結果を表示"""
+    for record in records:
+        print(f"- {record['name']} [{record['status'] or '-'}] INN: {record['inn'] or '-'} / "
+              f"{record['mah'] or '-'} / {record['authorisation_date'] or '-'}")
+    print(f"{len(records)}件")
+
+def send_notifications(items):
+    """差分の項目をDiscordに通知し、すべて送信できた場合のみTrueを返す"""
+    from dotenv import load_dotenv
+    from notifier import DiscordNotifier
+
+    load_dotenv()
+    webhook_url = os.getenv('DISCORD_WEBHOOK_URL')
+    if not webhook_url:
+        logger.error("DISCORD_WEBHOOK_URLが設定されていません")
+        return False
+    notifier = DiscordNotifier(webhook_url)
+    try:
+        results = notifier.send_approval_notifications(items)
+    except Exception as e:
+        logger.error(f"通知の送信に失敗: {e}")
+        return False
+    finally:
+        notifier.close()
+    sent = sum(1 for _, ok in results if ok)
+    logger.info(f"{sent}/{len(items)}件の通知を送信しました")
+    return sent == len(items)
+
+def main():
+    """メイン処理"""
+    arg_parser = argparse.ArgumentParser(description='EMA医薬品データセットの取り込み・差分検出')
+    arg_parser.add_argument('--file', help='取り込むXLSX/CSVファイル（省略時はEMAからダウンロード）')
+    arg_parser.add_argument('--url', default=DEFAULT_DATASET_URL, help='データセットのURL')
+    arg_parser.add_argument('--cache-file', default=DEFAULT_CACHE_FILE, help='HTTP検証子のキャッシュファイル')
+    arg_parser.add_argument('--notify', action='store_true', help='新規掲載・ステータス変更をDiscordに通知')
+    arg_parser.add_argument('--inn', help='INNで検索して表示')
+    arg_parser.add_argument('--name', help='製品名で検索して表示')
+    arg_parser.add_argument('--mah', help='販売承認取得者で検索して表示')
+    arg_parser.add_argument('--status', help='ステータスで検索して表示')
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    query_mode = any((args.inn, args.name, args.mah, args.status))
+    dataset = None
+    index = None
+    with tempfile.TemporaryDirectory() as work_dir:
+        file_path = args.file
+        if not file_path:
+            from http_cache import HTTPValidatorCache
+            dataset = MedicinesDataset(args.url, http_cache=HTTPValidatorCache(args.cache_file))
+            try:
+                file_path = dataset.download(work_dir)
+            except Exception as e:
+                logger.error(f"医薬品データセットのダウンロードに失敗: {e}")
+                return False
+            if file_path is None and not query_mode:
+                return True
+
+        if file_path:
+            try:
+                index = load_index(file_path)
+            except Exception as e:
+                logger.error(f"医薬品データセットの取り込みに失敗: {e}")
+                return False
+
+    store = StateStore()
+    try:
+        if query_mode:
+            # 前回から未変更の場合は、保存済みのスナップショットを検索する
+            if index is None:
+                index = load_saved_index(store)
+            queries = ((args.inn, index.find_by_inn), (args.name, index.find_by_name),
+                       (args.mah, index.find_by_mah), (args.status, index.find_by_status))
+            for value, find in queries:
+                if value:
+                    print_records(find(value))
+            return True
+
+        diff = compare_snapshot(store, index)
+        if diff:
+            logger.info(f"医薬品データセットの差分: {diff.summary()}")
+            for record in diff.newly_authorised:
+                logger.info(f"新規承認: {record['name']} ({record['inn'] or '-'}) - {record['mah'] or '-'}")
+            items = notification_items(diff)
+            # 通知できなかった差分を失わないよう、スナップショットと検証子は通知がすべて成功してから更新する
+            # （次回は同じ差分を再検出して通知し直す）
+            if args.notify and items and not send_notifications(items):
+                logger.error("通知に失敗したため、スナップショットを更新せず次回再送します")
+                return False
+        elif diff is not None:
+            logger.info("医薬品データセットに変化はありません")
+
+        save_snapshot(store, index)
+    finally:
+        store.close()
+    # スナップショットを更新できた場合だけ検証子を保存する（取り込みに失敗したら次回も再取得する）
+    if dataset:
+        dataset.http_cache.save()
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
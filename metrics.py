@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+CBP501三相治験監視アプリケーション - メトリクス
+処理段階ごとの所要時間・件数を集計し、Prometheusのテキスト形式で出力する
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 所要時間（秒）用の標準バケット
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape_label(value):
+    """ラベル値をPrometheusのテキスト形式用にエスケープ"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(label_names, label_values, extra=None):
+    """ラベルを {name="value",...} 形式に整形"""
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    """数値をPrometheusのテキスト形式に整形"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """単調増加するカウンタークラス"""
+
+    metric_type = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        # ラベルなしのカウンターは未加算でも0として出力する
+        self._values = {} if self.label_names else {(): 0}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """ラベルの値をラベル名の順に並べたキー"""
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def inc(self, amount=1, **labels):
+        """カウンターを加算"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """現在の値を取得"""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        """(サフィックス付きの名前, ラベル文字列, 値) のリスト"""
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.label_names, key), value) for key, value in items]
+
+class Histogram:
+    """所要時間などの分布を集計するヒストグラムクラス"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [バケット別件数, 合計, 件数]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """ラベルの値をラベル名の順に並べたキー"""
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def observe(self, value, **labels):
+        """値を1件記録"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """ブロックの所要時間（秒）を記録"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        """記録した件数を取得"""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[2] if series else 0
+
+    def samples(self):
+        """(サフィックス付きの名前, ラベル文字列, 値) のリスト"""
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+
+        samples = []
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, ('le', _format_value(bound)))
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = _format_labels(self.label_names, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+class MetricsRegistry:
+    """メトリクスを登録してまとめて出力するクラス"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        """同名のメトリクスがあればそれを返す"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, label_names=()):
+        """カウンターを登録"""
+        return self._register(Counter(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        """ヒストグラムを登録"""
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def render(self):
+        """Prometheusのテキスト形式で出力"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """node_exporterのtextfileコレクター向けにファイルへ書き出す（アトミックに置き換え）"""
+        try:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"メトリクスファイルの書き出しに失敗: {e}")
+
+    def start_http_server(self, port, host='127.0.0.1'):
+        """/metrics を返すHTTPサーバーをバックグラウンドで起動"""
+        # 常駐モードでしか使わないため、1回だけ実行する場合の起動時間に含めない
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+        thread.start()
+        logger.info(f"メトリクスを http://{host}:{server.server_address[1]}/metrics で公開しています")
+        return server
+
+# アプリ全体で共有するレジストリと計測項目
+METRICS = MetricsRegistry()
+
+FETCH_SECONDS = METRICS.histogram(
+    'ema_monitor_fetch_seconds', 'ページ取得の所要時間（秒）', ('url',)
+)
+FETCH_BYTES = METRICS.counter(
+    'ema_monitor_fetch_bytes_total', '取得したレスポンス本文のバイト数', ('url',)
+)
+FETCH_RETRIES = METRICS.counter(
+    'ema_monitor_fetch_retries_total', 'ページ取得の再試行回数', ('url',)
+)
+HTTP_REQUESTS = METRICS.counter(
+    'ema_monitor_http_requests_total', 'ホストごとのHTTP送信結果（ステータスコード・error・circuit_open）', ('host', 'status')
+)
+CIRCUIT_TRANSITIONS = METRICS.counter(
+    'ema_monitor_circuit_transitions_total', 'サーキットブレーカーの状態遷移回数', ('host', 'state')
+)
+PARSE_SECONDS = METRICS.histogram(
+    'ema_monitor_parse_seconds', 'ページの解析・抽出の所要時間（秒）', ('source',)
+)
+ITEMS_EXTRACTED = METRICS.counter(
+    'ema_monitor_items_extracted_total', '抽出した項目数', ('source',)
+)
+CLASSIFICATION_HITS = METRICS.counter(
+    'ema_monitor_classification_hits_total', 'キーワード分類で一致したテキスト数', ('category',)
+)
+WEBHOOK_SECONDS = METRICS.histogram(
+    'ema_monitor_webhook_seconds', 'Discord Webhook送信の所要時間（秒）', ('status',)
+)
+WEBHOOK_RATE_LIMITED = METRICS.counter(
+    'ema_monitor_webhook_rate_limited_total', 'Discordから429を受け取った回数'
+)
+WEBHOOK_RETRIES = METRICS.counter(
+    'ema_monitor_webhook_retries_total', 'Discord Webhook送信の再試行回数'
+)
+RUN_SECONDS = METRICS.histogram(
+    'ema_monitor_run_seconds', '監視処理1回の所要時間（秒）', ('result',)
+)
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+CBP501三相治験監視アプリケーション - ニュース全文索引
+取得したニュース項目・監視ページの本文を位置情報付きの転置索引（語 -> 出現文書と位置）に蓄積し、フレーズ・近接検索を行う
+
+使い方:
+    python news_index.py CBP501                        # 語を含む文書を新しい順に表示
+    python news_index.py '"phase III" CBP501'          # フレーズと語をすべて含む文書
+    python news_index.py 'CBP501 "phase III"' --within 20   # すべてが20語以内に現れる文書
+    python news_index.py --stats                       # 索引の件数
+"""
+
+import argparse
+import hashlib
+import heapq
+import logging
+import re
+import sqlite3
+import sys
+import time
+import zlib
+from datetime import datetime
+from fingerprint import item_fingerprint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_FILE = 'news_index.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doc_key TEXT NOT NULL UNIQUE,
+    source TEXT,
+    url TEXT,
+    title TEXT,
+    published TEXT,
+    digest TEXT NOT NULL,
+    body BLOB NOT NULL,
+    added_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    term TEXT NOT NULL UNIQUE,
+    doc_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (term_id, doc_id)
+) WITHOUT ROWID;
+"""
+
+TOKEN_PATTERN = re.compile(r'\w+')
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+# タイトルと本文の間の位置の間隔（タイトル末尾と本文先頭がフレーズとして一致しないように）
+FIELD_GAP = 16
+
+# IN句に渡す文書IDの最大数（SQLiteのプレースホルダー数の上限より小さくする）
+SQL_CHUNK_SIZE = 500
+
+def tokenize(text):
+    """小文字にした語を出現順に返す"""
+    return [match.group().lower() for match in TOKEN_PATTERN.finditer(text or '')]
+
+def encode_positions(positions):
+    """昇順の位置のリストを差分の可変長整数（7ビットずつ）で符号化"""
+    data = bytearray()
+    previous = 0
+    for position in positions:
+        delta = position - previous
+        previous = position
+        while delta >= 0x80:
+            data.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return bytes(data)
+
+def decode_positions(data):
+    """encode_positions で符号化した位置のリストを復元"""
+    positions = []
+    value = shift = previous = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += value
+        positions.append(previous)
+        value = shift = 0
+    return positions
+
+def _document_terms(title, text):
+    """タイトルと本文の語ごとの出現位置（語 -> 位置のリスト）"""
+    terms = {}
+    title_tokens = tokenize(title)
+    offset = len(title_tokens) + FIELD_GAP if title_tokens else 0
+    for position, token in enumerate(title_tokens):
+        terms.setdefault(token, []).append(position)
+    for position, token in enumerate(tokenize(text), offset):
+        terms.setdefault(token, []).append(position)
+    return terms
+
+def parse_query(query):
+    """検索文字列を句（語のリスト）のリストにする（"..." で囲んだ部分はフレーズ）"""
+    clauses = []
+    for phrase, word in QUERY_PATTERN.findall(query):
+        tokens = tokenize(phrase or word)
+        if tokens:
+            clauses.append(tokens)
+    return clauses
+
+def smallest_span(occurrences):
+    """句ごとの (開始位置, 終了位置) のリストから、すべての句を含む最小の範囲の語数を求める
+
+    各句の出現位置を1つずつ先頭から進める k 本のリストの併合で、最小範囲を線形時間で求める。
+    """
+    heap = []
+    current_end = -1
+    for clause, spans in enumerate(occurrences):
+        if not spans:
+            return None
+        start, end = spans[0]
+        heap.append((start, end, clause, 0))
+        current_end = max(current_end, end)
+    heapq.heapify(heap)
+
+    best = None
+    while True:
+        start, _, clause, index = heap[0]
+        span = current_end - start + 1
+        if best is None or span < best:
+            best = span
+        index += 1
+        if index == len(occurrences[clause]):
+            return best
+        next_start, next_end = occurrences[clause][index]
+        heapq.heapreplace(heap, (next_start, next_end, clause, index))
+        current_end = max(current_end, next_end)
+
+class SearchHit:
+    """検索結果の1件"""
+
+    def __init__(self, doc_id, source, url, title, published, added_at, span, snippet=''):
+        self.doc_id = doc_id
+        self.source = source
+        self.url = url
+        self.title = title
+        self.published = published
+        self.added_at = added_at
+        self.span = span
+        self.snippet = snippet
+
+class NewsArchive:
+    """SQLiteに保存する位置情報付きの転置索引クラス
+
+    文書は doc_key（ニュース項目は識別子、ページは URL）で一意に管理し、
+    同じ内容の文書を再び追加しても索引は変わらない（内容が変わった文書は置き換える）。
+    """
+
+    def __init__(self, db_path=DEFAULT_INDEX_FILE):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        # 索引は取得済みの項目から作り直せるため、書き込みごとの同期を省いて追加を速くする
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        """データベースを閉じる"""
+        self.conn.commit()
+        self.conn.close()
+
+    def _term_ids(self, terms, create=False):
+        """語 -> 語ID の辞書（create がTrueなら未登録の語も登録する）"""
+        terms = list(terms)
+        if create:
+            self.conn.executemany('INSERT OR IGNORE INTO terms (term) VALUES (?)', [(term,) for term in terms])
+        ids = {}
+        for start in range(0, len(terms), SQL_CHUNK_SIZE):
+            chunk = terms[start:start + SQL_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            ids.update(self.conn.execute(f'SELECT term, id FROM terms WHERE term IN ({placeholders})', chunk))
+        return ids
+
+    def _remove_document(self, doc_id, title, body):
+        """文書とその転置リストを削除"""
+        self._remove_postings(doc_id, title, body)
+        self.conn.execute('DELETE FROM documents WHERE id = ?', (doc_id,))
+
+    def _remove_postings(self, doc_id, title, body):
+        """文書の転置リストを削除（語は保存済みの本文を分割し直して求める）"""
+        term_ids = self._term_ids(_document_terms(title, body))
+        rows = [(term_id, doc_id) for term_id in term_ids.values()]
+        self.conn.executemany('DELETE FROM postings WHERE term_id = ? AND doc_id = ?', rows)
+        self.conn.executemany('UPDATE terms SET doc_count = doc_count - 1 WHERE id = ?', [(t,) for t, _ in rows])
+
+    def _index_document(self, doc_key, title, text, source, url, published):
+        """文書の転置リストを書き込む（トランザクションは呼び出し側で管理する）"""
+        text = text or ''
+        digest = hashlib.blake2b(f"{title}\n{text}".encode('utf-8'), digest_size=16).hexdigest()
+        row = self.conn.execute('SELECT id, digest, title, body FROM documents WHERE doc_key = ?',
+                                (doc_key,)).fetchone()
+        if row is not None and row[1] == digest:
+            return False
+
+        body = zlib.compress(text.encode('utf-8'))
+        if row is not None:
+            doc_id = row[0]
+            self._remove_postings(doc_id, row[2], zlib.decompress(row[3]).decode('utf-8'))
+            self.conn.execute(
+                'UPDATE documents SET source = ?, url = ?, title = ?, published = ?, digest = ?, body = ? '
+                'WHERE id = ?',
+                (source, url, title, published, digest, body, doc_id)
+            )
+        else:
+            doc_id = self.conn.execute(
+                'INSERT INTO documents (doc_key, source, url, title, published, digest, body, added_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (doc_key, source, url, title, published, digest, body,
+                 datetime.now().isoformat(timespec='seconds'))
+            ).lastrowid
+
+        terms = _document_terms(title, text)
+        term_ids = self._term_ids(terms, create=True)
+        self.conn.executemany(
+            'INSERT INTO postings (term_id, doc_id, positions) VALUES (?, ?, ?)',
+            [(term_ids[term], doc_id, encode_positions(positions)) for term, positions in terms.items()]
+        )
+        self.conn.executemany('UPDATE terms SET doc_count = doc_count + 1 WHERE id = ?',
+                              [(term_ids[term],) for term in terms])
+        return True
+
+    def add_document(self, doc_key, title, text, source=None, url=None, published=None):
+        """文書を索引に追加（内容が変わっていれば索引し直す）。索引を更新した場合はTrueを返す"""
+        with self.conn:
+            return self._index_document(doc_key, title, text, source, url, published)
+
+    def add_items(self, items, source):
+        """ニュース・治験項目を1つのトランザクションで索引に追加し、追加・更新した件数を返す"""
+        added = 0
+        with self.conn:
+            for item in items:
+                text = item.get('full_text') or item.get('description') or item.get('content') or ''
+                url = item.get('url') or item.get('link')
+                published = item.get('published_date') or item.get('date') or None
+                if self._index_document(f"item:{item_fingerprint(item)}", item.get('title') or '', text,
+                                        source, url, published):
+                    added += 1
+        if added:
+            logger.info(f"{added}件の項目を全文索引に追加しました ({source})")
+        return added
+
+    def add_page(self, url, lines, source='page'):
+        """監視ページの本文（正規化した行）をURLごとに1つの文書として索引に追加（前回の版は置き換える）"""
+        with self.conn:
+            # 以前のバージョンで版ごとに追加した文書（page:URL#ハッシュ値）は削除する
+            prefix = f"page:{url}#"
+            rows = self.conn.execute(
+                'SELECT id, title, body FROM documents WHERE substr(doc_key, 1, ?) = ?', (len(prefix), prefix)
+            ).fetchall()
+            for doc_id, title, body in rows:
+                self._remove_document(doc_id, title, zlib.decompress(body).decode('utf-8'))
+            updated = self._index_document(f"page:{url}", url, '\n'.join(lines), source, url, None)
+        if updated:
+            logger.info(f"{url} の本文を全文索引に追加しました")
+        return updated
+
+    def _postings(self, term, doc_ids=None):
+        """語の転置リスト（文書ID -> 符号化した位置）。doc_ids を渡すとその文書だけを読み込む"""
+        row = self.conn.execute('SELECT id FROM terms WHERE term = ?', (term,)).fetchone()
+        if row is None:
+            return {}
+        if doc_ids is None:
+            return dict(self.conn.execute('SELECT doc_id, positions FROM postings WHERE term_id = ?', (row[0],)))
+
+        postings = {}
+        doc_ids = sorted(doc_ids)
+        for start in range(0, len(doc_ids), SQL_CHUNK_SIZE):
+            chunk = doc_ids[start:start + SQL_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            postings.update(self.conn.execute(
+                f'SELECT doc_id, positions FROM postings WHERE term_id = ? AND doc_id IN ({placeholders})',
+                [row[0]] + chunk
+            ))
+        return postings
+
+    def _document_frequencies(self, terms):
+        """語ごとの出現文書数（未登録の語は0）"""
+        terms = list(terms)
+        frequencies = dict.fromkeys(terms, 0)
+        placeholders = ','.join('?' * len(terms))
+        frequencies.update(self.conn.execute(
+            f'SELECT term, doc_count FROM terms WHERE term IN ({placeholders})', terms
+        ))
+        return frequencies
+
+    def _iter_matches(self, clauses):
+        """すべての句を含む文書を新しく追加した順に (文書ID, 句ごとの (開始位置, 終了位置) のリスト) で返す
+
+        位置の復元は、候補の文書を順に調べる中で必要になった時点で行う。
+        """
+        terms = {term for clause in clauses for term in clause}
+        frequencies = self._document_frequencies(terms)
+        if not terms or min(frequencies.values()) == 0:
+            return
+
+        # 出現文書の少ない語から読み込み、以降の語は候補の文書に絞って読み込む
+        candidates = None
+        postings = {}
+        for term in sorted(terms, key=frequencies.get):
+            postings[term] = self._postings(term, candidates)
+            candidates = set(postings[term]) if candidates is None else candidates & set(postings[term])
+            if not candidates:
+                return
+
+        for doc_id in sorted(candidates, reverse=True):
+            positions = {}
+            occurrences = []
+            for clause in clauses:
+                # フレーズの i 番目の語が 開始位置 + i に現れる位置を開始位置とする
+                starts = None
+                for offset, term in enumerate(clause):
+                    if term not in positions:
+                        positions[term] = decode_positions(postings[term][doc_id])
+                    shifted = {position - offset for position in positions[term]}
+                    starts = shifted if starts is None else starts & shifted
+                    if not starts:
+                        break
+                if not starts:
+                    break
+                occurrences.append([(start, start + len(clause) - 1) for start in sorted(starts)])
+            else:
+                yield doc_id, occurrences
+
+    def _load_hits(self, matches, source):
+        """一致した文書（文書ID -> 範囲の語数）の情報を読み込む"""
+        if not matches:
+            return []
+        placeholders = ','.join('?' * len(matches))
+        sql = f'SELECT id, source, url, title, published, added_at FROM documents WHERE id IN ({placeholders})'
+        params = list(matches)
+        if source:
+            sql += ' AND source = ?'
+            params.append(source)
+        return [SearchHit(*row, span=matches[row[0]]) for row in self.conn.execute(sql, params)]
+
+    def _snippet(self, title, body, start, width=12):
+        """一致した位置の前後の本文（位置はタイトルからの通し番号）"""
+        title_length = len(tokenize(title))
+        offset = title_length + FIELD_GAP if title_length else 0
+        if start < offset:
+            return ''
+        tokens = list(TOKEN_PATTERN.finditer(body))
+        index = start - offset
+        if index >= len(tokens):
+            return ''
+        first = tokens[max(0, index - width)].start()
+        last = tokens[min(len(tokens) - 1, index + width)].end()
+        return ' '.join(body[first:last].split())
+
+    def search(self, query, within=None, source=None, limit=20):
+        """フレーズ（"..."）と語をすべて含む文書を新しく追加した順に返す
+
+        within を指定すると、すべての句が within 語以内の範囲に現れる文書だけを返す。
+        新しい文書から順に調べ、limit 件見つかった時点で打ち切る。
+        """
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+
+        batch_size = min(limit, SQL_CHUNK_SIZE) if limit else SQL_CHUNK_SIZE
+        hits = []
+        first_positions = {}
+        pending = {}
+        for doc_id, occurrences in self._iter_matches(clauses):
+            span = smallest_span(occurrences)
+            if within is not None and span > within:
+                continue
+            pending[doc_id] = span
+            first_positions[doc_id] = occurrences[0][0][0]
+            if len(pending) >= batch_size:
+                hits.extend(self._load_hits(pending, source))
+                pending = {}
+                if limit and len(hits) >= limit:
+                    break
+        hits.extend(self._load_hits(pending, source))
+        hits.sort(key=lambda hit: hit.doc_id, reverse=True)
+        hits = hits[:limit] if limit else hits
+
+        # 表示する分だけ本文を展開して前後の文を付ける
+        for hit in hits:
+            title, body = self.conn.execute('SELECT title, body FROM documents WHERE id = ?',
+                                            (hit.doc_id,)).fetchone()
+            hit.snippet = self._snippet(title or '', zlib.decompress(body).decode('utf-8'), first_positions[hit.doc_id])
+        return hits
+
+    def stats(self):
+        """文書数・語数・転置リストの件数"""
+        return {
+            'documents': self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0],
+            'terms': self.conn.execute('SELECT COUNT(*) FROM terms WHERE doc_count > 0').fetchone()[0],
+            'postings': self.conn.execute('SELECT COUNT(*) FROM postings').fetchone()[0],
+        }
+
+def main():
+    """メイン処理"""
+    arg_parser = argparse.ArgumentParser(description='取得済みニュースの全文検索')
+    arg_parser.add_argument('query', nargs='?', help='検索語（"..." で囲むとフレーズ）')
+    arg_parser.add_argument('--within', type=int, help='すべての句がこの語数以内に現れる文書のみ')
+    arg_parser.add_argument('--source', help='取得元で絞り込む（例: ema_news, cbp501, page）')
+    arg_parser.add_argument('--limit', type=int, default=20, help='表示する最大件数（0で無制限）')
+    arg_parser.add_argument('--index-file', default=DEFAULT_INDEX_FILE, help='索引ファイル')
+    arg_parser.add_argument('--stats', action='store_true', help='索引の件数を表示')
+    args = arg_parser.parse_args()
+
+    archive = NewsArchive(args.index_file)
+    try:
+        if args.stats or not args.query:
+            stats = archive.stats()
+            print(f"📚 文書 {stats['documents']:,}件 / 語 {stats['terms']:,}件 / 転置リスト {stats['postings']:,}件")
+            return True
+
+        started_at = time.perf_counter()
+        hits = archive.search(args.query, within=args.within, source=args.source, limit=args.limit)
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        for hit in hits:
+            date = hit.published or hit.added_at
+            print(f"- [{date}] {hit.title or hit.url} ({hit.source})")
+            print(f"    {hit.url}")
+            if hit.snippet:
+                print(f"    … {hit.snippet} …")
+        print(f"🔎 {len(hits)}件 ({elapsed_ms:.1f} ms)")
+        return True
+    finally:
+        archive.close()
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
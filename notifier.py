@@ -4,132 +4,238 @@ EMA承認監視アプリケーション - Discord通知処理
 新薬承認情報をDiscordに通知する
 """
 
-import requests
 import logging
 import json
-import time
+import threading
+from concurrent.futures import Future
 from datetime import datetime
+from delivery_queue import TokenBucket, WebhookDeliveryQueue, deliver_webhook
+from keyword_matcher import KEYWORD_CLASSIFIER
+from transport import get_transport
 
 logger = logging.getLogger(__name__)
 
+# Discordの1メッセージあたりの上限
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_MESSAGE_CHARS = 6000
+
+def _embed_length(embed):
+    """Discordの文字数制限で数えられるEmbedの文字数"""
+    length = len(embed.get('title') or '') + len(embed.get('description') or '')
+    length += len((embed.get('footer') or {}).get('text') or '')
+    length += len((embed.get('author') or {}).get('name') or '')
+    for field in embed.get('fields', []):
+        length += len(field.get('name') or '') + len(field.get('value') or '')
+    return length
+
+class EmbedBatcher:
+    """複数の通知Embedを1つのWebhookメッセージにまとめて送信するクラス
+    
+    Embedが10件に達するかEmbedの文字数の合計が6000を超える場合、またはmax_delay秒経過した場合に送信する。
+    送信と配信完了の待機はロックの外で行うため、送信中も他のスレッドから通知を追加できる。
+    """
+    
+    def __init__(self, notifier, max_delay=2.0):
+        """max_delayがNoneの場合は時間による送信を行わない"""
+        self.notifier = notifier
+        self.max_delay = max_delay
+        self.results = []
+        self._items = []
+        self._contents = []
+        self._embeds = []
+        self._chars = 0
+        self._timer = None
+        self._lock = threading.Lock()
+    
+    def add(self, news_item):
+        """通知を追加（上限に達する場合は先に溜まっている分を送信）"""
+        try:
+            content, embed = self.notifier._build_approval_message(news_item)
+        except Exception as e:
+            logger.error(f"承認通知の構築に失敗: {e}")
+            with self._lock:
+                self.results.append((news_item, False))
+            return
+        
+        batches = []
+        with self._lock:
+            # Discordの6000文字の上限はEmbedの文字数だけが対象（contentは別に2000文字まで）
+            length = _embed_length(embed)
+            if self._embeds and (
+                len(self._embeds) >= MAX_EMBEDS_PER_MESSAGE
+                or self._chars + length > MAX_MESSAGE_CHARS
+            ):
+                batches.append(self._take_locked())
+            
+            self._items.append(news_item)
+            self._embeds.append(embed)
+            if content and content not in self._contents:
+                self._contents.append(content)
+            self._chars += length
+            
+            if len(self._embeds) >= MAX_EMBEDS_PER_MESSAGE:
+                batches.append(self._take_locked())
+            elif self.max_delay is not None and self._timer is None:
+                self._timer = threading.Timer(self.max_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        
+        for batch in batches:
+            self._send(batch)
+    
+    def _take_locked(self):
+        """溜まっている通知を (項目, content, Embed) として取り出す（ロック取得済みで呼ぶ）"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = (self._items, self._contents, self._embeds)
+        self._items = []
+        self._contents = []
+        self._embeds = []
+        self._chars = 0
+        return batch
+    
+    def _send(self, batch):
+        """取り出した通知を1メッセージで送信し、配信結果を記録（ロックの外で呼ぶ）"""
+        items, contents, embeds = batch
+        if not embeds:
+            return
+        
+        payload = {"embeds": embeds}
+        if contents:
+            payload["content"] = "\n".join(contents)
+        
+        logger.info(f"{len(embeds)}件の通知を1メッセージで送信します")
+        success = self.notifier._send_webhook(payload)
+        if isinstance(success, Future):
+            success = success.result()
+        with self._lock:
+            self.results.extend((item, bool(success)) for item in items)
+    
+    def flush(self):
+        """溜まっている通知をすぐに送信"""
+        with self._lock:
+            batch = self._take_locked()
+        self._send(batch)
+    
+    def close(self):
+        """残りの通知を送信して結果を返す"""
+        self.flush()
+        return self.results
+
 class DiscordNotifier:
     """Discord通知クラス"""
     
-    def __init__(self, webhook_url):
+    def __init__(self, webhook_url, async_delivery=False, transport=None):
+        """async_deliveryがTrueの場合、送信はバックグラウンドで行い各送信メソッドはFutureを返す"""
         self.webhook_url = webhook_url
-        self.session = requests.Session()
-        self.session.headers.update({
+        # 共有の接続プールとサーキットブレーカーを使うセッション
+        self.session = (transport or get_transport()).session({
             'Content-Type': 'application/json',
             'User-Agent': 'EMA-Monitor-Bot/1.0'
         })
+        # Discordのレート制限ヘッダーに従うトークンバケット
+        self.rate_limiter = TokenBucket()
+        self.delivery_queue = None
+        if async_delivery:
+            self.delivery_queue = WebhookDeliveryQueue(self.session, self.webhook_url, self.rate_limiter)
     
     def _send_webhook(self, payload, max_retries=3):
         """Discord Webhookにメッセージを送信"""
-        for attempt in range(max_retries):
-            try:
-                response = self.session.post(
-                    self.webhook_url,
-                    json=payload,
-                    timeout=30
-                )
-                
-                if response.status_code == 204:
-                    return True
-                elif response.status_code == 429:
-                    # レート制限の場合は少し待つ
-                    logger.warning("レート制限に達しました。5秒待機します。")
-                    time.sleep(5)
-                    continue
-                else:
-                    logger.error(f"Discord送信エラー: {response.status_code} - {response.text}")
-                    return False
-                    
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Discord送信リクエストエラー (試行 {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                else:
-                    return False
-        
-        return False
+        if self.delivery_queue:
+            return self.delivery_queue.submit(payload)
+        return deliver_webhook(self.session, self.webhook_url, payload, self.rate_limiter, max_retries)
     
-    def send_approval_notification(self, news_item):
-        """新薬承認通知を送信"""
-        try:
-            # 承認関連かどうかで色を変更
-            color = 0x00FF00 if news_item['is_approval_related'] else 0x0099FF
-            
-            # タイトルから重要な情報を抽出
-            title = news_item['title']
-            description = news_item.get('description', '')
-            
-            # Embedメッセージを構築
-            embed = {
-                "title": title,
-                "description": description if description else "詳細は以下のリンクをご確認ください。",
-                "url": news_item['link'],
-                "color": color,
-                "timestamp": datetime.utcnow().isoformat(),
-                "footer": {
-                    "text": "EMA (European Medicines Agency)",
-                    "icon_url": "https://www.ema.europa.eu/sites/default/files/ema_logo.png"
-                },
-                "fields": []
-            }
+    def close(self):
+        """配信キューに残っている通知を送信し終えてから終了"""
+        if self.delivery_queue:
+            self.delivery_queue.close()
+            self.delivery_queue = None
+    
+    def _build_approval_message(self, news_item):
+        """新薬承認通知の本文（content）とEmbedを構築"""
+        # 承認関連かどうかで色を変更
+        color = 0x00FF00 if news_item['is_approval_related'] else 0x0099FF
+        
+        # タイトルから重要な情報を抽出
+        title = news_item['title']
+        description = news_item.get('description', '')
+        
+        # Embedメッセージを構築
+        embed = {
+            "title": title,
+            "description": description if description else "詳細は以下のリンクをご確認ください。",
+            "url": news_item['link'],
+            "color": color,
+            "timestamp": datetime.utcnow().isoformat(),
+            "footer": {
+                "text": "EMA (European Medicines Agency)",
+                "icon_url": "https://www.ema.europa.eu/sites/default/files/ema_logo.png"
+            },
+            "fields": []
+        }
+        
+        # 日付情報があれば追加
+        if news_item.get('date'):
+            embed["fields"].append({
+                "name": "📅 発表日",
+                "value": news_item['date'],
+                "inline": True
+            })
+        
+        # タイトルのキーワードを全カテゴリまとめて1回で分類
+        title_hits = KEYWORD_CLASSIFIER.classify(title)
+        
+        # 承認関連の場合は特別なマークを追加
+        if news_item['is_approval_related']:
+            # 治験情報かどうかをチェック
+            is_clinical_trial = 'trial' in title_hits or 'trial_extended' in title_hits
             
-            # 日付情報があれば追加
-            if news_item.get('date'):
+            if is_clinical_trial:
                 embed["fields"].append({
-                    "name": "📅 発表日",
-                    "value": news_item['date'],
+                    "name": "🧪 種別",
+                    "value": "治験・臨床試験情報",
                     "inline": True
                 })
-            
-            # 承認関連の場合は特別なマークを追加
-            if news_item['is_approval_related']:
-                # 治験情報かどうかをチェック
-                is_clinical_trial = any(keyword in title.lower() for keyword in [
-                    'phase', 'trial', 'study', 'clinical', 'cbp501', 
-                    'investigational', 'protocol'
-                ])
-                
-                if is_clinical_trial:
-                    embed["fields"].append({
-                        "name": "🧪 種別",
-                        "value": "治験・臨床試験情報",
-                        "inline": True
-                    })
-                else:
-                    embed["fields"].append({
-                        "name": "🎯 種別",
-                        "value": "新薬承認関連",
-                        "inline": True
-                    })
-            
-            # キーワード抽出（治験関連も含む）
-            keywords = self._extract_keywords(title + " " + description)
-            if keywords:
+            else:
                 embed["fields"].append({
-                    "name": "🔍 キーワード",
-                    "value": ", ".join(keywords[:5]),  # 最大5個まで
-                    "inline": False
+                    "name": "🎯 種別",
+                    "value": "新薬承認関連",
+                    "inline": True
                 })
+        
+        # キーワード抽出（治験関連も含む）
+        keywords = self._extract_keywords(title + " " + description)
+        if keywords:
+            embed["fields"].append({
+                "name": "🔍 キーワード",
+                "value": ", ".join(keywords[:5]),  # 最大5個まで
+                "inline": False
+            })
+        
+        # 承認・治験関連の場合は見出しメッセージを追加
+        content = None
+        if news_item['is_approval_related']:
+            is_clinical_trial = 'trial' in title_hits
+            
+            if is_clinical_trial:
+                content = "🧪 **治験・臨床試験情報** 🧪"
+            else:
+                content = "🚨 **新薬承認情報** 🚨"
+        
+        return content, embed
+
+    def send_approval_notification(self, news_item):
+        """新薬承認通知を送信"""
+        try:
+            content, embed = self._build_approval_message(news_item)
             
             # メッセージペイロード
             payload = {
                 "embeds": [embed]
             }
-            
-            # 承認・治験関連の場合は@everyoneを追加
-            if news_item['is_approval_related']:
-                is_clinical_trial = any(keyword in title.lower() for keyword in [
-                    'phase', 'trial', 'study', 'clinical', 'cbp501'
-                ])
-                
-                if is_clinical_trial:
-                    payload["content"] = "🧪 **治験・臨床試験情報** 🧪"
-                else:
-                    payload["content"] = "🚨 **新薬承認情報** 🚨"
+            if content:
+                payload["content"] = content
             
             return self._send_webhook(payload)
         
@@ -137,6 +243,16 @@ class DiscordNotifier:
             logger.error(f"承認通知の構築に失敗: {e}")
             return False
     
+    def send_approval_notifications(self, news_items):
+        """複数の新薬承認通知をできるだけ少ないメッセージにまとめて送信
+        
+        (ニュース項目, 送信成功したか) のリストを返す
+        """
+        batcher = EmbedBatcher(self, max_delay=None)
+        for news_item in news_items:
+            batcher.add(news_item)
+        return batcher.close()
+    
     def send_error_notification(self, error_message):
         """エラー通知を送信"""
         try:
@@ -187,47 +303,11 @@ class DiscordNotifier:
     def _extract_keywords(self, text):
         """テキストから重要なキーワードを抽出（治験情報対応版）"""
         try:
-            text_lower = text.lower()
-            
-            # 治験・臨床試験関連キーワード
-            clinical_keywords = [
-                'phase i', 'phase ii', 'phase iii', 'phase 1', 'phase 2', 'phase 3',
-                'clinical trial', 'clinical study', 'investigational', 'protocol',
-                'cbp501', 'first-in-human', 'dose-escalation', 'pivotal',
-                'enrollment', 'endpoint', 'efficacy', 'safety'
-            ]
-            
-            # 医薬品関連キーワード
-            drug_keywords = [
-                'vaccine', 'treatment', 'therapy', 'medicine', 'drug',
-                'cancer', 'oncology', 'diabetes', 'cardiovascular',
-                'antibiotic', 'antiviral', 'biosimilar', 'generic',
-                'compound', 'candidate', 'novel therapy'
-            ]
-            
-            # 承認関連キーワード
-            approval_keywords = [
-                'approved', 'authorisation', 'recommendation', 'chmp',
-                'positive opinion', 'marketing authorisation', 'conditional',
-                'breakthrough', 'fast track', 'priority review',
-                'orphan designation', 'scientific advice'
-            ]
-            
-            # 企業名キーワード
-            company_keywords = [
-                'pfizer', 'roche', 'novartis', 'gsk', 'astrazeneca',
-                'merck', 'sanofi', 'johnson', 'bayer', 'takeda',
-                'moderna', 'biogen', 'gilead', 'amgen'
-            ]
-            
-            all_keywords = clinical_keywords + drug_keywords + approval_keywords + company_keywords
-            
-            found_keywords = []
-            for keyword in all_keywords:
-                if keyword in text_lower:
-                    found_keywords.append(keyword.title())
-            
-            return list(set(found_keywords))  # 重複除去
+            # 治験・医薬品・承認・企業名の各カテゴリのキーワードを出現順に検出
+            found_keywords = KEYWORD_CLASSIFIER.keywords(
+                text, 'clinical', 'drug', 'approval', 'company'
+            )
+            return [keyword.title() for keyword in found_keywords]
         
         except Exception as e:
             logger.warning(f"キーワード抽出に失敗: {e}")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - プロセスプールによる解析
+取得したページ本文をまとめて別プロセスで解析し、DOMではなくコンパクトな結果（辞書・リスト）だけを返す
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from html_parsers import get_parser_backend
+
+logger = logging.getLogger(__name__)
+
+# 1回のプロセス間通信で送る本文の目安（小さなページはまとめて送り、ページごとの受け渡しの負担を減らす）
+DEFAULT_BATCH_BYTES = 512 * 1024
+MAX_BATCH_PAGES = 64
+
+# ワーカープロセスごとのパーサーバックエンド（初期化時に作成）
+_worker_parser = None
+
+def _news_listing(parser, url, content):
+    """ニュース一覧ページの項目リスト"""
+    from scraper import parse_listing_page
+    return parse_listing_page(parser, content)
+
+def _detail_fields(parser, url, content):
+    """記事ページの本文・公開日・製品名"""
+    from enrichment import extract_detail_fields
+    return extract_detail_fields(parser, content)
+
+def _chmp_highlights(parser, url, content):
+    """CHMPハイライトページの会議と推奨医薬品の記録"""
+    from chmp import parse_highlights
+    return parse_highlights(parser, content, url)
+
+def _page_summary(parser, url, content):
+    """監視ページのタイトル・説明文・本文テキスト・スナップショット用の行"""
+    from snapshots import summarize_page
+    return summarize_page(parser, content)
+
+# ワーカーで実行できる解析（名前で指定し、関数そのものは送らない）
+PARSE_TASKS = {
+    'ema_news': _news_listing,
+    'detail': _detail_fields,
+    'chmp_highlights': _chmp_highlights,
+    'page_summary': _page_summary,
+}
+
+def _init_worker(parser_name):
+    """ワーカープロセスの初期化（パーサーバックエンドを1回だけ作成）"""
+    global _worker_parser
+    _worker_parser = get_parser_backend(parser_name)
+
+def _parse_batch(task, batch):
+    """ワーカー側でバッチ内のページを順に解析し、(成功したか, 結果またはエラー) のリストを返す"""
+    function = PARSE_TASKS[task]
+    results = []
+    for url, content in batch:
+        try:
+            results.append((True, function(_worker_parser, url, content)))
+        except Exception as e:
+            results.append((False, f"{type(e).__name__}: {e}"))
+    return results
+
+def make_batches(pages, batch_bytes, max_pages=MAX_BATCH_PAGES):
+    """(URL, 本文) のリストを、本文の合計が batch_bytes 前後になる連続したバッチに分ける"""
+    batches = []
+    current = []
+    size = 0
+    for page in pages:
+        current.append(page)
+        size += len(page[1])
+        if size >= batch_bytes or len(current) >= max_pages:
+            batches.append(current)
+            current = []
+            size = 0
+    if current:
+        batches.append(current)
+    return batches
+
+class ParsePool:
+    """ページ本文の解析を複数のプロセスに分散するクラス
+
+    プロセスは最初に使うときに起動し、close()まで再利用する。スレッドを使う監視処理からも安全に起動できるよう、
+    利用できる場合は forkserver 方式でプロセスを作成する。
+    """
+
+    def __init__(self, max_workers=None, parser='lxml', batch_bytes=DEFAULT_BATCH_BYTES):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.parser_name = get_parser_backend(parser).name
+        self.batch_bytes = batch_bytes
+        self._executor = None
+
+    def _get_executor(self):
+        """プロセスプールを取得（未起動なら起動する）"""
+        if self._executor is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_worker,
+                initargs=(self.parser_name,)
+            )
+            logger.info(f"解析用のプロセスプールを起動しました ({self.max_workers}プロセス, {method})")
+        return self._executor
+
+    def map(self, task, pages):
+        """(URL, 本文) のリストを解析し、結果を同じ順序で返す（解析に失敗したページはNone）"""
+        if task not in PARSE_TASKS:
+            raise ValueError(f"不明な解析: {task}")
+        pages = list(pages)
+        if not pages:
+            return []
+
+        # ページ数が少なくても全プロセスに行き渡るよう、バッチの大きさを総量に合わせて小さくする
+        total_bytes = sum(len(content) for _, content in pages)
+        batch_bytes = max(1, min(self.batch_bytes, total_bytes // self.max_workers))
+        batches = make_batches(pages, batch_bytes)
+
+        results = []
+        executor = self._get_executor()
+        for batch, batch_results in zip(batches, executor.map(_parse_batch, [task] * len(batches), batches)):
+            for (url, _), (ok, result) in zip(batch, batch_results):
+                if not ok:
+                    logger.warning(f"{url} の解析に失敗 ({task}): {result}")
+                    result = None
+                results.append(result)
+        logger.info(f"{len(pages)}ページを{len(batches)}バッチに分けて解析しました ({task})")
+        return results
+
+    def close(self):
+        """プロセスプールを終了"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
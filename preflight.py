@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+CBP501三相治験監視アプリケーション - 起動前チェック
+重いライブラリを読み込む前に、保存済みの検証子で監視ページが前回から変わっていないかを確認する（標準ライブラリのみ使用）
+"""
+
+import json
+import logging
+import os
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# CBP501Scraperが監視するページ
+MONITORED_URLS = (
+    'https://www.ema.europa.eu/en/news',
+    'https://www.ema.europa.eu/en/events/upcoming-events',
+)
+
+# CBP501Scraperと同じリクエストヘッダー（圧縮形式が違うとETagも変わるためAccept-Encodingも揃える）
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+PREFLIGHT_TIMEOUT = 10
+
+def load_validators(cache_file):
+    """HTTP検証子キャッシュ（HTTPValidatorCacheのファイル）を読み込む"""
+    try:
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                return data
+    except Exception as e:
+        logger.warning(f"{cache_file} の読み込みに失敗: {e}")
+    return {}
+
+def _is_unchanged(url, entry, timeout):
+    """条件付きHEADリクエストでページが未変更かを確認（判定できない場合はFalse）"""
+    headers = dict(REQUEST_HEADERS)
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+
+    request = urllib.request.Request(url, headers=headers, method='HEAD')
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            # 条件付きリクエストを無視するサーバーでも検証子が同じなら未変更とみなす
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                return etag == entry.get('etag') and last_modified == entry.get('last_modified')
+            return False
+    except urllib.error.HTTPError as e:
+        return e.code == 304
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        logger.info(f"{url} の起動前チェックに失敗: {e}")
+        return False
+
+def cached_results(entries, urls=MONITORED_URLS):
+    """前回の解析結果（全ページ分の項目リスト）"""
+    return [item for url in urls for item in (entries.get(url) or {}).get('result') or []]
+
+def pages_unchanged(entries, urls=MONITORED_URLS, timeout=PREFLIGHT_TIMEOUT):
+    """すべての監視ページが前回から未変更ならTrue（検証子や前回結果が無いページがあればFalse）"""
+    for url in urls:
+        entry = entries.get(url)
+        if not entry or 'result' not in entry or not (entry.get('etag') or entry.get('last_modified')):
+            return False
+
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        return all(executor.map(lambda url: _is_unchanged(url, entries[url], timeout), urls))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+CBP501三相治験監視アプリケーション - 定期実行スケジューラー
+常駐モードで監視処理を一定間隔（揺らぎ付き）で実行し、監視対象サイトの障害時は間隔を伸ばす
+"""
+
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+class JitteredScheduler:
+    """単調増加クロックで揺らぎ付きの定期実行を管理するクラス"""
+
+    def __init__(self, interval, jitter=0.0, clock=time.monotonic):
+        """interval・jitterは秒単位"""
+        if interval <= 0:
+            raise ValueError("実行間隔は0より大きい値を指定してください")
+        self.interval = interval
+        self.jitter = min(jitter, interval / 2)
+        self.clock = clock
+        self.next_run = clock()
+
+    def schedule_next(self, started_at=None):
+        """前回の開始時刻を基準に次回の実行時刻を決める"""
+        base = self.next_run if started_at is None else started_at
+        delay = self.interval + random.uniform(-self.jitter, self.jitter)
+        # 処理が長引いて予定時刻を過ぎている場合はすぐに次を実行する
+        self.next_run = max(base + delay, self.clock())
+        return self.next_run
+
+    def seconds_until_next(self):
+        """次回実行までの残り秒数"""
+        return max(0.0, self.next_run - self.clock())
+
+    def wait(self, stop_event):
+        """次回実行まで待機（停止要求があればFalseを返す）"""
+        delay = self.seconds_until_next()
+        logger.info(f"次回のチェックまで {delay:.0f} 秒待機します")
+        return not stop_event.wait(delay)
+
+class AdaptiveScheduler(JitteredScheduler):
+    """監視対象サイトの応答状況に応じて実行間隔を伸縮するスケジューラークラス
+
+    障害中（サーキットブレーカーが開いている・失敗率が高い）は間隔を2倍ずつ、
+    応答が遅い場合は1.5倍ずつ max_interval まで伸ばし、正常に戻れば元の間隔に戻す。
+    """
+
+    def __init__(self, interval, jitter=0.0, max_interval=None, slow_latency=10.0, error_threshold=0.5,
+                 clock=time.monotonic):
+        """max_intervalを省略した場合は interval の8倍まで伸ばす"""
+        super().__init__(interval, jitter, clock)
+        self.base_interval = interval
+        self.base_jitter = jitter
+        self.max_interval = max(interval, max_interval or interval * 8)
+        self.slow_latency = slow_latency
+        self.error_threshold = error_threshold
+
+    def adapt(self, health, circuit_state='closed'):
+        """ホストの応答状況（HostHealth）から次回までの間隔を決めて返す"""
+        if circuit_state != 'closed' or health.error_rate >= self.error_threshold:
+            interval = min(self.max_interval, self.interval * 2)
+            reason = f"障害中（失敗率 {health.error_rate:.0%}, ブレーカー: {circuit_state}）"
+        elif health.latency >= self.slow_latency:
+            interval = min(self.max_interval, self.interval * 1.5)
+            reason = f"応答が遅い（平均 {health.latency:.1f}秒）"
+        else:
+            interval = self.base_interval
+            reason = "正常"
+
+        if interval != self.interval:
+            logger.info(f"チェック間隔を {self.interval:.0f}秒 → {interval:.0f}秒 に変更します: {reason}")
+        self.interval = interval
+        self.jitter = min(self.base_jitter, interval / 2)
+        return interval
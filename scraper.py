@@ -6,79 +6,183 @@ EMAの公式サイトから新薬承認情報を取得する
 
 import requests
 import logging
-from bs4 import BeautifulSoup
-import time
 import re
 from datetime import datetime
 from urllib.parse import urljoin, urlparse
+from chmp import CHMPHighlights
+from enrichment import DetailEnricher
+from feeds import DEFAULT_FEED_URL, FeedSource
+from fingerprint import fingerprint_hex, item_fingerprint, normalize_url
+from html_parsers import get_parser_backend, parse_document
+from http_cache import HTTPValidatorCache
+from keyword_matcher import KEYWORD_CLASSIFIER
+from metrics import FETCH_BYTES, FETCH_SECONDS, ITEMS_EXTRACTED, PARSE_SECONDS
+from transport import DEFAULT_TIMEOUT, get_transport
 
 logger = logging.getLogger(__name__)
 
+# 別プロセスで一覧ページを解析するときに使う、通信を行わないスクレイパー
+_listing_parser = None
+
+def parse_listing_page(parser, content):
+    """ニュース一覧ページを解析して項目リストを返す（プロセスプールのワーカー用）"""
+    global _listing_parser
+    if _listing_parser is None or _listing_parser.parser.name != parser.name:
+        _listing_parser = EMAScraper(cache_file=None, parser=parser.name, feed_url=None)
+    parser, doc = parse_document(parser, content)
+    return _listing_parser._extract_news_items(doc, parser)
+
 class EMAScraper:
     """EMAサイトのスクレイピングクラス"""
     
-    def __init__(self):
+    def __init__(self, cache_file='ema_http_cache.json', parser='lxml', feed_url=DEFAULT_FEED_URL, transport=None):
+        """feed_urlを指定するとフィードを優先して取得し、更新が止まっている場合のみHTMLを解析する"""
         self.base_url = "https://www.ema.europa.eu"
         self.news_url = f"{self.base_url}/en/news"
-        self.session = requests.Session()
-        
-        # User-Agentを設定
-        self.session.headers.update({
+        # 共有の接続プール・再試行方針を使うセッション（User-Agentはこのスクレイパー用）
+        self.session = (transport or get_transport()).session({
             'User-Agent': 'EMA-Monitor-Bot/1.0 (Educational Purpose)',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
             'Accept-Encoding': 'gzip, deflate',
             'Connection': 'keep-alive',
         })
+        
+        # ETag / Last-Modified による条件付きGET用キャッシュ
+        self.http_cache = HTTPValidatorCache(cache_file)
+        
+        # HTMLパーサー（lxmlが使えない場合はBeautifulSoupにフォールバック）
+        self.parser = get_parser_backend(parser)
+        
+        # 記事ページの取得（最初に使うときに作成）
+        self.enricher = None
+        
+        # CHMPハイライトページの取得・解析（最初に使うときに作成）
+        self.chmp = None
+        
+        # 大量のページを解析するときに使うプロセスプール（ParsePool、Noneなら取得したスレッドで解析）
+        self.parse_pool = None
+        
+        # RSS/Atomフィード（Noneの場合はHTMLのみ）
+        self.feed = FeedSource(feed_url, self.session, self.http_cache) if feed_url else None
+        
+        # 取得した項目を蓄積する全文索引（NewsArchive、Noneなら蓄積しない）
+        self.archive = None
     
-    def _make_request(self, url, max_retries=3):
-        """HTTPリクエストを実行（リトライ機能付き）"""
-        for attempt in range(max_retries):
-            try:
-                logger.info(f"リクエスト送信: {url} (試行 {attempt + 1}/{max_retries})")
-                response = self.session.get(url, timeout=30)
-                response.raise_for_status()
-                return response
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"リクエスト失敗 (試行 {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # 指数バックオフ
-                else:
-                    raise
+    def _archive_items(self, news_items):
+        """取得した項目を全文索引に追加（失敗しても取得処理は続ける）"""
+        if self.archive is None or not news_items:
+            return
+        try:
+            self.archive.add_items(news_items, 'ema_news')
+        except Exception as e:
+            logger.warning(f"全文索引への追加に失敗: {e}")
+    
+    def _make_request(self, url):
+        """HTTPリクエストを実行（条件付きGET、再試行は共有の通信基盤が行う）"""
+        headers = self.http_cache.conditional_headers(url)
+        logger.info(f"リクエスト送信: {url}")
+        with FETCH_SECONDS.time(url=url):
+            response = self.session.get(url, headers=headers, timeout=DEFAULT_TIMEOUT)
+        response.raise_for_status()
+        FETCH_BYTES.inc(len(response.content), url=url)
+        return response
     
-    def _extract_news_items(self, soup):
-        """ニュース項目を抽出"""
+    def _normalize_url(self, href):
+        """重複判定用にURLを正規化"""
+        return normalize_url(href, self.base_url)
+    
+    def _collect_candidates(self, doc, parser):
+        """1回の走査でリンク・見出し・説明文の候補を収集"""
+        view_links = []
+        headings = []
+        all_links = []
+        view_content = None
+        view_content_closed = False
+        # 見出しごとに、見出し以降で最初のリンク・p/div要素を待つ
+        awaiting_link = []
+        awaiting_description = []
+        
+        for element in parser.iter_elements(doc, ('a', 'h2', 'h3', 'h4', 'p', 'div')):
+            tag = parser.tag(element)
+            
+            if tag == 'a':
+                for heading in awaiting_link:
+                    heading['link'] = element
+                awaiting_link = []
+                
+                if not parser.href(element):
+                    continue
+                if len(all_links) < 50:
+                    all_links.append(element)
+                
+                # view-contentの範囲は文書上で連続するため、外に出たら以降は判定しない
+                if view_content is not None and not view_content_closed:
+                    if parser.is_descendant(element, view_content):
+                        view_links.append(element)
+                    else:
+                        view_content_closed = True
+            
+            elif tag in ('p', 'div'):
+                for heading in awaiting_description:
+                    heading['description'] = element
+                awaiting_description = []
+                
+                # 最初のview-contentコンテナのみを対象とする
+                if (tag == 'div' and view_content is None and
+                        any('view-content' in name for name in parser.class_names(element))):
+                    view_content = element
+            
+            elif len(headings) < 15:
+                heading = {'element': element, 'link': None, 'description': None}
+                headings.append(heading)
+                awaiting_link.append(heading)
+                awaiting_description.append(heading)
+        
+        return {
+            'view_content_found': view_content is not None,
+            'view_links': view_links,
+            'headings': headings,
+            'all_links': all_links
+        }
+    
+    def _extract_news_items(self, doc, parser=None):
+        """ニュース項目を抽出（文書を1回だけ走査）"""
+        parser = parser or self.parser
         news_items = []
+        seen_urls = set()  # 正規化URLによる重複避け
+        
+        def add_item(item):
+            if not item:
+                return
+            key = self._normalize_url(item['link'])
+            if key in seen_urls:
+                return
+            seen_urls.add(key)
+            news_items.append(item)
         
         try:
             # EMAサイトの実際の構造に基づいた複数のアプローチ
             logger.info("ニュース項目の抽出を開始...")
+            candidates = self._collect_candidates(doc, parser)
             
             # アプローチ1: view-content内のすべてのリンクを検索
-            view_content = soup.find('div', class_=re.compile(r'view-content'))
-            if view_content:
+            if candidates['view_content_found']:
                 logger.info("view-contentコンテナを発見")
-                links = view_content.find_all('a', href=True)
-                logger.info(f"view-content内のリンク数: {len(links)}")
-                
-                processed_urls = set()  # 重複避け
+                logger.info(f"view-content内のリンク数: {len(candidates['view_links'])}")
                 
-                for idx, link in enumerate(links):
+                for idx, link in enumerate(candidates['view_links']):
                     try:
-                        href = link.get('href')
-                        if not href or href in processed_urls:
-                            continue
+                        href = parser.href(link)
                         
                         # EMAニュースページのURLパターンをチェック
                         if '/news/' not in href and '/en/news/' not in href:
                             continue
-                        
-                        processed_urls.add(href)
+                        if self._normalize_url(href) in seen_urls:
+                            continue
                         
                         # リンクからニュース項目を構築
-                        item = self._parse_link_item(link, idx)
-                        if item:
-                            news_items.append(item)
+                        add_item(self._parse_link_item(link, idx, parser))
                             
                     except Exception as e:
                         logger.warning(f"リンク解析に失敗 (項目 {idx}): {e}")
@@ -87,16 +191,15 @@ class EMAScraper:
             # アプローチ2: 見出しタグを基準にした抽出
             if len(news_items) < 5:
                 logger.info("見出しタグからの抽出を試行...")
-                headings = soup.find_all(['h2', 'h3', 'h4'])
                 
-                for idx, heading in enumerate(headings[:15]):
+                for idx, heading in enumerate(candidates['headings']):
                     try:
-                        # 見出しに関連するリンクを検索
-                        link = heading.find('a') or heading.find_next('a')
-                        if link and link.get('href'):
-                            item = self._parse_heading_item(heading, link, idx + 1000)
-                            if item and item not in news_items:
-                                news_items.append(item)
+                        # 見出しに関連するリンク（見出し内または見出し以降で最初のリンク）
+                        link = heading['link']
+                        if link is not None and parser.href(link):
+                            add_item(self._parse_heading_item(
+                                heading['element'], link, heading['description'], idx + 1000, parser
+                            ))
                     except Exception as e:
                         logger.warning(f"見出し解析に失敗 (項目 {idx}): {e}")
                         continue
@@ -104,21 +207,17 @@ class EMAScraper:
             # アプローチ3: より広範な検索
             if len(news_items) < 3:
                 logger.info("広範なリンク検索を実行...")
-                all_links = soup.find_all('a', href=True)
                 
-                for idx, link in enumerate(all_links[:50]):
+                for idx, link in enumerate(candidates['all_links']):
                     try:
-                        href = link.get('href', '')
-                        text = link.get_text(strip=True)
+                        href = parser.href(link) or ''
                         
                         # EMAニュース関連のURLを検索
                         if (('/news/' in href or '/en/news/' in href) and 
-                            len(text) > 10 and 
-                            not any(item['link'] == urljoin(self.base_url, href) for item in news_items)):
+                            len(parser.text(link)) > 10 and 
+                            self._normalize_url(href) not in seen_urls):
                             
-                            item = self._parse_generic_link(link, idx + 2000)
-                            if item:
-                                news_items.append(item)
+                            add_item(self._parse_generic_link(link, idx + 2000, parser))
                                 
                     except Exception as e:
                         continue
@@ -130,23 +229,23 @@ class EMAScraper:
         
         return news_items
     
-    def _parse_link_item(self, link, idx):
+    def _parse_link_item(self, link, idx, parser=None):
         """リンク要素からニュース項目を解析"""
+        parser = parser or self.parser
         try:
-            title = link.get_text(strip=True)
+            title = parser.text(link)
             if not title or len(title) < 10:
                 return None
             
-            href = link.get('href')
+            href = parser.href(link)
             full_url = urljoin(self.base_url, href)
             
             # 周辺のコンテキストから説明文を検索
             description = ""
-            parent = link.parent
-            if parent:
+            parent = parser.parent(link)
+            if parent is not None:
                 # 同じ親要素内の他のテキストを検索
-                text_elements = parent.find_all(text=True)
-                combined_text = ' '.join([t.strip() for t in text_elements if t.strip()])
+                combined_text = parser.joined_strings(parent)
                 if len(combined_text) > len(title):
                     description = combined_text[:200] + "..."
             
@@ -158,8 +257,8 @@ class EMAScraper:
                 r'\w+\s+\d{4}'             # "July 2025"
             ]
             
-            if parent:
-                parent_text = parent.get_text()
+            if parent is not None:
+                parent_text = parser.raw_text(parent)
                 for pattern in date_patterns:
                     match = re.search(pattern, parent_text)
                     if match:
@@ -167,18 +266,13 @@ class EMAScraper:
                         break
             
             # 承認関連キーワードのチェック
-            content_text = (title + " " + description).lower()
-            approval_keywords = [
-                'recommended for approval', 'positive opinion', 'marketing authorisation',
-                'new medicine', 'chmp', 'committee for medicinal products',
-                'approved', 'authorisation', 'recommendation', 'conditional marketing',
-                'orphan medicine', 'biosimilar', 'generic medicine'
-            ]
-            
-            is_approval_related = any(keyword in content_text for keyword in approval_keywords)
+            content_text = title + " " + description
+            is_approval_related = KEYWORD_CLASSIFIER.has_any(
+                content_text, 'approval_news', 'approval_news_extended'
+            )
             
             return {
-                'id': f"link_{idx}_{hash(title + full_url)}",
+                'id': fingerprint_hex(title, full_url),
                 'title': title,
                 'link': full_url,
                 'date': date_text,
@@ -190,36 +284,30 @@ class EMAScraper:
             logger.warning(f"リンク項目の解析エラー: {e}")
             return None
     
-    def _parse_heading_item(self, heading, link, idx):
+    def _parse_heading_item(self, heading, link, next_element, idx, parser=None):
         """見出し要素からニュース項目を解析"""
+        parser = parser or self.parser
         try:
-            title = heading.get_text(strip=True)
+            title = parser.text(heading)
             if not title or len(title) < 10:
                 return None
             
-            href = link.get('href')
+            href = parser.href(link)
             full_url = urljoin(self.base_url, href)
             
             # 見出しの次の要素から説明文を検索
             description = ""
-            next_element = heading.find_next(['p', 'div'])
-            if next_element:
-                desc_text = next_element.get_text(strip=True)
+            if next_element is not None:
+                desc_text = parser.text(next_element)
                 if desc_text and len(desc_text) > 20:
                     description = desc_text[:200] + "..."
             
             # 承認関連キーワードのチェック
-            content_text = (title + " " + description).lower()
-            approval_keywords = [
-                'recommended for approval', 'positive opinion', 'marketing authorisation',
-                'new medicine', 'chmp', 'committee for medicinal products',
-                'approved', 'authorisation', 'recommendation'
-            ]
-            
-            is_approval_related = any(keyword in content_text for keyword in approval_keywords)
+            content_text = title + " " + description
+            is_approval_related = KEYWORD_CLASSIFIER.has_any(content_text, 'approval_news')
             
             return {
-                'id': f"heading_{idx}_{hash(title + full_url)}",
+                'id': fingerprint_hex(title, full_url),
                 'title': title,
                 'link': full_url,
                 'date': "",
@@ -231,28 +319,22 @@ class EMAScraper:
             logger.warning(f"見出し項目の解析エラー: {e}")
             return None
     
-    def _parse_generic_link(self, link, idx):
+    def _parse_generic_link(self, link, idx, parser=None):
         """一般的なリンクからニュース項目を解析"""
+        parser = parser or self.parser
         try:
-            title = link.get_text(strip=True)
+            title = parser.text(link)
             if not title or len(title) < 15:
                 return None
             
-            href = link.get('href')
+            href = parser.href(link)
             full_url = urljoin(self.base_url, href)
             
             # 承認関連キーワードのチェック
-            content_text = title.lower()
-            approval_keywords = [
-                'recommended for approval', 'positive opinion', 'marketing authorisation',
-                'new medicine', 'chmp', 'committee for medicinal products',
-                'approved', 'authorisation', 'recommendation'
-            ]
-            
-            is_approval_related = any(keyword in content_text for keyword in approval_keywords)
+            is_approval_related = KEYWORD_CLASSIFIER.has_any(title, 'approval_news')
             
             return {
-                'id': f"generic_{idx}_{hash(title + full_url)}",
+                'id': fingerprint_hex(title, full_url),
                 'title': title,
                 'link': full_url,
                 'date': "",
@@ -264,17 +346,37 @@ class EMAScraper:
             logger.warning(f"一般リンク項目の解析エラー: {e}")
             return None
     
-    def get_latest_news(self, max_items=10):
-        """最新ニュースを取得（治験情報重視版）"""
-        try:
-            # メインニュースページを取得
-            response = self._make_request(self.news_url)
-            soup = BeautifulSoup(response.content, 'html.parser')
+    def _fetch_news_page_items(self):
+        """メインニュースページを取得してニュース項目を抽出"""
+        response = self._make_request(self.news_url)
+        
+        if response.status_code == 304:
+            # 未変更の場合は解析・キーワード判定を省略して前回の結果を再利用
+            logger.info("ニュースページは前回から更新されていません。前回の抽出結果を再利用します")
+            return list(self.http_cache.get_result(self.news_url) or [])
+        
+        with PARSE_SECONDS.time(source='ema_news'):
+            parser, doc = parse_document(self.parser, response.content)
             
-            logger.info("ニュースページの解析を開始")
+            logger.info(f"ニュースページの解析を開始 (パーサー: {parser.name})")
             
             # ニュース項目を抽出
-            news_items = self._extract_news_items(soup)
+            news_items = self._extract_news_items(doc, parser)
+        ITEMS_EXTRACTED.inc(len(news_items), source='ema_news')
+        self.http_cache.store(self.news_url, response, news_items)
+        self.http_cache.save()
+        return news_items
+    
+    def get_latest_news(self, max_items=10, seen=None):
+        """最新ニュースを取得（治験情報重視版）
+        
+        seen に FingerprintSet を渡すと、前回までに取得済みの項目を除いた新着のみを返す
+        """
+        try:
+            # フィードを優先し、取得できない・更新が止まっている場合はニュースページを解析
+            news_items = self.feed.fetch() if self.feed else None
+            if news_items is None:
+                news_items = self._fetch_news_page_items()
             
             # 治験情報も取得
             try:
@@ -284,7 +386,7 @@ class EMAScraper:
                 # 治験情報をニュース形式に変換
                 for trial in trial_updates:
                     trial_item = {
-                        'id': f"trial_{hash(trial['title'] + trial['url'])}",
+                        'id': fingerprint_hex(trial['title'], trial['url']),
                         'title': trial['title'],
                         'link': trial['url'],
                         'date': "",
@@ -295,6 +397,14 @@ class EMAScraper:
             except Exception as e:
                 logger.warning(f"治験情報取得でエラー: {e}")
             
+            # 通知済みかどうかに関わらず、取得したすべての項目を全文索引に残す
+            self._archive_items(news_items)
+            
+            # 取得済みの項目を識別子の集合で除外
+            if seen is not None:
+                news_items = seen.filter_new(news_items)
+                logger.info(f"新着項目: {len(news_items)}件")
+            
             # 承認関連・治験関連のニュースを優先してフィルタリング
             approval_and_trial_news = [item for item in news_items if item['is_approval_related']]
             other_news = [item for item in news_items if not item['is_approval_related']]
@@ -316,6 +426,154 @@ class EMAScraper:
             logger.error(f"ニュース取得に失敗: {e}")
             return []
     
+    def _listing_page_url(self, page):
+        """ニュース一覧のページURL（0ページ目は先頭ページ）"""
+        return self.news_url if page == 0 else f"{self.news_url}?page={page}"
+    
+    def _download_listing_page(self, page):
+        """ニュース一覧の1ページ分を取得
+        
+        (未変更か, 前回の項目リストまたはレスポンス) を返す。ページが存在しない・取得できない場合はNone
+        """
+        url = self._listing_page_url(page)
+        if page == 0:
+            # 先頭ページは条件付きGETで、未変更なら解析を省略する
+            response = self._make_request(url)
+            if response.status_code == 304:
+                return True, list(self.http_cache.get_result(url) or [])
+        else:
+            # 2ページ目以降は内容がずれていくため検証子を使わず、存在しない場合は再試行しない
+            try:
+                with FETCH_SECONDS.time(url=url):
+                    response = self.session.get(url, timeout=DEFAULT_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"ニュース一覧 {page + 1}ページ目の取得に失敗: {e}")
+                return False, None
+            if response.status_code != 200:
+                logger.info(f"ニュース一覧 {page + 1}ページ目はありません ({response.status_code})")
+                return False, None
+            FETCH_BYTES.inc(len(response.content), url=url)
+        return False, response
+    
+    def _store_listing_items(self, page, response, items):
+        """解析した一覧ページの項目を記録（先頭ページは検証子とともにキャッシュする）"""
+        ITEMS_EXTRACTED.inc(len(items), source='ema_news')
+        if page == 0:
+            url = self._listing_page_url(page)
+            self.http_cache.store(url, response, items)
+            self.http_cache.save()
+    
+    def _fetch_listing_items(self, page):
+        """ニュース一覧の1ページ分の項目を取得
+        
+        (未変更か, 項目リスト) を返す。ページが存在しない・取得できない場合の項目リストはNone
+        """
+        unchanged, result = self._download_listing_page(page)
+        if unchanged or result is None:
+            return unchanged, result
+        
+        with PARSE_SECONDS.time(source='ema_news'):
+            parser, doc = parse_document(self.parser, result.content)
+            items = self._extract_news_items(doc, parser)
+        self._store_listing_items(page, result, items)
+        return False, items
+    
+    def _fetch_listing_batch(self, max_pages):
+        """一覧ページをまとめて取得し、プロセスプールで並列に解析する（バックフィル用）
+        
+        ページ順の (未変更か, 項目リスト) のリストを返す。存在しないページに達した時点で取得をやめる
+        """
+        downloaded = []
+        for page in range(max_pages):
+            unchanged, result = self._download_listing_page(page)
+            downloaded.append((unchanged, result))
+            if result is None:
+                break
+        
+        responses = [(page, result) for page, (unchanged, result) in enumerate(downloaded)
+                     if not unchanged and result is not None]
+        with PARSE_SECONDS.time(source='ema_news'):
+            parsed = self.parse_pool.map(
+                'ema_news', [(self._listing_page_url(page), response.content) for page, response in responses]
+            )
+        items_by_page = {}
+        for (page, response), items in zip(responses, parsed):
+            items = items or []
+            self._store_listing_items(page, response, items)
+            items_by_page[page] = items
+        return [(unchanged, items_by_page.get(page, result)) for page, (unchanged, result) in enumerate(downloaded)]
+    
+    def crawl_news(self, seen, max_pages=5, backfill=False, stop_after_seen=1, mark=True):
+        """ニュース一覧を新しい順にたどり、取得済みの項目に到達した時点で止める差分クロール
+        
+        seen には取得済み識別子の集合（FingerprintSetなど）を渡す。
+        backfill がTrueの場合は取得済みの項目で止めず、max_pagesまで未取得の項目を拾い直す（停止期間後の補完用）。
+        先頭に固定表示される項目がある場合は stop_after_seen で連続何件の取得済み項目で止めるかを指定する。
+        """
+        new_items = []
+        crawled = set()
+        consecutive_seen = 0
+        
+        try:
+            # プロセスプールがあればバックフィルでは全ページを取得してからまとめて解析する
+            if backfill and self.parse_pool is not None:
+                listing = self._fetch_listing_batch(max_pages)
+            else:
+                listing = (self._fetch_listing_items(page) for page in range(max_pages))
+            for page, (unchanged, items) in enumerate(listing):
+                if unchanged and not backfill:
+                    logger.info("ニュース一覧は前回から更新されていません")
+                    break
+                if not items:
+                    break
+                
+                page_new = 0
+                reached_seen = False
+                for item in items:
+                    fingerprint = item_fingerprint(item)
+                    if fingerprint in crawled:
+                        continue
+                    crawled.add(fingerprint)
+                    page_new += 1
+                    
+                    if fingerprint in seen:
+                        consecutive_seen += 1
+                        if not backfill and consecutive_seen >= stop_after_seen:
+                            reached_seen = True
+                            break
+                        continue
+                    
+                    consecutive_seen = 0
+                    new_items.append(item)
+                
+                if reached_seen:
+                    logger.info(f"{page + 1}ページ目で取得済みの項目に到達しました")
+                    break
+                if page_new == 0:
+                    # 範囲外のページ番号で同じ内容が返ってきた場合
+                    break
+        
+        except Exception as e:
+            logger.error(f"ニュース一覧の差分クロールに失敗: {e}")
+        
+        if mark:
+            for item in new_items:
+                seen.add(item_fingerprint(item))
+        self._archive_items(new_items)
+        
+        logger.info(f"差分クロール: 新着{len(new_items)}件")
+        return new_items
+    
+    def enrich_news_items(self, news_items):
+        """ニュース項目のリンク先の記事ページを並列に取得し、本文・公開日・製品名を付加"""
+        if self.enricher is None:
+            self.enricher = DetailEnricher(self.session, parser=self.parser)
+        self.enricher.parse_pool = self.parse_pool
+        news_items = self.enricher.enrich(news_items)
+        # 記事本文が付いた項目は索引し直す
+        self._archive_items(news_items)
+        return news_items
+    
     def get_chmp_highlights(self):
         """CHMP会議のハイライトを取得"""
         try:
@@ -323,21 +581,45 @@ class EMAScraper:
             chmp_search_url = f"{self.base_url}/en/search?search_api_views_fulltext=CHMP%20highlights"
             
             response = self._make_request(chmp_search_url)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # 最新のCHMPハイライトリンクを検索
-            chmp_links = []
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                if 'chmp' in href.lower() and 'highlights' in href.lower():
-                    full_url = urljoin(self.base_url, href)
-                    chmp_links.append({
-                        'title': link.get_text(strip=True),
-                        'url': full_url
-                    })
-            
-            return chmp_links[:5]  # 最新5件まで
+            if response.status_code == 304:
+                logger.info("CHMPハイライト検索結果は前回から更新されていません")
+                return self.http_cache.get_result(chmp_search_url) or []
+            
+            with PARSE_SECONDS.time(source='chmp_highlights'):
+                parser, doc = parse_document(self.parser, response.content)
+                
+                # 最新のCHMPハイライトリンクを検索
+                chmp_links = []
+                for link in parser.links(doc):
+                    href = parser.href(link)
+                    if 'chmp' in href.lower() and 'highlights' in href.lower():
+                        full_url = urljoin(self.base_url, href)
+                        chmp_links.append({
+                            'title': parser.text(link),
+                            'url': full_url
+                        })
+            
+            chmp_links = chmp_links[:5]  # 最新5件まで
+            ITEMS_EXTRACTED.inc(len(chmp_links), source='chmp_highlights')
+            self.http_cache.store(chmp_search_url, response, chmp_links)
+            self.http_cache.save()
+            return chmp_links
         
         except Exception as e:
             logger.error(f"CHMPハイライト取得に失敗: {e}")
-            return []
\ No newline at end of file
+            return []
+    
+    def get_chmp_opinions(self, max_meetings=5):
+        """CHMPハイライトのページを並列に取得し、推奨された医薬品の記録（製品名・一般名・適応・意見の種類）を返す
+        
+        会議ごとの解析結果はキャッシュされ、解析済みのページは取得し直さない。
+        """
+        try:
+            links = self.get_chmp_highlights()[:max_meetings]
+            if self.chmp is None:
+                self.chmp = CHMPHighlights(self.session, parser=self.parser)
+            self.chmp.parse_pool = self.parse_pool
+            return self.chmp.fetch_records(link['url'] for link in links)
+        except Exception as e:
+            logger.error(f"CHMPハイライトの解析に失敗: {e}")
+            return []
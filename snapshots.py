@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+CBP501三相治験監視アプリケーション - ページスナップショット
+監視対象URLの本文を正規化・圧縮して保存し、前回との差分（追加・削除された行）を求める
+"""
+
+import hashlib
+import logging
+import zlib
+from html_parsers import get_parser_backend, parse_document
+
+logger = logging.getLogger(__name__)
+
+# 本文に含めない要素
+NON_CONTENT_TAGS = ('script', 'style', 'noscript', 'template')
+
+# 類似度の計算に使う単語シングルの長さと、ローリングハッシュの基数・法
+SHINGLE_SIZE = 4
+HASH_BASE = 1000003
+HASH_MODULUS = (1 << 61) - 1
+
+def _remove_non_content(parser, doc):
+    """スクリプト・スタイルなど本文ではない要素を取り除く"""
+    for element in list(parser.iter_elements(doc, NON_CONTENT_TAGS)):
+        try:
+            parser.remove(element)
+        except Exception:
+            continue
+
+def normalize_page_text(parser, content):
+    """HTMLを比較用の本文（テキストノードごとに空白を揃えた行のリスト）にする"""
+    parser, doc = parse_document(parser, content)
+    _remove_non_content(parser, doc)
+    return [' '.join(text.split()) for text in parser.strings(doc)]
+
+def summarize_page(parser, content):
+    """監視ページのタイトル・説明文・本文テキスト・比較用の行を1回の解析で求める（プロセスプールのワーカー用）"""
+    parser, doc = parse_document(parser, content)
+    title = description = None
+    for element in parser.iter_elements(doc, ('title', 'meta')):
+        tag = parser.tag(element)
+        if tag == 'title' and title is None:
+            title = parser.raw_text(element).strip()
+        elif tag == 'meta' and description is None and parser.attribute(element, 'name') == 'description':
+            description = parser.attribute(element, 'content')
+    _remove_non_content(parser, doc)
+    return {
+        'title': title,
+        'description': description,
+        'text': parser.raw_text(doc),
+        'lines': [' '.join(text.split()) for text in parser.strings(doc)]
+    }
+
+def text_digest(lines):
+    """正規化した本文全体のハッシュ値"""
+    return hashlib.blake2b('\n'.join(lines).encode('utf-8'), digest_size=16).hexdigest()
+
+def line_hash(line):
+    """1行分のハッシュ値（行単位の差分の索引）"""
+    return hashlib.blake2b(line.encode('utf-8'), digest_size=8).digest()
+
+def shingle_hashes(lines, size=SHINGLE_SIZE):
+    """連続するsize語ごとのシングルをローリングハッシュで求める"""
+    words = [zlib.crc32(word.encode('utf-8')) for line in lines for word in line.split()]
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+
+    # 窓から外れる先頭の語を取り除くための係数（HASH_BASE ** (size - 1)）
+    drop = pow(HASH_BASE, size - 1, HASH_MODULUS)
+    value = 0
+    for word in words[:size]:
+        value = (value * HASH_BASE + word) % HASH_MODULUS
+    shingles = {value}
+    for old, new in zip(words, words[size:]):
+        value = ((value - old * drop) * HASH_BASE + new) % HASH_MODULUS
+        shingles.add(value)
+    return shingles
+
+class PageDiff:
+    """前回のスナップショットとの差分"""
+
+    def __init__(self, url, added, removed, similarity):
+        self.url = url
+        self.added = added
+        self.removed = removed
+        self.similarity = similarity
+
+    def lines_matching(self, predicate):
+        """条件に合う (追加行, 削除行) を返す"""
+        return (
+            [line for line in self.added if predicate(line)],
+            [line for line in self.removed if predicate(line)]
+        )
+
+    def summary(self, max_lines=3):
+        """差分の要約（ログ・通知用）"""
+        parts = [f"+{len(self.added)}行 / -{len(self.removed)}行 (類似度 {self.similarity:.0%})"]
+        parts.extend(f"+ {line[:120]}" for line in self.added[:max_lines])
+        parts.extend(f"- {line[:120]}" for line in self.removed[:max_lines])
+        return '\n'.join(parts)
+
+def diff_lines(url, old_lines, new_lines):
+    """行単位のハッシュ索引で追加・削除された行を求める（出現回数も考慮）"""
+    old_counts = {}
+    for line in old_lines:
+        key = line_hash(line)
+        old_counts[key] = old_counts.get(key, 0) + 1
+
+    added = []
+    for line in new_lines:
+        key = line_hash(line)
+        if old_counts.get(key):
+            old_counts[key] -= 1
+        else:
+            added.append(line)
+
+    new_counts = {}
+    for line in new_lines:
+        key = line_hash(line)
+        new_counts[key] = new_counts.get(key, 0) + 1
+    removed = []
+    for line in old_lines:
+        key = line_hash(line)
+        if new_counts.get(key):
+            new_counts[key] -= 1
+        else:
+            removed.append(line)
+
+    old_shingles = shingle_hashes(old_lines)
+    new_shingles = shingle_hashes(new_lines)
+    union = old_shingles | new_shingles
+    similarity = len(old_shingles & new_shingles) / len(union) if union else 1.0
+    return PageDiff(url, added, removed, similarity)
+
+class SnapshotTracker:
+    """状態ストアにページのスナップショットを保存し、変化を検出するクラス"""
+
+    def __init__(self, store, parser='lxml', archive=None):
+        """archive（NewsArchive）を渡すと、最新の本文を全文索引にも追加する（URLごとに前回の版を置き換える）"""
+        self.store = store
+        self.parser = get_parser_backend(parser)
+        self.archive = archive
+
+    def update(self, url, content, lines=None):
+        """ページ本文でスナップショットを更新し、変化があればPageDiffを返す
+
+        本文のハッシュ値が前回と同じ場合は前回の本文を読み込まずに None を返す。
+        初めてのURLの場合も比較対象が無いため None を返す。
+        正規化済みの行（linesの指定）があれば本文を解析し直さない。
+        """
+        if lines is None:
+            try:
+                lines = normalize_page_text(self.parser, content)
+            except Exception as e:
+                logger.warning(f"{url} の本文の正規化に失敗: {e}")
+                return None
+
+        digest = text_digest(lines)
+        if self.archive is not None:
+            try:
+                self.archive.add_page(url, lines)
+            except Exception as e:
+                logger.warning(f"{url} の全文索引への追加に失敗: {e}")
+        previous = self.store.get_page_snapshot(url)
+        if previous is not None and previous[0] == digest:
+            return None
+
+        self.store.save_page_snapshot(url, digest, zlib.compress('\n'.join(lines).encode('utf-8')))
+        if previous is None:
+            logger.info(f"{url} のスナップショットを作成しました ({len(lines)}行)")
+            return None
+
+        old_lines = zlib.decompress(previous[1]).decode('utf-8').split('\n')
+        diff = diff_lines(url, old_lines, lines)
+        logger.info(f"{url} の内容が変化しました: {diff.summary(max_lines=0)}")
+        return diff
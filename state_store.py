@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+CBP501三相治験監視アプリケーション - 状態ストア
+実行回数・ステータス・通知済み項目・実行履歴・ページと医薬品データセットのスナップショットをSQLiteで管理する
+"""
+
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from fingerprint import item_fingerprint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_FILE = 'monitor_state.db'
+
+# 旧バージョンのテキストファイルと、移行先のキー
+LEGACY_TEXT_FILES = {
+    'execution_counter.txt': 'execution_count',
+    'cbp501_status.txt': 'cbp501_status',
+    'last_survival_check.txt': 'last_survival_check',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS seen_items (
+    fingerprint TEXT PRIMARY KEY,
+    title TEXT,
+    url TEXT,
+    source TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS run_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    execution_count INTEGER,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    result TEXT,
+    found_count INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS status_transitions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject TEXT NOT NULL,
+    old_status TEXT,
+    new_status TEXT NOT NULL,
+    changed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS page_snapshots (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    content BLOB NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS medicine_records (
+    record_key TEXT PRIMARY KEY,
+    row_hash TEXT NOT NULL,
+    record TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_status_transitions_subject
+    ON status_transitions (subject, changed_at);
+CREATE INDEX IF NOT EXISTS idx_run_history_started_at
+    ON run_history (started_at);
+"""
+
+def _now():
+    """現在時刻（ISO形式）"""
+    return datetime.now().isoformat(timespec='seconds')
+
+class StateStore:
+    """SQLiteによる監視状態ストアクラス"""
+
+    def __init__(self, db_path=DEFAULT_DB_FILE, in_memory=False):
+        """in_memoryがTrueの場合はメモリ上で更新し、checkpoint()でディスクに書き出す"""
+        self.db_path = db_path
+        self.in_memory = in_memory
+        if in_memory:
+            self.conn = sqlite3.connect(':memory:')
+            disk = sqlite3.connect(db_path)
+            try:
+                disk.backup(self.conn)
+            finally:
+                disk.close()
+        else:
+            self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def checkpoint(self):
+        """メモリ上の状態をディスクに書き出す"""
+        self.conn.commit()
+        if not self.in_memory:
+            return
+        try:
+            disk = sqlite3.connect(self.db_path)
+            try:
+                self.conn.backup(disk)
+            finally:
+                disk.close()
+            logger.info("状態ストアのチェックポイントを保存しました")
+        except sqlite3.Error as e:
+            logger.error(f"状態ストアのチェックポイント保存に失敗: {e}")
+
+    def close(self):
+        """データベースを閉じる"""
+        self.checkpoint()
+        self.conn.close()
+
+    def get_value(self, key, default=None):
+        """キーに対応する値を取得"""
+        row = self.conn.execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_value(self, key, value):
+        """キーに値を保存"""
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO kv (key, value) VALUES (?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+                (key, str(value))
+            )
+
+    def increment(self, key):
+        """整数カウンタを1加算して新しい値を返す"""
+        try:
+            value = int(self.get_value(key, 0)) + 1
+        except ValueError:
+            value = 1
+        self.set_value(key, value)
+        return value
+
+    def migrate_text_files(self, directory='.'):
+        """旧バージョンのテキストファイルから状態を取り込む（初回のみ）"""
+        if self.get_value('legacy_text_files_migrated'):
+            return
+
+        for file_name, key in LEGACY_TEXT_FILES.items():
+            path = os.path.join(directory, file_name)
+            try:
+                if os.path.exists(path) and self.get_value(key) is None:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        value = f.read().strip()
+                    if value:
+                        self.set_value(key, value)
+                        logger.info(f"{file_name} の内容を状態ストアに移行しました")
+            except Exception as e:
+                logger.warning(f"{file_name} の移行に失敗: {e}")
+
+        self.set_value('legacy_text_files_migrated', _now())
+
+    def is_seen(self, item):
+        """通知済み（既知）の項目かどうか"""
+        row = self.conn.execute(
+            'SELECT 1 FROM seen_items WHERE fingerprint = ?', (item_fingerprint(item),)
+        ).fetchone()
+        return row is not None
+
+    def count_seen(self):
+        """記録済みの項目数"""
+        return self.conn.execute('SELECT COUNT(*) FROM seen_items').fetchone()[0]
+
+    def filter_unseen(self, items):
+        """未確認の項目だけを返す"""
+        return [item for item in items if not self.is_seen(item)]
+
+    def mark_seen(self, items):
+        """項目を確認済みとして記録"""
+        now = _now()
+        with self.conn:
+            for item in items:
+                self.conn.execute(
+                    'INSERT INTO seen_items (fingerprint, title, url, source, first_seen, last_seen) '
+                    'VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT(fingerprint) DO UPDATE SET last_seen = excluded.last_seen',
+                    (
+                        item_fingerprint(item),
+                        item.get('title'),
+                        item.get('url') or item.get('link'),
+                        item.get('source'),
+                        now,
+                        now
+                    )
+                )
+
+    def record_status(self, subject, new_status, default=None):
+        """現在のステータスを保存し、変化していれば遷移を記録して前回値を返す"""
+        key = f"{subject}_status"
+        old_status = self.get_value(key, default)
+        with self.conn:
+            if old_status != new_status:
+                self.conn.execute(
+                    'INSERT INTO status_transitions (subject, old_status, new_status, changed_at) '
+                    'VALUES (?, ?, ?, ?)',
+                    (subject, old_status, new_status, _now())
+                )
+            self.conn.execute(
+                'INSERT INTO kv (key, value) VALUES (?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+                (key, new_status)
+            )
+        return old_status
+
+    def start_run(self, execution_count):
+        """実行履歴を開始して実行IDを返す"""
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO run_history (execution_count, started_at) VALUES (?, ?)',
+                (execution_count, _now())
+            )
+        return cursor.lastrowid
+
+    def finish_run(self, run_id, result, found_count=None, error=None):
+        """実行履歴に結果を記録"""
+        with self.conn:
+            self.conn.execute(
+                'UPDATE run_history SET finished_at = ?, result = ?, found_count = ?, error = ? '
+                'WHERE id = ?',
+                (_now(), result, found_count, error, run_id)
+            )
+
+    def get_page_snapshot(self, url):
+        """ページのスナップショット (ハッシュ値, 圧縮済み本文) を取得"""
+        return self.conn.execute(
+            'SELECT digest, content FROM page_snapshots WHERE url = ?', (url,)
+        ).fetchone()
+
+    def save_page_snapshot(self, url, digest, content):
+        """ページのスナップショットを保存"""
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO page_snapshots (url, digest, content, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(url) DO UPDATE SET digest = excluded.digest, '
+                'content = excluded.content, updated_at = excluded.updated_at',
+                (url, digest, content, _now())
+            )
+
+    def get_medicine_hashes(self):
+        """医薬品データセットの前回のスナップショット（キー -> 行のハッシュ値）"""
+        return dict(self.conn.execute('SELECT record_key, row_hash FROM medicine_records'))
+
+    def get_medicine_records(self, keys):
+        """指定したキーの前回の行（キー -> JSON文字列）"""
+        records = {}
+        keys = list(keys)
+        # SQLiteのプレースホルダー数の上限を超えないよう分割して取得
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            records.update(self.conn.execute(
+                f'SELECT record_key, record FROM medicine_records WHERE record_key IN ({placeholders})', chunk
+            ))
+        return records
+
+    def update_medicine_records(self, upserts, removed_keys):
+        """医薬品データセットのスナップショットを差分で更新（upserts: (キー, ハッシュ値, JSON文字列) のリスト）"""
+        now = _now()
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO medicine_records (record_key, row_hash, record, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(record_key) DO UPDATE SET row_hash = excluded.row_hash, '
+                'record = excluded.record, updated_at = excluded.updated_at',
+                [(key, row_hash, record, now) for key, row_hash, record in upserts]
+            )
+            self.conn.executemany(
+                'DELETE FROM medicine_records WHERE record_key = ?', [(key,) for key in removed_keys]
+            )
@@ -78,6 +78,639 @@ def test_scraper():
         print(f"❌ スクレイピングテスト失敗: {e}")
         return False
 
+# 抽出テスト用のニュース一覧ページ（一覧・見出し・重複リンク・対象外リンクを含む）
+LISTING_PAGE = b"""<html><body>
+<div class="view-content">
+  <div class="views-row"><a href="/en/news/ema-recommends-approval-new-treatment">EMA recommends approval of new treatment for lupus</a>
+    <span>25 July 2025</span><p>The CHMP adopted a positive opinion.</p></div>
+  <div class="views-row"><a href="/en/news/safety-update-july">Safety update for July medicines</a><span>2025-07-20</span></div>
+  <div class="views-row"><a href="/en/about-us">About us page link</a></div>
+</div>
+<h3>Committee meeting</h3><p>Highlights of the meeting.</p>
+<a href="/en/news/chmp-meeting-highlights-july-2025/">Meeting highlights from the CHMP July 2025</a>
+<h3><a href="https://www.ema.europa.eu/en/news/safety-update-july#top">Safety update for July medicines</a></h3>
+<a href="/en/news/short">Short</a>
+</body></html>"""
+
+def test_parser_backends():
+    """lxmlとBeautifulSoupのバックエンドで同じ項目を抽出するかのテスト（オフライン）"""
+    print("\n=== パーサーバックエンドテスト ===")
+    
+    try:
+        from html_parsers import PARSER_BACKENDS, get_parser_backend, parse_document
+        from scraper import EMAScraper
+        
+        results = {}
+        for name in PARSER_BACKENDS:
+            scraper = EMAScraper(cache_file=None, parser=name, feed_url=None)
+            parser, doc = parse_document(scraper.parser, LISTING_PAGE)
+            results[name] = scraper._extract_news_items(doc, parser)
+        
+        if get_parser_backend('lxml').name != 'lxml':
+            print("⚠️ lxmlが無いため比較を省略しました")
+        elif results['lxml'] != results['bs4']:
+            print(f"❌ バックエンドごとに抽出結果が異なります: {results}")
+            return False
+        if len(results['bs4']) != 3:
+            print(f"❌ 抽出件数が不正: {len(results['bs4'])}件")
+            return False
+        
+        print(f"✅ パーサーバックエンド: 正常 ({len(results['bs4'])}件)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ パーサーバックエンドテスト失敗: {e}")
+        return False
+
+def test_single_pass_extraction():
+    """ニュース項目の抽出が文書を1回だけ走査し、重複なく項目を返すかのテスト（オフライン）"""
+    print("\n=== 1回走査での抽出テスト ===")
+    
+    try:
+        from html_parsers import parse_document
+        from scraper import EMAScraper
+        
+        class CountingParser:
+            """要素の走査回数を数えるパーサーバックエンドのラッパー"""
+            def __init__(self, parser):
+                self.parser = parser
+                self.scans = 0
+            def iter_elements(self, doc, tags):
+                self.scans += 1
+                return self.parser.iter_elements(doc, tags)
+            def __getattr__(self, name):
+                return getattr(self.parser, name)
+        
+        scraper = EMAScraper(cache_file=None, feed_url=None)
+        parser, doc = parse_document(scraper.parser, LISTING_PAGE)
+        counting = CountingParser(parser)
+        items = scraper._extract_news_items(doc, counting)
+        
+        if counting.scans != 1:
+            print(f"❌ 文書を{counting.scans}回走査しました")
+            return False
+        # 一覧の項目・見出しの項目の順で、フラグメント付きの重複リンクや対象外のリンクは含まないこと
+        expected = [
+            ('EMA recommends approval of new treatment for lupus',
+             'https://www.ema.europa.eu/en/news/ema-recommends-approval-new-treatment', True),
+            ('Safety update for July medicines', 'https://www.ema.europa.eu/en/news/safety-update-july', False),
+            ('Committee meeting', 'https://www.ema.europa.eu/en/news/chmp-meeting-highlights-july-2025/', False),
+        ]
+        found = [(item['title'], item['link'], item['is_approval_related']) for item in items]
+        if found != expected:
+            print(f"❌ 抽出結果が不正: {found}")
+            return False
+        if items[0]['date'] != '25 July 2025' or items[2]['description'] != 'Highlights of the meeting....':
+            print(f"❌ 日付・説明文の抽出が不正: {items[0]['date']} / {items[2]['description']}")
+            return False
+        
+        print(f"✅ 1回走査での抽出: 正常 ({len(items)}件)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 1回走査での抽出テスト失敗: {e}")
+        return False
+
+def test_stable_fingerprints():
+    """識別子がプロセスをまたいで変わらないかのテスト（オフライン）"""
+    print("\n=== 識別子の安定性テスト ===")
+    
+    try:
+        import subprocess
+        import tempfile
+        from fingerprint import FingerprintSet, item_fingerprint
+        
+        item = {'title': '  EMA recommends  approval ', 'link': 'HTTPS://www.EMA.europa.eu/en/news/item/#top'}
+        expected = item_fingerprint(item)
+        
+        # ハッシュのソルトが異なる別プロセスでも同じ識別子になること
+        code = ("from fingerprint import item_fingerprint; "
+                f"print(item_fingerprint({item!r}))")
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for seed in ('1', '2'):
+            env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=package_dir)
+            output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True,
+                                    text=True, check=True).stdout.strip()
+            if output != expected:
+                print(f"❌ PYTHONHASHSEED={seed} のプロセスで識別子が異なります: {output} != {expected}")
+                return False
+        
+        # 正規化後に同じURL・タイトルなら同じ識別子になること
+        if item_fingerprint({'title': 'EMA recommends approval',
+                             'link': 'https://www.ema.europa.eu/en/news/item'}) != expected:
+            print("❌ 正規化後に同じ項目の識別子が異なります")
+            return False
+        
+        # 保存した識別子を次回の実行で読み込めること
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'seen.bin')
+            seen = FingerprintSet(file_path)
+            seen.filter_new([item])
+            seen.save()
+            if FingerprintSet(file_path).filter_new([item], mark=False):
+                print("❌ 保存した識別子を読み込めません")
+                return False
+        
+        print(f"✅ 識別子の安定性: 正常 ({expected})")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 識別子の安定性テスト失敗: {e}")
+        return False
+
+def test_incremental_crawl():
+    """ニュース一覧の差分クロールのテスト（オフライン）"""
+    print("\n=== 差分クロールテスト ===")
+    
+    try:
+        from fingerprint import FingerprintSet
+        from scraper import EMAScraper
+        
+        class ListingScraper(EMAScraper):
+            """ページ取得をメモリ上の一覧に置き換えたスクレイパー"""
+            def __init__(self, newest, total=40, per_page=10):
+                super().__init__(cache_file=None)
+                self.items = [{
+                    'title': f"News {n}",
+                    'link': f"https://www.ema.europa.eu/en/news/item-{n}",
+                    'is_approval_related': False
+                } for n in range(newest, newest - total, -1)]
+                self.per_page = per_page
+                self.fetched_pages = []
+            
+            def _fetch_listing_items(self, page):
+                self.fetched_pages.append(page)
+                start = page * self.per_page
+                return False, self.items[start:start + self.per_page] or None
+        
+        seen = FingerprintSet()
+        first = ListingScraper(newest=100).crawl_news(seen, max_pages=10)
+        
+        # 前回から15件増えた場合は2ページ目の途中で止まること
+        scraper = ListingScraper(newest=115)
+        new_items = scraper.crawl_news(seen, max_pages=10)
+        if [item['title'] for item in new_items] != [f"News {n}" for n in range(115, 100, -1)]:
+            print(f"❌ 新着項目が不正: {len(new_items)}件")
+            return False
+        if scraper.fetched_pages != [0, 1]:
+            print(f"❌ 不要なページを取得しました: {scraper.fetched_pages}")
+            return False
+        
+        # 変化がなければ先頭ページだけで終わること
+        scraper = ListingScraper(newest=115)
+        if scraper.crawl_news(seen) or scraper.fetched_pages != [0]:
+            print(f"❌ 変化がないのに新着を返しました: {scraper.fetched_pages}")
+            return False
+        
+        print(f"✅ 差分クロール: 正常 (初回{len(first)}件, 新着{len(new_items)}件)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 差分クロールテスト失敗: {e}")
+        return False
+
+def test_feed_parsing():
+    """RSS/Atomフィード解析のテスト（オフライン）"""
+    print("\n=== フィード解析テスト ===")
+    
+    try:
+        import io
+        from feeds import iter_feed_entries
+        
+        rss = b"""<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>EMA</title>
+<item><title>New medicine recommended for approval</title>
+<link>https://www.ema.europa.eu/en/news/new-medicine</link>
+<pubDate>Fri, 25 Jul 2025 12:00:00 +0200</pubDate>
+<description>&lt;p&gt;CHMP recommends granting a marketing authorisation&lt;/p&gt;</description></item>
+</channel></rss>"""
+        atom = b"""<feed xmlns="http://www.w3.org/2005/Atom"><title>EMA</title>
+<entry><title>Meeting highlights from the CHMP</title>
+<link rel="alternate" href="https://www.ema.europa.eu/en/news/highlights"/>
+<updated>2025-07-25T10:00:00Z</updated><summary>Highlights</summary></entry></feed>"""
+        
+        (rss_item, _), = iter_feed_entries(io.BytesIO(rss))
+        (atom_item, published), = iter_feed_entries(io.BytesIO(atom))
+        
+        expected_keys = {'id', 'title', 'link', 'date', 'description', 'is_approval_related'}
+        for item in (rss_item, atom_item):
+            if set(item) != expected_keys:
+                print(f"❌ 項目の形式が不正: {sorted(item)}")
+                return False
+        if rss_item['date'] != '25 July 2025' or '<p>' in rss_item['description']:
+            print(f"❌ RSS項目の変換が不正: {rss_item}")
+            return False
+        if not rss_item['is_approval_related'] or atom_item['link'] != 'https://www.ema.europa.eu/en/news/highlights':
+            print(f"❌ フィード項目の判定が不正: {rss_item}, {atom_item}")
+            return False
+        if published.year != 2025:
+            print(f"❌ Atomの日付が不正: {published}")
+            return False
+        
+        print("✅ フィード解析: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ フィード解析テスト失敗: {e}")
+        return False
+
+def test_chmp_highlights():
+    """CHMPハイライトの構造化解析と会議ごとのキャッシュのテスト（オフライン）"""
+    print("\n=== CHMPハイライト解析テスト ===")
+    
+    try:
+        from chmp import CHMPHighlights, HighlightsCache
+        
+        page = b"""<html><body><main>
+<h1>Meeting highlights from the CHMP 22-25 July 2024</h1>
+<h2>New medicines recommended for approval</h2>
+<p>The committee recommended granting a marketing authorisation for <a href="/x">Ebglyss</a> (lebrikizumab),
+for the treatment of atopic dermatitis. The CHMP recommended granting a conditional marketing authorisation
+for Durveqtix (fidanacogene elaparvovec), a gene therapy to treat haemophilia B.</p>
+<p>The committee adopted positive opinions for the following generic medicines:</p>
+<ul><li>Dasatinib Accord (dasatinib), for the treatment of chronic myeloid leukaemia.</li></ul>
+<h2>Negative opinion on a new medicine</h2>
+<p>The committee recommended the refusal of a marketing authorisation for Mysimba (naltrexone / bupropion).</p>
+<h2>Other updates</h2><p>Start of review of Xyz (abcmab).</p>
+</main></body></html>"""
+        
+        class FakeResponse:
+            status_code = 200
+            content = page
+        
+        class FakeSession:
+            def __init__(self):
+                self.calls = 0
+            def get(self, url, **kwargs):
+                self.calls += 1
+                return FakeResponse()
+        
+        session = FakeSession()
+        highlights = CHMPHighlights(session, cache=HighlightsCache(file_path=None))
+        urls = [f'https://www.ema.europa.eu/en/news/meeting-highlights-chmp-{month}-2024' for month in ('june', 'july')]
+        records = highlights.fetch_records(urls)
+        # 2回目は解析済みの会議を再利用し、ページを取得しないこと
+        highlights.fetch_records(urls)
+        
+        found = [(r['opinion_type'], r['name'], r['inn']) for r in records if r['url'] == urls[1]]
+        expected = [
+            ('positive', 'Ebglyss', 'lebrikizumab'),
+            ('conditional', 'Durveqtix', 'fidanacogene elaparvovec'),
+            ('generic', 'Dasatinib Accord', 'dasatinib'),
+            ('negative', 'Mysimba', 'naltrexone / bupropion'),
+        ]
+        if found != expected:
+            print(f"❌ 記録の抽出が不正: {found}")
+            return False
+        if records[0]['indication'] != 'atopic dermatitis' or records[0]['meeting'] != '2024-07':
+            print(f"❌ 適応・会議の抽出が不正: {records[0]}")
+            return False
+        if session.calls != 2:
+            print(f"❌ 解析済みの会議を取得し直しました ({session.calls}回)")
+            return False
+        
+        print(f"✅ CHMPハイライト解析: 正常 ({len(found)}件/会議)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ CHMPハイライト解析テスト失敗: {e}")
+        return False
+
+def test_parse_pool():
+    """プロセスプールによる一覧ページの一括解析のテスト（オフライン）"""
+    print("\n=== プロセスプール解析テスト ===")
+    
+    try:
+        from html_parsers import get_parser_backend
+        from parse_pool import ParsePool, make_batches
+        from scraper import parse_listing_page
+        
+        pages = []
+        for n in range(6):
+            page = (f'<html><body><main><div class="views-row"><h3><a href="/en/news/item-{n}">'
+                    f'News item {n}</a></h3></div></main></body></html>').encode('utf-8')
+            pages.append((f'page-{n}', page))
+        
+        # 小さなページはまとめて1回で送ること
+        if len(make_batches(pages, batch_bytes=1024 * 1024)) != 1:
+            print("❌ 小さなページがバッチにまとめられていません")
+            return False
+        
+        with ParsePool(max_workers=2) as pool:
+            results = pool.map('ema_news', pages)
+        
+        parser = get_parser_backend('lxml')
+        expected = [parse_listing_page(parser, content) for _, content in pages]
+        if results != expected:
+            print(f"❌ プロセスプールの解析結果が不正: {results}")
+            return False
+        
+        print(f"✅ プロセスプール解析: 正常 ({len(pages)}ページ)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ プロセスプール解析テスト失敗: {e}")
+        return False
+
+def test_keyword_classifier():
+    """キーワード分類のテスト（オフライン）"""
+    print("\n=== キーワード分類テスト ===")
+    
+    try:
+        from keyword_matcher import KEYWORD_CLASSIFIER
+        
+        text = "CHMP recommends marketing authorisation for Phase III cancer drug from Pfizer"
+        hits = KEYWORD_CLASSIFIER.classify(text)
+        
+        expected = {
+            'approval': 'marketing authorisation',
+            'clinical': 'phase iii',
+            'drug': 'cancer',
+            'company': 'pfizer'
+        }
+        for category, keyword in expected.items():
+            keywords = [kw for kw, _ in hits.get(category, [])]
+            if keyword not in keywords:
+                print(f"❌ {category}: '{keyword}' が検出されませんでした ({keywords})")
+                return False
+        
+        # 重なり合うキーワード（'authorisation' と 'marketing authorisation'）も両方検出されること
+        approval = [kw for kw, _ in hits['approval']]
+        if 'authorisation' not in approval:
+            print(f"❌ 重なり合うキーワードの検出に失敗: {approval}")
+            return False
+        
+        # Aho-Corasick（pyahocorasick）の有無で検出結果が変わらないこと（小文字化で長さが変わる文字を含む場合も）
+        import keyword_matcher
+        from keyword_matcher import KEYWORD_CATEGORIES, KeywordClassifier
+        text = "İstanbul site: Phase II/Phase III study, CHMP positive opinion; phase iii " + text
+        results = []
+        saved = keyword_matcher.ahocorasick
+        for module in {saved, None}:
+            keyword_matcher.ahocorasick = module
+            try:
+                classifier = KeywordClassifier(KEYWORD_CATEGORIES)
+                results.append((classifier.classify(text), classifier.keywords(text, 'clinical', 'approval')))
+            finally:
+                keyword_matcher.ahocorasick = saved
+        classified, keywords = results[0]
+        if any(result != results[0] for result in results) or keywords[:3] != ['phase i', 'phase ii', 'phase iii']:
+            print(f"❌ マッチャーのバックエンドで結果が異なります: {keywords}")
+            return False
+        if [position for keyword, position in classified['clinical'] if keyword == 'phase iii'][0] != text.find('Phase III'):
+            print(f"❌ 出現位置が不正: {classified['clinical']}")
+            return False
+        
+        print(f"✅ キーワード分類: 正常 ({len(hits)}カテゴリ, バックエンド{len(results)}種)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ キーワード分類テスト失敗: {e}")
+        return False
+
+def test_embed_batching():
+    """通知Embedのまとめ送信のテスト（オフライン）"""
+    print("\n=== 通知まとめ送信テスト ===")
+    
+    try:
+        from notifier import DiscordNotifier, MAX_EMBEDS_PER_MESSAGE, MAX_MESSAGE_CHARS, _embed_length
+        
+        sent = []
+        notifier = DiscordNotifier("http://127.0.0.1:9/unused")
+        notifier._send_webhook = lambda payload, max_retries=3: sent.append(payload) or True
+        
+        items = [{
+            'title': f"CHMP recommends approval of new medicine {i}",
+            'link': f"https://www.ema.europa.eu/en/news/item-{i}",
+            'description': "x" * (1500 if i >= 20 else 20),
+            'is_approval_related': True
+        } for i in range(25)]
+        results = notifier.send_approval_notifications(items)
+        
+        if len(results) != len(items) or not all(success for _, success in results):
+            print(f"❌ 項目ごとの結果が不正: {len(results)}件")
+            return False
+        for payload in sent:
+            # 6000文字の上限はEmbedの文字数だけで判定する（contentは含めない）
+            total = sum(_embed_length(e) for e in payload['embeds'])
+            if len(payload['embeds']) > MAX_EMBEDS_PER_MESSAGE or total > MAX_MESSAGE_CHARS:
+                print(f"❌ 上限を超えるメッセージ: {len(payload['embeds'])}件 / {total}文字")
+                return False
+        if len(sent) >= len(items):
+            print(f"❌ まとめ送信されていません: {len(sent)}回")
+            return False
+        
+        # 配信完了を待っている間も、他のスレッドから通知を追加できること
+        import threading
+        from concurrent.futures import Future
+        from notifier import EmbedBatcher
+        
+        pending = Future()
+        notifier._send_webhook = lambda payload, max_retries=3: pending
+        batcher = EmbedBatcher(notifier, max_delay=None)
+        batcher.add(items[0])
+        flusher = threading.Thread(target=batcher.flush)
+        flusher.start()
+        adder = threading.Thread(target=batcher.add, args=(items[1],))
+        adder.start()
+        adder.join(timeout=5)
+        blocked = adder.is_alive()
+        pending.set_result(True)
+        flusher.join(timeout=5)
+        adder.join(timeout=5)
+        if blocked or [item for item, _ in batcher.close()] != items[:2]:
+            print("❌ 配信完了の待機中に通知を追加できません")
+            return False
+        
+        print(f"✅ 通知まとめ送信: {len(items)}件を{len(sent)}回で送信")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 通知まとめ送信テスト失敗: {e}")
+        return False
+
+def test_transport():
+    """共有通信基盤の再試行・サーキットブレーカーのテスト（オフライン）"""
+    print("\n=== 通信基盤テスト ===")
+    
+    try:
+        import requests
+        from transport import CircuitOpenError, RetryPolicy, Transport
+        
+        class FakeResponse:
+            def __init__(self, status_code):
+                self.status_code = status_code
+                self.headers = {}
+            def close(self):
+                pass
+        
+        sleeps = []
+        transport = Transport(retry_policy=RetryPolicy(max_attempts=3), failure_threshold=2, sleep=sleeps.append)
+        url = 'https://www.ema.europa.eu/en/news'
+        
+        # 一時的な503は再試行して成功すること
+        statuses = iter([503, 200])
+        response = transport.execute('GET', url, lambda: FakeResponse(next(statuses)))
+        if response.status_code != 200 or len(sleeps) != 1:
+            print(f"❌ 再試行が不正: {response.status_code}, {sleeps}")
+            return False
+        
+        # POSTは再試行せず、連続した接続エラーでブレーカーが開くこと
+        def fail():
+            raise requests.exceptions.ConnectionError("connection refused")
+        for _ in range(2):
+            try:
+                transport.execute('POST', url, fail)
+            except CircuitOpenError:
+                print("❌ ブレーカーが早く開きました")
+                return False
+            except requests.exceptions.ConnectionError:
+                pass
+        try:
+            transport.execute('GET', url, lambda: FakeResponse(200))
+            print("❌ ブレーカーが開いていません")
+            return False
+        except CircuitOpenError:
+            pass
+        
+        print(f"✅ 通信基盤: 正常 (待機 {sleeps[0]:.2f}秒で再試行)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 通信基盤テスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_medicines_dataset():
+    """医薬品データセットの逐次解析・索引・差分検出のテスト（オフライン）"""
+    print("\n=== 医薬品データセットテスト ===")
+    
+    try:
+        import tempfile
+        import zipfile
+        from medicines import MedicinesIndex, diff_snapshot, iter_dataset_records
+        from state_store import StateStore
+        
+        ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+        shared = ['Category', 'Name of medicine', 'EMA product number', 'Medicine status',
+                  'International non-proprietary name (INN) / common name', 'Marketing authorisation holder',
+                  'Marketing authorisation date', 'Human', 'Authorised']
+        sheet = (f'<worksheet {ns}><sheetData>'
+                 '<row r="1"><c r="A1" t="inlineStr"><is><t>Medicines output</t></is></c></row>'
+                 '<row r="3">' + ''.join(f'<c r="{col}3" t="s"><v>{i}</v></c>' for i, col in enumerate('ABCDEFG')) + '</row>'
+                 '<row r="4"><c r="A4" t="s"><v>7</v></c><c r="B4" t="inlineStr"><is><t>Keytruda</t></is></c>'
+                 '<c r="C4" t="inlineStr"><is><t>EMEA/H/C/003820</t></is></c><c r="D4" t="s"><v>8</v></c>'
+                 '<c r="E4" t="inlineStr"><is><t>pembrolizumab</t></is></c>'
+                 '<c r="G4"><v>42205</v></c></row>'
+                 '</sheetData></worksheet>')
+        strings = f'<sst {ns}>' + ''.join(f'<si><t>{value}</t></si>' for value in shared) + '</sst>'
+        
+        with tempfile.TemporaryDirectory() as work_dir:
+            xlsx_path = os.path.join(work_dir, 'medicines.xlsx')
+            with zipfile.ZipFile(xlsx_path, 'w') as archive:
+                archive.writestr('xl/sharedStrings.xml', strings)
+                archive.writestr('xl/worksheets/sheet1.xml', sheet)
+            
+            (record,) = iter_dataset_records(xlsx_path)
+            if (record['name'] != 'Keytruda' or record['status'] != 'Authorised'
+                    or record['mah'] != '' or record['authorisation_date'] != '2015-07-20'):
+                print(f"❌ XLSXの解析が不正: {record}")
+                return False
+            
+            csv_path = os.path.join(work_dir, 'medicines.csv')
+            with open(csv_path, 'w', encoding='utf-8-sig') as f:
+                f.write('Category,Name of medicine,EMA product number,Medicine status,'
+                        'International non-proprietary name (INN) / common name\n'
+                        'Human,Keytruda,EMEA/H/C/003820,Authorised,pembrolizumab\n'
+                        'Human,Dovato,EMEA/H/C/004909,Opinion,dolutegravir / lamivudine\n')
+            store = StateStore(os.path.join(work_dir, 'state.db'))
+            try:
+                index = MedicinesIndex.from_records(iter_dataset_records(csv_path))
+                if [r['name'] for r in index.find_by_inn('Lamivudine')] != ['Dovato']:
+                    print("❌ INNの索引が不正")
+                    return False
+                if diff_snapshot(store, index) is not None:
+                    print("❌ 初回の取り込みで差分が返されました")
+                    return False
+                
+                # 2回目: ステータス変更1件・新規1件・削除1件
+                with open(csv_path, 'w', encoding='utf-8-sig') as f:
+                    f.write('Category,Name of medicine,EMA product number,Medicine status,'
+                            'International non-proprietary name (INN) / common name\n'
+                            'Human,Dovato,EMEA/H/C/004909,Authorised,dolutegravir / lamivudine\n'
+                            'Human,Newdrug,EMEA/H/C/009999,Authorised,newmab\n')
+                diff = diff_snapshot(store, MedicinesIndex.from_records(iter_dataset_records(csv_path)))
+                if sorted(r['name'] for r in diff.newly_authorised) != ['Dovato', 'Newdrug']:
+                    print(f"❌ 新規承認の検出が不正: {diff.summary()}")
+                    return False
+                if [r['name'] for r in diff.removed] != ['Keytruda'] or len(diff.status_changes) != 1:
+                    print(f"❌ 差分が不正: {diff.summary()}")
+                    return False
+            finally:
+                store.close()
+        
+        print(f"✅ 医薬品データセット: 正常 ({diff.summary()})")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 医薬品データセットテスト失敗: {e}")
+        return False
+
+def test_medicines_notify_failure():
+    """通知に失敗した差分が次回に再検出され、304後も検索できるかのテスト（オフライン）"""
+    print("\n=== 医薬品データセット通知失敗テスト ===")
+    
+    try:
+        import contextlib
+        import io
+        import tempfile
+        import medicines
+        from state_store import StateStore
+        
+        header = ('Category,Name of medicine,EMA product number,Medicine status,'
+                  'International non-proprietary name (INN) / common name\n')
+        with tempfile.TemporaryDirectory() as work_dir:
+            csv_path = os.path.join(work_dir, 'medicines.csv')
+            db_path = os.path.join(work_dir, 'state.db')
+            attempts = []
+            originals = (medicines.StateStore, medicines.send_notifications,
+                         medicines.MedicinesDataset.download, sys.argv)
+            medicines.StateStore = lambda: StateStore(db_path)
+            medicines.send_notifications = lambda items: attempts.append(len(items)) or len(attempts) > 1
+            try:
+                with open(csv_path, 'w', encoding='utf-8-sig') as f:
+                    f.write(header + 'Human,Keytruda,EMEA/H/C/003820,Authorised,pembrolizumab\n')
+                sys.argv = ['medicines.py', '--file', csv_path, '--notify']
+                medicines.main()
+                
+                with open(csv_path, 'a', encoding='utf-8') as f:
+                    f.write('Human,Dovato,EMEA/H/C/004909,Authorised,dolutegravir / lamivudine\n')
+                if medicines.main() or not medicines.main() or attempts != [1, 1]:
+                    print(f"❌ 通知に失敗した差分が再送されません: {attempts}")
+                    return False
+                
+                # 未変更（304）でも保存済みのスナップショットから検索できる
+                medicines.MedicinesDataset.download = lambda self, target_dir: None
+                sys.argv = ['medicines.py', '--cache-file', os.path.join(work_dir, 'cache.json'),
+                            '--inn', 'lamivudine']
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    found = medicines.main()
+                if not found or 'Dovato' not in output.getvalue():
+                    print(f"❌ 304後の検索結果が不正: {output.getvalue()!r}")
+                    return False
+            finally:
+                (medicines.StateStore, medicines.send_notifications,
+                 medicines.MedicinesDataset.download, sys.argv) = originals
+        
+        print("✅ 医薬品データセット通知失敗: 正常 (失敗した差分を再送・304後も検索可能)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 医薬品データセット通知失敗テスト失敗: {e}")
+        return False
+
 def test_notifier():
     """Discord通知機能のテスト"""
     print("\n=== Discord通知機能テスト ===")
@@ -179,6 +812,18 @@ def main():
     tests = [
         ("環境設定", test_environment),
         ("スクレイピング機能", test_scraper),
+        ("パーサーバックエンド", test_parser_backends),
+        ("1回走査での抽出", test_single_pass_extraction),
+        ("識別子の安定性", test_stable_fingerprints),
+        ("差分クロール", test_incremental_crawl),
+        ("フィード解析", test_feed_parsing),
+        ("CHMPハイライト解析", test_chmp_highlights),
+        ("プロセスプール解析", test_parse_pool),
+        ("キーワード分類", test_keyword_classifier),
+        ("通知まとめ送信", test_embed_batching),
+        ("通信基盤", test_transport),
+        ("医薬品データセット", test_medicines_dataset),
+        ("医薬品データセット通知失敗", test_medicines_notify_failure),
         ("Discord通知機能", test_notifier),
         ("完全ワークフロー", test_full_workflow)
     ]
@@ -75,6 +75,981 @@ def test_cbp501_scraper():
         traceback.print_exc()
         return False
 
+def test_concurrent_fetch_order():
+    """並列取得でも監視ページの順序で結果を返すかのテスト（オフライン）"""
+    print("\n=== 並列取得の順序テスト ===")
+    
+    try:
+        import threading
+        import time
+        from cbp501_scraper import CBP501Scraper
+        from watchlist import DEFAULT_WATCH_RULES, Watchlist
+        
+        page = b"""<html><head><title>EMA news</title><meta name="description" content="Latest news"></head>
+<body><p>CBP501 enters Phase III</p></body></html>"""
+        urls = [f'https://www.ema.europa.eu/en/page-{n}' for n in range(4)]
+        
+        class FakeResponse:
+            headers = {}
+            status_code = 200
+            def __init__(self, url):
+                self.url = url
+                self.content = page
+            def raise_for_status(self):
+                pass
+            def iter_content(self, chunk_size):
+                yield self.content
+            def close(self):
+                pass
+        
+        class FakeSession:
+            def __init__(self):
+                self.active = 0
+                self.max_active = 0
+                self.lock = threading.Lock()
+            def get(self, url, **kwargs):
+                with self.lock:
+                    self.active += 1
+                    self.max_active = max(self.max_active, self.active)
+                # 先頭のページほど応答を遅らせ、完了順を監視ページの順序と逆にする
+                time.sleep(0.05 * (len(urls) - urls.index(url)))
+                with self.lock:
+                    self.active -= 1
+                return FakeResponse(url)
+        
+        session = FakeSession()
+        scraper = CBP501Scraper(cache_file=None, max_workers=4, max_per_host=4, enrich=False,
+                                watchlist=Watchlist.from_config({'compounds': DEFAULT_WATCH_RULES}))
+        scraper.base_urls = urls
+        scraper.session = session
+        _, items = scraper.search_cbp501_phase3()
+        
+        if [item['source'] for item in items] != urls:
+            print(f"❌ 結果が監視ページの順序になっていません: {[item['source'] for item in items]}")
+            return False
+        if session.max_active < 2:
+            print("❌ ページが並列に取得されていません")
+            return False
+        
+        print(f"✅ 並列取得の順序: 正常 (最大同時接続 {session.max_active})")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 並列取得の順序テスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_http_cache():
+    """条件付きGETキャッシュのテスト（オフライン）"""
+    print("\n=== HTTP検証子キャッシュテスト ===")
+    
+    try:
+        import tempfile
+        from http_cache import HTTPValidatorCache
+        
+        class FakeResponse:
+            def __init__(self, headers):
+                self.headers = headers
+        
+        url = 'https://www.ema.europa.eu/en/news'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_file = os.path.join(tmp_dir, 'http_cache.json')
+            cache = HTTPValidatorCache(cache_file)
+            
+            if cache.conditional_headers(url):
+                print("❌ 未保存URLに条件付きヘッダーが付与されました")
+                return False
+            
+            cache.store(url, FakeResponse({'ETag': '"abc"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}), [])
+            cache.save()
+            
+            # 再読み込みしても検証子と結果が残っていること
+            reloaded = HTTPValidatorCache(cache_file)
+            headers = reloaded.conditional_headers(url)
+            if headers.get('If-None-Match') != '"abc"' or reloaded.get_result(url) != []:
+                print(f"❌ キャッシュの復元に失敗: {headers}")
+                return False
+        
+        print("✅ HTTP検証子キャッシュ: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ HTTP検証子キャッシュテスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_detail_confirmation():
+    """記事ページでの確認のテスト（確認の成否で通知済みの判定が変わらないこと、オフライン）"""
+    print("\n=== 記事ページ確認テスト ===")
+    
+    try:
+        import tempfile
+        from cbp501_scraper import CBP501Scraper
+        from enrichment import DetailEnricher, DetailPageCache
+        from fingerprint import item_fingerprint
+        from http_cache import HTTPValidatorCache
+        from watchlist import DEFAULT_WATCH_RULES, Watchlist
+        
+        listing = b"""<html><head><title>EMA news</title><meta name="description" content="Latest news"></head>
+<body><p><a href="/en/news/cbp501-phase-iii">CBP501 enters Phase III</a></p></body></html>"""
+        article = b"<html><body><main><p>The CBP501 Phase III trial has started.</p></main></body></html>"
+        article_url = 'https://www.ema.europa.eu/en/news/cbp501-phase-iii'
+        
+        class FakeResponse:
+            def __init__(self, url, status_code, content):
+                self.url = url
+                self.status_code = status_code
+                self.content = content
+                self.headers = {'ETag': '"v1"'}
+            def raise_for_status(self):
+                pass
+            def iter_content(self, chunk_size):
+                yield self.content
+            def close(self):
+                pass
+        
+        class FakeSession:
+            def __init__(self, article_status):
+                self.article_status = article_status
+            def get(self, url, **kwargs):
+                if url == article_url:
+                    return FakeResponse(url, self.article_status, article)
+                return FakeResponse(url, 200, listing)
+        
+        def search(article_status, cache_file=None):
+            session = FakeSession(article_status)
+            scraper = CBP501Scraper(cache_file=cache_file,
+                                    watchlist=Watchlist.from_config({'compounds': DEFAULT_WATCH_RULES}))
+            scraper.session = session
+            scraper.enricher = DetailEnricher(session, cache=DetailPageCache(cache_dir=None))
+            return scraper.search_cbp501_phase3()[1]
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_file = os.path.join(tmp_dir, 'http_cache.json')
+            confirmed = search(200, cache_file)
+            unconfirmed = search(503)
+            
+            if [item['confidence'] for item in confirmed] != ['high', 'high'] or \
+                    [item['confidence'] for item in unconfirmed] != ['medium', 'medium']:
+                print("❌ 記事ページでの確認結果が不正")
+                return False
+            if confirmed[0].get('detail_url') != article_url or confirmed[0]['url'] != confirmed[0]['source']:
+                print(f"❌ 記事ページのURLの記録が不正: {confirmed[0].get('detail_url')}")
+                return False
+            
+            # 記事ページを取得できたかどうかで識別子が変わらず、監視ページごとに別の項目として扱われること
+            fingerprints = [item_fingerprint(item) for item in confirmed]
+            if fingerprints != [item_fingerprint(item) for item in unconfirmed] or len(set(fingerprints)) != 2:
+                print("❌ 記事ページの確認の成否で識別子が変わりました")
+                return False
+            
+            # 未変更ページで再利用する前回結果には記事ページで確認した情報も含まれること
+            cached = HTTPValidatorCache(cache_file).get_result(confirmed[0]['source'])
+            if not cached or cached[0].get('detail_url') != article_url:
+                print(f"❌ キャッシュに記事ページでの確認結果が保存されていません: {cached}")
+                return False
+        
+        print("✅ 記事ページ確認: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 記事ページ確認テスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_state_store():
+    """状態ストアのテスト（オフライン）"""
+    print("\n=== 状態ストアテスト ===")
+    
+    try:
+        import tempfile
+        from state_store import StateStore
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # 旧バージョンのテキストファイルを用意
+            with open(os.path.join(tmp_dir, 'execution_counter.txt'), 'w', encoding='utf-8') as f:
+                f.write('41')
+            
+            store = StateStore(os.path.join(tmp_dir, 'monitor_state.db'))
+            store.migrate_text_files(tmp_dir)
+            if store.increment('execution_count') != 42:
+                print("❌ 実行回数の移行に失敗")
+                return False
+            
+            item = {'title': 'CBP501 Phase III', 'url': 'https://www.ema.europa.eu/en/news/cbp501'}
+            if store.filter_unseen([item]) != [item]:
+                print("❌ 未確認項目の判定に失敗")
+                return False
+            store.mark_seen([item])
+            if store.filter_unseen([item]):
+                print("❌ 確認済み項目が再度未確認と判定されました")
+                return False
+            
+            if store.record_status('cbp501', '発見', default='未発見') != '未発見':
+                print("❌ ステータス遷移の記録に失敗")
+                return False
+            store.close()
+        
+        print("✅ 状態ストア: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 状態ストアテスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_daemon_checkpoint():
+    """常駐モードの状態がチェックポイントでディスクに書き出されるかのテスト（オフライン）"""
+    print("\n=== 常駐モードのチェックポイントテスト ===")
+    
+    try:
+        import argparse
+        import json
+        import signal
+        import tempfile
+        from types import SimpleNamespace
+        import main
+        from main import run_daemon
+        from state_store import StateStore
+        from watchlist import DEFAULT_WATCH_RULES, Watchlist, load_watchlist
+        
+        item = {
+            'source': 'https://www.ema.europa.eu/en/news',
+            'title': 'CBP501 Phase III',
+            'content': 'CBP501 enters Phase III',
+            'url': 'https://www.ema.europa.eu/en/news',
+            'compound': 'CBP501',
+            'confidence': 'high',
+            'phase3_keywords': ['Phase III']
+        }
+        
+        class FakeScraper:
+            watchlist = Watchlist.from_config({'compounds': DEFAULT_WATCH_RULES})
+            last_page_diffs = {}
+            def __init__(self):
+                self.checks = 0
+                self.rule_counts = []
+            def search_watchlist(self):
+                self.checks += 1
+                self.rule_counts.append(len(self.watchlist.rules))
+                if self.checks == 1:
+                    # 1回目のチェック後に監視対象リストを変更すると、次のチェックから反映されること
+                    with open(main.WATCHLIST_FILE, 'w', encoding='utf-8') as f:
+                        json.dump({'compounds': DEFAULT_WATCH_RULES + [{'name': 'ABC123'}]}, f)
+                if self.checks == 2:
+                    # 2回目のチェック中に停止シグナルを受けても、そのチェックを終えてから終了すること
+                    os.kill(os.getpid(), signal.SIGTERM)
+                return {'CBP501': [dict(item)]}
+            def reload_watchlist(self, file_path):
+                self.watchlist = load_watchlist(file_path)
+            def host_health(self):
+                return SimpleNamespace(error_rate=0.0, latency=0.1), 'closed'
+        
+        class FakeNotifier:
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: True
+        
+        args = argparse.Namespace(interval=0.001, jitter=0.0, max_interval=0.002, checkpoint_interval=0,
+                                  metrics_file=None, metrics_port=0)
+        handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)}
+        watchlist_file = main.WATCHLIST_FILE
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'monitor_state.db')
+            store = StateStore(db_path, in_memory=True)
+            scraper = FakeScraper()
+            main.WATCHLIST_FILE = os.path.join(tmp_dir, 'watchlist.json')
+            try:
+                run_daemon(scraper, FakeNotifier(), store, args)
+            finally:
+                main.WATCHLIST_FILE = watchlist_file
+                for signum, handler in handlers.items():
+                    signal.signal(signum, handler)
+            
+            if scraper.rule_counts != [1, 2]:
+                print(f"❌ 監視対象リストの変更が常駐モードに反映されません: {scraper.rule_counts}")
+                return False
+            
+            # メモリ上のストアを閉じる前に、ディスク上の状態に2回分のチェックが反映されていること
+            disk = StateStore(db_path)
+            execution_count, seen_count = disk.get_value('execution_count'), disk.count_seen()
+            disk.close()
+            store.close()
+            if scraper.checks != 2 or execution_count != '2' or seen_count != 1:
+                print(f"❌ チェックポイントの内容が不正: {scraper.checks}回, 実行回数 {execution_count}, 通知済み {seen_count}件")
+                return False
+            
+            # 再起動後もメモリ上のストアに前回の状態が読み込まれること
+            restarted = StateStore(db_path, in_memory=True)
+            if restarted.get_value('execution_count') != '2' or restarted.count_seen() != 1:
+                print("❌ 再起動後に状態を復元できません")
+                return False
+            restarted.close()
+        
+        print("✅ 常駐モードのチェックポイント: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 常駐モードのチェックポイントテスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_metrics():
+    """メトリクス出力のテスト（オフライン）"""
+    print("\n=== メトリクス出力テスト ===")
+    
+    try:
+        from metrics import MetricsRegistry
+        
+        registry = MetricsRegistry()
+        fetches = registry.counter('test_fetch_total', '取得回数', ('url',))
+        latency = registry.histogram('test_latency_seconds', '所要時間', buckets=(0.1, 1.0))
+        
+        fetches.inc(url='https://example.com/"a"')
+        fetches.inc(2, url='https://example.com/"a"')
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5)
+        
+        text = registry.render()
+        expected = [
+            '# TYPE test_fetch_total counter',
+            'test_fetch_total{url="https://example.com/\\"a\\""} 3',
+            'test_latency_seconds_bucket{le="0.1"} 1',
+            'test_latency_seconds_bucket{le="1.0"} 2',
+            'test_latency_seconds_bucket{le="+Inf"} 3',
+            'test_latency_seconds_count 3',
+        ]
+        for line in expected:
+            if line not in text.splitlines():
+                print(f"❌ 出力に '{line}' がありません")
+                print(text)
+                return False
+        
+        print("✅ メトリクス出力: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ メトリクス出力テスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_watchlist():
+    """監視対象リストのテスト（オフライン）"""
+    print("\n=== 監視対象リストテスト ===")
+    
+    try:
+        from watchlist import Watchlist
+        
+        watchlist = Watchlist.from_config({'compounds': [
+            {'name': 'CBP501', 'aliases': ['CBP-501'], 'phases': ['Phase III', 'Phase 3']},
+            {'name': 'Pembrolizumab', 'aliases': ['Keytruda'], 'phases': ['Phase III']},
+            {'name': 'Nivolumab', 'aliases': ['Opdivo']},
+        ]})
+        
+        body = b"<p>CBP-501 enters Phase 3</p><p>Opdivo update</p><p>Keytruda Phase II</p>"
+        matches = {m.rule.name: m.keywords for m in watchlist.evaluate(watchlist.search(body))}
+        expected = {'CBP501': ['CBP-501', 'Phase 3'], 'Nivolumab': ['Opdivo']}
+        if matches != expected:
+            print(f"❌ 判定結果が不正: {matches}")
+            return False
+        
+        # 確認関数で否定された出現は一致として扱わないこと
+        rejected = watchlist.evaluate(watchlist.search(body), lambda pattern, position: pattern != b'Opdivo')
+        if 'Nivolumab' in {m.rule.name for m in rejected}:
+            print("❌ 確認できなかった一致が残りました")
+            return False
+        
+        print(f"✅ 監視対象リスト: 正常 ({len(watchlist.rules)}件を1回の走査で判定)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 監視対象リストテスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_split_markup_detection():
+    """タグや文字参照で分断された表記をストリーム検出で見逃さないかのテスト（オフライン）"""
+    print("\n=== 分断された表記の検出テスト ===")
+    
+    try:
+        from cbp501_scraper import CBP501Scraper
+        from watchlist import DEFAULT_WATCH_RULES, Watchlist
+        
+        head = b'<html><head><title>EMA news</title><meta name="description" content="Latest news"></head>'
+        pages = {
+            'alias': head + b'<body><p>CBP<span>501</span> enters Phase III</p></body></html>',
+            'phase': head + b'<body><p>CBP501 enters Phase&nbsp;III</p></body></html>',
+            'other': head + b'<body><p>Another compound enters Phase III</p></body></html>',
+            'attribute': head + b'<body><p><a href="/en/cbp501">Another compound</a> enters Phase III</p></body></html>',
+        }
+        
+        class FakeResponse:
+            headers = {}
+            status_code = 200
+            def __init__(self, url, content):
+                self.url = url
+                self.content = content
+            def raise_for_status(self):
+                pass
+            def iter_content(self, chunk_size):
+                yield self.content
+            def close(self):
+                pass
+        
+        class FakeSession:
+            def __init__(self, content):
+                self.content = content
+            def get(self, url, **kwargs):
+                return FakeResponse(url, self.content)
+        
+        found = {}
+        full_scans = set()
+        for name, page in pages.items():
+            for streaming in (True, False):
+                scraper = CBP501Scraper(cache_file=None, streaming=streaming, enrich=False,
+                                        watchlist=Watchlist.from_config({'compounds': DEFAULT_WATCH_RULES}))
+                scraper.base_urls = scraper.base_urls[:1]
+                scraper.session = FakeSession(page)
+                if streaming:
+                    scan_document = scraper._scan_document
+                    def counting_scan(url, response, body, name=name, scan_document=scan_document):
+                        full_scans.add(name)
+                        return scan_document(url, response, body)
+                    scraper._scan_document = counting_scan
+                found[name, streaming] = len(scraper.search_watchlist()['CBP501'])
+        
+        expected = {(name, streaming): 1 if name in ('alias', 'phase') else 0 for name, streaming in found}
+        if found != expected:
+            print(f"❌ 分断された表記の検出結果が不正: {found}")
+            return False
+        # 治験段階だけ・タグ属性の別名だけのページでは、ページ全体のDOMを構築しない
+        if full_scans != {'alias', 'phase'}:
+            print(f"❌ ページ全体の走査に切り替えたページが不正: {sorted(full_scans)}")
+            return False
+        
+        print("✅ 分断された表記の検出: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 分断された表記の検出テスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_case_insensitive_links():
+    """大文字小文字を無視する監視対象で記事ページ候補を拾えるかのテスト（オフライン）"""
+    print("\n=== 大文字小文字を無視した記事ページ候補テスト ===")
+    
+    try:
+        from cbp501_scraper import CBP501Scraper
+        from watchlist import Watchlist
+        
+        # 2つ目のルールの別名は1つ目の名前と表記だけが異なり、ページ上ではさらに別の表記で現れる
+        watchlist = Watchlist.from_config({
+            'ignore_case': True,
+            'compounds': [
+                {'name': 'ABC123'},
+                {'name': 'Partner program', 'aliases': ['abc123']},
+            ]
+        })
+        page = b"""<html><head><title>EMA news</title><meta name="description" content="Latest news"></head>
+<body><p><a href="/en/news/abc123-update">Abc123 update</a></p></body></html>"""
+        article_url = 'https://www.ema.europa.eu/en/news/abc123-update'
+        
+        class FakeResponse:
+            headers = {}
+            status_code = 200
+            def __init__(self, url):
+                self.url = url
+                self.content = page
+            def raise_for_status(self):
+                pass
+            def iter_content(self, chunk_size):
+                yield self.content
+            def close(self):
+                pass
+        
+        class FakeSession:
+            def get(self, url, **kwargs):
+                return FakeResponse(url)
+        
+        for streaming in (True, False):
+            scraper = CBP501Scraper(cache_file=None, streaming=streaming, enrich=False, watchlist=watchlist)
+            scraper.base_urls = scraper.base_urls[:1]
+            scraper.session = FakeSession()
+            results = scraper.search_watchlist()
+            links = {name: [item['candidate_links'] for item in items] for name, items in results.items()}
+            if links != {'ABC123': [[article_url]], 'Partner program': [[article_url]]}:
+                print(f"❌ 記事ページ候補が不正 (streaming={streaming}): {links}")
+                return False
+        
+        print("✅ 大文字小文字を無視した記事ページ候補: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 大文字小文字を無視した記事ページ候補テスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_page_snapshots():
+    """ページスナップショットの差分検出テスト（オフライン）"""
+    print("\n=== ページスナップショットテスト ===")
+    
+    try:
+        import tempfile
+        from snapshots import SnapshotTracker
+        from state_store import StateStore
+        
+        url = 'https://www.ema.europa.eu/en/news'
+        old_page = b"<html><body><p>Meeting agenda</p><p>CBP501 Phase II results</p><script>var t = 1;</script></body></html>"
+        new_page = b"<html><body><p>Meeting agenda</p><p>CBP501 Phase III start</p><script>var t = 2;</script></body></html>"
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = StateStore(os.path.join(tmp_dir, 'monitor_state.db'))
+            tracker = SnapshotTracker(store)
+            
+            if tracker.update(url, old_page) is not None:
+                print("❌ 初回のスナップショットで差分が返されました")
+                return False
+            # スクリプトだけの変化は本文の変化として扱わないこと
+            if tracker.update(url, old_page.replace(b'var t = 1', b'var t = 9')) is not None:
+                print("❌ スクリプトの変化が差分として検出されました")
+                return False
+            
+            diff = tracker.update(url, new_page)
+            store.close()
+        
+        if diff is None or diff.added != ['CBP501 Phase III start'] or diff.removed != ['CBP501 Phase II results']:
+            print(f"❌ 差分が不正: {diff and (diff.added, diff.removed)}")
+            return False
+        if not 0.0 < diff.similarity < 1.0:
+            print(f"❌ 類似度が不正: {diff.similarity}")
+            return False
+        
+        print(f"✅ ページスナップショット: 正常 (類似度 {diff.similarity:.0%})")
+        return True
+        
+    except Exception as e:
+        print(f"❌ ページスナップショットテスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_news_index():
+    """全文索引のフレーズ・近接検索テスト（オフライン）"""
+    print("\n=== 全文索引テスト ===")
+    
+    try:
+        import tempfile
+        from news_index import NewsArchive, decode_positions, encode_positions
+        
+        if decode_positions(encode_positions([0, 5, 300, 70000])) != [0, 5, 300, 70000]:
+            print("❌ 位置の符号化が不正")
+            return False
+        
+        items = [
+            {'title': 'CBP501 enters Phase III', 'link': 'https://example.com/a',
+             'description': 'The pivotal phase III trial of CBP501 in pancreatic cancer has started.'},
+            {'title': 'Phase II results', 'link': 'https://example.com/b',
+             'description': 'CBP501 showed activity. A separate phase III study of another drug was announced.'},
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = NewsArchive(os.path.join(tmp_dir, 'news_index.db'))
+            try:
+                if archive.add_items(items, 'ema_news') != 2 or archive.add_items(items, 'ema_news') != 0:
+                    print("❌ 同じ項目が再度索引されました")
+                    return False
+                phrase = [hit.url for hit in archive.search('"phase III trial"')]
+                both = {hit.url for hit in archive.search('CBP501 "phase III"')}
+                near = [hit.url for hit in archive.search('CBP501 "phase III"', within=4)]
+                
+                # 本文が変わった項目は索引し直され、古い語では見つからなくなること
+                items[1]['description'] = 'Updated summary.'
+                archive.add_items(items[1:], 'ema_news')
+                updated = {hit.url for hit in archive.search('CBP501 "phase III"')}
+                
+                # 監視ページはURLごとに1文書で、版が変わると置き換わる（以前の版ごとの文書も削除される）
+                page_url = 'https://example.com/news'
+                archive.add_document(f"page:{page_url}#old", page_url, 'Legacy version', 'page', page_url)
+                before = archive.stats()
+                for version in ('Upcoming trial of CBP501', 'CBP501 phase III started', 'CBP501 phase III started'):
+                    archive.add_page(page_url, version.split(' of '))
+                after = archive.stats()
+                pages = [hit.url for hit in archive.search('CBP501', source='page')]
+                stale = archive.search('upcoming') + archive.search('legacy')
+            finally:
+                archive.close()
+        
+        if after['documents'] != before['documents'] or pages != [page_url] or stale:
+            print(f"❌ ページの版の置き換えが不正: {before} → {after}, {pages}, {len(stale)}件")
+            return False
+        
+        if phrase != ['https://example.com/a'] or both != {'https://example.com/a', 'https://example.com/b'}:
+            print(f"❌ フレーズ検索が不正: {phrase}, {both}")
+            return False
+        if near != ['https://example.com/a'] or updated != {'https://example.com/a'}:
+            print(f"❌ 近接検索・再索引が不正: {near}, {updated}")
+            return False
+        
+        print("✅ 全文索引: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 全文索引テスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_adaptive_scheduler():
+    """障害時のチェック間隔の伸縮テスト（オフライン）"""
+    print("\n=== チェック間隔の伸縮テスト ===")
+    
+    try:
+        from scheduler import AdaptiveScheduler
+        from transport import HostHealth
+        
+        scheduler = AdaptiveScheduler(300, 30, max_interval=1000)
+        health = HostHealth('www.ema.europa.eu')
+        health.observe(0.5, failed=True)
+        
+        intervals = [scheduler.adapt(health, 'open') for _ in range(3)]
+        if intervals != [600, 1000, 1000]:
+            print(f"❌ 障害時の間隔が不正: {intervals}")
+            return False
+        
+        for _ in range(10):
+            health.observe(0.5, failed=False)
+        if scheduler.adapt(health, 'closed') != 300:
+            print(f"❌ 復旧後に元の間隔に戻りません: {scheduler.interval}")
+            return False
+        
+        print("✅ チェック間隔の伸縮: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ チェック間隔の伸縮テスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_preflight():
+    """起動前チェック（条件付きHEAD）のテスト（ローカルサーバー）"""
+    print("\n=== 起動前チェックテスト ===")
+    
+    try:
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from preflight import pages_unchanged
+        
+        current = {'etag': '"v1"'}
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                if self.headers.get('If-None-Match') == current['etag']:
+                    self.send_response(304)
+                else:
+                    self.send_response(200)
+                    self.send_header('ETag', current['etag'])
+                self.end_headers()
+            
+            def log_message(self, format, *args):
+                pass
+        
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            base_url = f"http://127.0.0.1:{server.server_address[1]}"
+            urls = (f"{base_url}/en/news", f"{base_url}/en/events/upcoming-events")
+            entries = {url: {'etag': '"v1"', 'last_modified': None, 'result': []} for url in urls}
+            
+            if not pages_unchanged(entries, urls):
+                print("❌ 未変更のページが変更ありと判定されました")
+                return False
+            if pages_unchanged({urls[0]: entries[urls[0]]}, urls):
+                print("❌ 検証子の無いページがあるのに未変更と判定されました")
+                return False
+            current['etag'] = '"v2"'
+            if pages_unchanged(entries, urls):
+                print("❌ 変更されたページが未変更と判定されました")
+                return False
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        print("✅ 起動前チェック: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 起動前チェックテスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_preflight_after_notification():
+    """通知済みの項目しか無い場合に起動前チェックで終了するテスト（ローカルサーバー）"""
+    print("\n=== 通知後の起動前チェックテスト ===")
+    
+    try:
+        import tempfile
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from cbp501_scraper import CBP501Scraper
+        from enrichment import DetailEnricher, DetailPageCache
+        from main import run_check, run_preflight
+        from state_store import StateStore
+        from watchlist import DEFAULT_WATCH_RULES, Watchlist
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self.send_response(304 if self.headers.get('If-None-Match') == '"v1"' else 200)
+                self.send_header('ETag', '"v1"')
+                self.end_headers()
+            
+            def log_message(self, format, *args):
+                pass
+        
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        urls = (f"{base_url}/en/news", f"{base_url}/en/events/upcoming-events")
+        article_url = f"{base_url}/en/news/cbp501-phase-iii"
+        listing = b"""<html><head><title>EMA news</title><meta name="description" content="Latest news"></head>
+<body><p><a href="/en/news/cbp501-phase-iii">CBP501 enters Phase III</a></p></body></html>"""
+        article = b"<html><body><main><p>The CBP501 Phase III trial has started.</p></main></body></html>"
+        
+        class FakeResponse:
+            def __init__(self, url, content):
+                self.url = url
+                self.status_code = 200
+                self.content = content
+                self.headers = {'ETag': '"v1"'}
+            def raise_for_status(self):
+                pass
+            def iter_content(self, chunk_size):
+                yield self.content
+            def close(self):
+                pass
+        
+        class FakeSession:
+            def get(self, url, **kwargs):
+                return FakeResponse(url, article if url == article_url else listing)
+        
+        class FakeNotifier:
+            def __init__(self):
+                self.found = 0
+            def send_cbp501_found_notification(self, items):
+                self.found += 1
+                return True
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: True
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                cache_file = os.path.join(tmp_dir, 'http_cache.json')
+                store = StateStore(os.path.join(tmp_dir, 'monitor_state.db'))
+                scraper = CBP501Scraper(cache_file=cache_file,
+                                        watchlist=Watchlist.from_config({'compounds': DEFAULT_WATCH_RULES}))
+                scraper.base_urls = list(urls)
+                scraper.session = FakeSession()
+                scraper.enricher = DetailEnricher(scraper.session, cache=DetailPageCache(cache_dir=None))
+                notifier = FakeNotifier()
+                
+                # 記事ページで確認した項目を通知した後は、監視ページが未変更なら解析せずに終了すること
+                if run_check(scraper, notifier, store) != 'success' or notifier.found != 1:
+                    print(f"❌ 監視処理・発見通知が不正 ({notifier.found}回)")
+                    return False
+                if not run_preflight(store, cache_file, urls):
+                    print("❌ 通知済みの項目しか無いのに起動前チェックで終了しませんでした")
+                    return False
+                result = store.conn.execute('SELECT result FROM run_history ORDER BY id DESC LIMIT 1').fetchone()[0]
+                if result != 'unchanged':
+                    print(f"❌ 実行履歴の結果が不正: {result}")
+                    return False
+                store.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        print("✅ 通知後の起動前チェック: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 通知後の起動前チェックテスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_async_delivery():
+    """非同期配信で送信に成功した場合のみ通知済みにするテスト（オフライン）"""
+    print("\n=== 非同期配信テスト ===")
+    
+    try:
+        import tempfile
+        from cbp501_notifier import CBP501Notifier
+        from main import run_check
+        from state_store import StateStore
+        from watchlist import DEFAULT_WATCH_RULES, Watchlist
+        
+        item = {
+            'source': 'https://www.ema.europa.eu/en/news',
+            'title': 'CBP501 Phase III',
+            'content': 'CBP501 enters Phase III',
+            'url': 'https://www.ema.europa.eu/en/news',
+            'compound': 'CBP501',
+            'confidence': 'high',
+            'phase3_keywords': ['Phase III']
+        }
+        
+        class FakeScraper:
+            watchlist = Watchlist.from_config({'compounds': DEFAULT_WATCH_RULES})
+            last_page_diffs = {}
+            def search_watchlist(self):
+                return {'CBP501': [dict(item)]}
+        
+        class FakeResponse:
+            def __init__(self, status_code):
+                self.status_code = status_code
+                self.headers = {}
+                self.text = ''
+        
+        class FakeSession:
+            def __init__(self, status_code):
+                self.status_code = status_code
+            def post(self, url, **kwargs):
+                return FakeResponse(self.status_code)
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = StateStore(os.path.join(tmp_dir, 'monitor_state.db'))
+            for status_code, expected_seen in ((400, 0), (204, 1)):
+                notifier = CBP501Notifier('https://discord.invalid/webhook', async_delivery=True)
+                notifier.delivery_queue.session = FakeSession(status_code)
+                try:
+                    run_check(FakeScraper(), notifier, store)
+                finally:
+                    notifier.close()
+                # 配信が失敗した項目は通知済みにせず、次回のチェックで再通知すること
+                if store.count_seen() != expected_seen:
+                    print(f"❌ 配信結果 {status_code} で通知済みの件数が不正: {store.count_seen()}")
+                    return False
+            store.close()
+        
+        print("✅ 非同期配信: 正常")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 非同期配信テスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def test_outage_backoff():
+    """EMAサイトの障害中はチェックを失敗扱いにせず、待ち時間中の実行を省略するテスト（オフライン）"""
+    print("\n=== 障害中の待ち時間テスト ===")
+    
+    try:
+        import argparse
+        import tempfile
+        import time
+        from cbp501_scraper import SiteUnavailableError
+        from main import backoff_active, run_check, schedule_backoff
+        from state_store import StateStore
+        from transport import HostHealth
+        from watchlist import DEFAULT_WATCH_RULES, Watchlist
+        
+        class FakeScraper:
+            watchlist = Watchlist.from_config({'compounds': DEFAULT_WATCH_RULES})
+            last_page_diffs = {}
+            def __init__(self, error_rate, circuit_state):
+                self.health = HostHealth('www.ema.europa.eu')
+                self.health.error_rate = error_rate
+                self.circuit_state = circuit_state
+            def search_watchlist(self):
+                if self.circuit_state != 'closed':
+                    raise SiteUnavailableError("すべての監視ページの取得に失敗")
+                return {}
+            def probe(self):
+                return self.circuit_state == 'closed'
+            def host_health(self):
+                return self.health, self.circuit_state
+        
+        class FakeNotifier:
+            def __init__(self):
+                self.site_status = []
+            def send_site_status_notification(self, available, error=None):
+                self.site_status.append(available)
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: True
+        
+        args = argparse.Namespace(interval=5, max_interval=60)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = StateStore(os.path.join(tmp_dir, 'monitor_state.db'))
+            store.set_value('execution_count', 1)
+            notifier = FakeNotifier()
+            
+            # 障害中は 'unavailable'（終了コード0）を返し、待ち時間を2倍ずつ伸ばす
+            down = FakeScraper(1.0, 'open')
+            waits = []
+            for _ in range(2):
+                status = run_check(down, notifier, store)
+                schedule_backoff(down, store, args, status)
+                if status != 'unavailable':
+                    print(f"❌ 障害中の結果が不正: {status}")
+                    return False
+                waits.append(round(float(store.get_value('next_check_after')) - time.time()))
+            if waits != [600, 1200] or notifier.site_status != [False]:
+                print(f"❌ 待ち時間・障害通知が不正: {waits}, {notifier.site_status}")
+                return False
+            
+            # 待ち時間中のcron実行はチェックを省略して記録する
+            if not backoff_active(store):
+                print("❌ 待ち時間中なのにチェックを省略しませんでした")
+                return False
+            result = store.conn.execute('SELECT result FROM run_history ORDER BY id DESC LIMIT 1').fetchone()[0]
+            if result != 'backoff':
+                print(f"❌ 実行履歴の結果が不正: {result}")
+                return False
+            
+            # 復旧したら待ち時間を消去する
+            store.set_value('next_check_after', time.time() - 1)
+            up = FakeScraper(0.0, 'closed')
+            status = run_check(up, notifier, store)
+            schedule_backoff(up, store, args, status)
+            if status != 'success' or backoff_active(store) or notifier.site_status != [False, True]:
+                print(f"❌ 復旧後の結果が不正: {status}, {store.get_value('next_check_after')!r}")
+                return False
+            store.close()
+        
+        # 従来のAPI（search_cbp501_phase3）は障害中も例外を送出せず (False, []) を返す
+        import requests
+        from cbp501_scraper import CBP501Scraper
+        
+        class DownSession:
+            def get(self, url, **kwargs):
+                raise requests.ConnectionError("EMAサイトに接続できません")
+        
+        scraper = CBP501Scraper(cache_file=None, enrich=False, watchlist=FakeScraper.watchlist)
+        scraper.session = DownSession()
+        if scraper.search_cbp501_phase3() != (False, []):
+            print("❌ 障害中の search_cbp501_phase3 の結果が不正")
+            return False
+        
+        print(f"✅ 障害中の待ち時間: 正常 (待ち時間 {waits[0]}秒 → {waits[1]}秒)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ 障害中の待ち時間テスト失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 def test_cbp501_notifier():
     """CBP501 Discord通知機能のテスト"""
     print("\n=== CBP501 Discord通知機能テスト ===")
@@ -181,6 +1156,22 @@ def main():
     tests = [
         ("環境設定", test_environment),
         ("CBP501スクレイピング機能", test_cbp501_scraper),
+        ("並列取得の順序", test_concurrent_fetch_order),
+        ("HTTP検証子キャッシュ", test_http_cache),
+        ("記事ページ確認", test_detail_confirmation),
+        ("状態ストア", test_state_store),
+        ("常駐モードのチェックポイント", test_daemon_checkpoint),
+        ("メトリクス出力", test_metrics),
+        ("監視対象リスト", test_watchlist),
+        ("分断された表記の検出", test_split_markup_detection),
+        ("大文字小文字を無視した記事ページ候補", test_case_insensitive_links),
+        ("ページスナップショット", test_page_snapshots),
+        ("全文索引", test_news_index),
+        ("チェック間隔の伸縮", test_adaptive_scheduler),
+        ("起動前チェック", test_preflight),
+        ("通知後の起動前チェック", test_preflight_after_notification),
+        ("非同期配信", test_async_delivery),
+        ("障害中の待ち時間", test_outage_backoff),
         ("CBP501 Discord通知機能", test_cbp501_notifier),
         ("CBP501完全ワークフロー", test_cbp501_full_workflow)
     ]
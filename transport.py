@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+EMA承認監視アプリケーション - HTTP通信基盤
+スクレイパー・通知処理で共有する接続プール、再試行方針、ホストごとのサーキットブレーカー
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from metrics import CIRCUIT_TRANSITIONS, FETCH_RETRIES, HTTP_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# 再試行してよいメソッド（Webhookへの投稿などは呼び出し側で判断する）
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+# 再試行するステータスコード
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+# ホストの障害とみなすステータスコード（501などはサーバーが応答しているため含めない）
+UNAVAILABLE_STATUSES = frozenset([500, 502, 503, 504])
+
+# 既定のタイムアウト（接続, 読み込み）秒。応答しないホストで接続待ちが長引かないよう接続は短めにする
+DEFAULT_TIMEOUT = (10, 30)
+
+# 応答時間・失敗率の指数移動平均（EWMA）の平滑化係数
+HEALTH_ALPHA = 0.3
+
+# 接続プールの既定値（ホスト数: EMA・Discordなど / ホストごとの接続数）
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+
+def _retry_after(response):
+    """Retry-Afterヘッダーの秒数（無い・解析できない場合は0）"""
+    try:
+        return float(response.headers.get('Retry-After', 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    """attempt回目（0始まり）の再試行までの待ち時間（揺らぎ付きの指数バックオフ）
+
+    上限の半分を固定で待ち、残り半分を乱数にすることで、同時に失敗した要求の再送が揃わないようにする。
+    """
+    cap = min(max_delay, base_delay * (2 ** attempt))
+    return cap / 2 + random.uniform(0, cap / 2)
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """サーキットブレーカーが開いているため送信しなかった場合の例外"""
+
+class RetryPolicy:
+    """再試行の回数・待ち時間・予算クラス
+
+    再試行は要求1件ごとに budget_ratio 件分の予算が貯まり、1回ごとに1件分を使う（上限 budget_reserve 件）。
+    障害時に全コンポーネントの再試行が重なって負荷が増えるのを防ぐ。
+    """
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=30.0, budget_ratio=0.2, budget_reserve=10):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_reserve = budget_reserve
+        self._tokens = float(budget_reserve)
+        self._lock = threading.Lock()
+
+    def delay(self, attempt):
+        """attempt回目（0始まり）の再試行までの待ち時間"""
+        return backoff_delay(attempt, self.base_delay, self.max_delay)
+
+    def record_request(self):
+        """要求1件分の再試行予算を貯める"""
+        with self._lock:
+            self._tokens = min(self.budget_reserve, self._tokens + self.budget_ratio)
+
+    def acquire_retry(self):
+        """再試行1回分の予算を使う（予算が無い場合はFalse）"""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+class CircuitBreaker:
+    """連続して失敗したホストへの送信を一定時間止めるサーキットブレーカークラス
+
+    closed（通常）→ 連続 failure_threshold 回失敗で open（送信しない）→ reset_timeout 秒後に
+    half_open（1件だけ試す）→ 成功すれば closed、失敗すれば再び open。
+    """
+
+    def __init__(self, host, failure_threshold=5, reset_timeout=60.0, clock=time.monotonic):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        """状態を変更して記録（ロック内で呼ぶ）"""
+        if state != self.state:
+            logger.info(f"{self.host} のサーキットブレーカー: {self.state} → {state}")
+            CIRCUIT_TRANSITIONS.inc(host=self.host, state=state)
+            self.state = state
+
+    def allow(self):
+        """送信してよいかどうか"""
+        with self._lock:
+            if self.state == 'open':
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self._transition('half_open')
+            if self.state == 'half_open':
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        """送信に成功した"""
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self._transition('closed')
+
+    def record_failure(self):
+        """送信に失敗した（接続エラー・障害を示す5xx）"""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                self._transition('open')
+
+class HostHealth:
+    """ホストごとの応答時間と失敗率の指数移動平均（EWMA）クラス"""
+
+    def __init__(self, host, alpha=HEALTH_ALPHA):
+        self.host = host
+        self.alpha = alpha
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def observe(self, latency, failed):
+        """1回分の送信結果を反映（初回はその値をそのまま使う）"""
+        with self._lock:
+            failure = 1.0 if failed else 0.0
+            if self.samples == 0:
+                self.latency = latency
+                self.error_rate = failure
+            else:
+                self.latency += self.alpha * (latency - self.latency)
+                self.error_rate += self.alpha * (failure - self.error_rate)
+            self.samples += 1
+
+class _HTTPXStream:
+    """httpxのレスポンス本文をurllib3のレスポンスのように read() で読めるようにするラッパー"""
+
+    def __init__(self, response):
+        self._response = response
+        self._chunks = response.iter_bytes()
+        self._buffer = b''
+        self.decode_content = True
+
+    def read(self, size=-1, **kwargs):
+        while size is None or size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size is None or size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self._response.close()
+
+class HTTP2Adapter(BaseAdapter):
+    """httpxでHTTP/2接続を多重化して送信するrequests用アダプター"""
+
+    def __init__(self, pool_maxsize=DEFAULT_POOL_MAXSIZE, http2=True):
+        """httpx（HTTP/2の場合はh2も）が無い場合はImportErrorを送出する"""
+        # HTTP/2を使う場合だけ読み込む（起動時間に含めない）
+        import httpx
+
+        super().__init__()
+        self.httpx = httpx
+        limits = httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize)
+        self.client = httpx.Client(http2=http2, limits=limits)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        httpx = self.httpx
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        try:
+            httpx_request = self.client.build_request(
+                request.method, request.url, headers=dict(request.headers), content=request.body,
+                timeout=timeout
+            )
+            response = self.client.send(httpx_request, stream=True)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        result = requests.Response()
+        result.status_code = response.status_code
+        # 本文はhttpxが展開済みのため圧縮形式のヘッダーは外す
+        result.headers = CaseInsensitiveDict(
+            (name, value) for name, value in response.headers.items() if name.lower() != 'content-encoding'
+        )
+        result.raw = _HTTPXStream(response)
+        result.reason = response.reason_phrase
+        result.encoding = get_encoding_from_headers(result.headers)
+        result.url = request.url
+        result.request = request
+        result.connection = self
+        return result
+
+    def close(self):
+        self.client.close()
+
+class TransportSession(requests.Session):
+    """共有の接続プールを使い、再試行方針とサーキットブレーカーに従って送信するセッション"""
+
+    def __init__(self, transport, headers=None):
+        super().__init__()
+        self.transport = transport
+        for prefix, adapter in transport.adapters.items():
+            self.mount(prefix, adapter)
+        if headers:
+            self.headers.update(headers)
+
+    def request(self, method, url, *args, retry=True, **kwargs):
+        """retry=Falseの場合は再試行しない（死活確認など）"""
+        send = super().request
+        return self.transport.execute(method, url, lambda: send(method, url, *args, **kwargs), retry)
+
+    def close(self):
+        """接続プールは他のセッションと共有しているため閉じない"""
+
+class Transport:
+    """全コンポーネントで共有するHTTP通信基盤クラス"""
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 http2=False, retry_policy=None, failure_threshold=5, reset_timeout=60.0, sleep=time.sleep):
+        """http2がTrueでもhttpxが無い場合はHTTP/1.1のkeep-aliveで接続する"""
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.sleep = sleep
+        self._breakers = {}
+        self._health = {}
+        self._lock = threading.Lock()
+
+        http_adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.adapters = {'https://': http_adapter, 'http://': http_adapter}
+        self.http2 = False
+        if http2:
+            try:
+                self.adapters['https://'] = HTTP2Adapter(pool_maxsize)
+                self.http2 = True
+            except ImportError as e:
+                logger.warning(f"HTTP/2を利用できないためHTTP/1.1で接続します（httpx[http2] が必要）: {e}")
+
+    def session(self, headers=None):
+        """共有の接続プールを使うセッションを作成（既定のヘッダーはセッションごと）"""
+        return TransportSession(self, headers)
+
+    def breaker(self, host):
+        """ホストのサーキットブレーカーを取得"""
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(host, self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    def health(self, host):
+        """ホストの応答状況（応答時間・失敗率のEWMA）を取得"""
+        with self._lock:
+            if host not in self._health:
+                self._health[host] = HostHealth(host)
+            return self._health[host]
+
+    def probe(self, url, timeout=10):
+        """HEADリクエスト1回（再試行なし）でホストが応答するかを確認
+
+        サーキットブレーカーが開いている間は送信せずにFalseを返す。half_openの場合はこれが試行の1件になる。
+        """
+        try:
+            response = self.session().head(url, timeout=timeout, retry=False)
+        except requests.exceptions.RequestException as e:
+            logger.info(f"{url} の死活確認に失敗: {e}")
+            return False
+        response.close()
+        logger.info(f"{url} の死活確認: {response.status_code}")
+        return response.status_code not in UNAVAILABLE_STATUSES
+
+    def _can_retry(self, method, attempt, url):
+        """再試行できるかどうか（回数と予算を確認）"""
+        if method.upper() not in IDEMPOTENT_METHODS or attempt + 1 >= self.retry_policy.max_attempts:
+            return False
+        if not self.retry_policy.acquire_retry():
+            logger.warning(f"再試行の予算を使い切ったため再試行しません: {url}")
+            return False
+        return True
+
+    def execute(self, method, url, send, retry=True):
+        """送信処理 send() を再試行方針とサーキットブレーカーに従って実行"""
+        host = urlparse(url).netloc
+        breaker = self.breaker(host)
+        health = self.health(host)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                HTTP_REQUESTS.inc(host=host, status='circuit_open')
+                raise CircuitOpenError(f"{host} への送信を一時停止しています（サーキットブレーカー作動中）")
+
+            self.retry_policy.record_request()
+            started_at = time.perf_counter()
+            try:
+                response = send()
+            except requests.exceptions.RequestException as e:
+                health.observe(time.perf_counter() - started_at, failed=True)
+                breaker.record_failure()
+                HTTP_REQUESTS.inc(host=host, status='error')
+                if not retry or not self._can_retry(method, attempt, url):
+                    raise
+                logger.warning(f"リクエスト失敗 ({url}, 試行 {attempt + 1}/{self.retry_policy.max_attempts}): {e}")
+            else:
+                unavailable = response.status_code in UNAVAILABLE_STATUSES
+                health.observe(time.perf_counter() - started_at, failed=unavailable)
+                HTTP_REQUESTS.inc(host=host, status=response.status_code)
+                if unavailable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if (response.status_code not in RETRY_STATUSES or not retry
+                        or not self._can_retry(method, attempt, url)):
+                    return response
+                logger.warning(
+                    f"リクエスト失敗 ({url}, 試行 {attempt + 1}/{self.retry_policy.max_attempts}): "
+                    f"{response.status_code}"
+                )
+                delay = min(self.retry_policy.max_delay, max(self.retry_policy.delay(attempt), _retry_after(response)))
+                response.close()
+                FETCH_RETRIES.inc(url=url)
+                self.sleep(delay)
+                attempt += 1
+                continue
+
+            FETCH_RETRIES.inc(url=url)
+            self.sleep(self.retry_policy.delay(attempt))
+            attempt += 1
+
+    def close(self):
+        """接続プールを閉じる"""
+        for adapter in set(self.adapters.values()):
+            adapter.close()
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+def get_transport():
+    """アプリ全体で共有する通信基盤を取得（HTTP2=1 でHTTP/2を有効にする）"""
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = Transport(http2=os.getenv('HTTP2', '').lower() in ('1', 'true', 'yes'))
+        return _default_transport
+
+def configure_transport(**kwargs):
+    """共有の通信基盤を設定し直す（以降に作成するセッションから有効）"""
+    global _default_transport
+    with _default_lock:
+        _default_transport = Transport(**kwargs)
+        return _default_transport
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+CBP501三相治験監視アプリケーション - 監視対象リスト
+設定ファイルの化合物・別名・治験段階から検出ルールを作り、1回の走査ですべてのルールを評価する
+"""
+
+import json
+import logging
+import os
+import re
+from keyword_matcher import MultiPatternMatcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WATCHLIST_FILE = 'watchlist.json'
+
+# 設定ファイルが無い場合の監視対象（従来のCBP501三相治験のみ）
+DEFAULT_WATCH_RULES = [
+    {'name': 'CBP501', 'aliases': ['CBP501'], 'phases': ['Phase III']},
+]
+
+class WatchRule:
+    """1つの化合物の検出ルールクラス（別名のいずれかと治験段階のいずれかが揃えば検出）"""
+
+    def __init__(self, name, aliases=None, phases=None):
+        """phasesが空の場合は別名だけで検出する"""
+        if not name:
+            raise ValueError("監視対象の名前を指定してください")
+        self.name = name
+        self.aliases = list(dict.fromkeys([name] + list(aliases or [])))
+        self.phases = list(dict.fromkeys(phases or []))
+
+    @property
+    def subject(self):
+        """状態ストアでのステータスのキー（例: 'cbp501'）"""
+        return re.sub(r'\W+', '_', self.name.lower()).strip('_')
+
+class WatchMatch:
+    """ルールに一致した結果（一致した別名・治験段階）"""
+
+    def __init__(self, rule, alias, phase):
+        self.rule = rule
+        self.alias = alias
+        self.phase = phase
+
+    @property
+    def keywords(self):
+        """一致したキーワード（文字列）"""
+        return [value.decode('utf-8') for value in (self.alias, self.phase) if value]
+
+class Watchlist:
+    """全ルールの別名・治験段階を1つのマッチャーにまとめた監視対象リストクラス
+
+    化合物を増やしてもページの取得・走査は1回のままで、ルールの評価だけが増える。
+    """
+
+    def __init__(self, rules, ignore_case=False):
+        self.rules = list(rules)
+        if not self.rules:
+            raise ValueError("監視対象を1つ以上指定してください")
+        self.ignore_case = ignore_case
+
+        # ルール間で共通のパターン（大文字小文字を無視する場合は表記違いも）は1つにまとめる
+        self._canonical = {}
+        patterns = {}
+        for rule in self.rules:
+            for value in rule.aliases + rule.phases:
+                pattern = value.encode('utf-8')
+                key = pattern.lower() if ignore_case else pattern
+                self._canonical[pattern] = patterns.setdefault(key, pattern)
+        self.matcher = MultiPatternMatcher(list(patterns.values()), ignore_case)
+
+        # 表記の途中（文字種の変わり目）でタグや文字参照に分断された箇所を探す正規表現（例: 'CBP<span>501'）
+        flags = re.IGNORECASE if ignore_case else 0
+        self._split = {}
+        for pattern in patterns.values():
+            fragments = _fragments(pattern.decode('utf-8'))
+            if fragments:
+                alternatives = b'|'.join(re.escape(fragment.encode('utf-8')) for fragment in fragments)
+                self._split[pattern] = re.compile(b'(?:' + alternatives + b')[<&]', flags)
+
+    @classmethod
+    def from_config(cls, config):
+        """設定（辞書）から作成"""
+        rules = [
+            WatchRule(entry['name'], entry.get('aliases'), entry.get('phases'))
+            for entry in config.get('compounds', [])
+        ]
+        return cls(rules, ignore_case=bool(config.get('ignore_case', False)))
+
+    def stream(self, max_positions=50):
+        """レスポンスをチャンク単位で走査するスキャナーを作成"""
+        return self.matcher.stream(max_positions)
+
+    def search(self, data):
+        """パターンごとの出現位置を返す"""
+        return self.matcher.search_all(data)
+
+    def positions(self, hits, pattern):
+        """出現位置の辞書からパターンの位置を取り出す
+
+        大文字小文字を無視する場合、出現位置はルール間でまとめた代表の表記で記録されるため、
+        ルールの表記（WatchMatch.aliasなど）から代表の表記に読み替えて引く。
+        """
+        return hits.get(self._canonical.get(pattern, pattern), [])
+
+    def contains(self, pattern, text):
+        """テキストにパターン（バイト列）が含まれるか（大文字小文字の設定に従う）"""
+        keyword = pattern.decode('utf-8')
+        if self.ignore_case:
+            return keyword.lower() in text.lower()
+        return keyword in text
+
+    def mentions(self, rule, text):
+        """テキストにルールの別名のいずれかが含まれるか"""
+        return any(self.contains(alias.encode('utf-8'), text) for alias in rule.aliases)
+
+    def evaluate(self, hits, verify=None):
+        """出現位置からルールを評価し、一致した WatchMatch のリストを返す
+
+        verify(パターン, 位置) を渡すと、そのパターンの出現のうち1つでも確認できたものだけを一致として扱う。
+        """
+        verified = {}
+
+        def confirmed(pattern):
+            pattern = self._canonical[pattern]
+            if pattern not in hits:
+                return False
+            if verify is None:
+                return True
+            if pattern not in verified:
+                verified[pattern] = any(verify(pattern, position) for position in hits[pattern])
+            return verified[pattern]
+
+        matches = []
+        for rule in self.rules:
+            alias = next((a for a in (v.encode('utf-8') for v in rule.aliases) if confirmed(a)), None)
+            if alias is None:
+                continue
+            phase = None
+            if rule.phases:
+                phase = next((p for p in (v.encode('utf-8') for v in rule.phases) if confirmed(p)), None)
+                if phase is None:
+                    continue
+            matches.append(WatchMatch(rule, alias, phase))
+        return matches
+
+    def split_rules(self, hits, body, matches):
+        """matches（一致したWatchMatch）に含まれず、表記がタグや文字参照で分断されて出現している可能性のあるルール
+
+        ストリーム検出では、生のHTML上で分断された表記（例: 'CBP<span>501</span>'）は一致しないため、
+        このようなルールはページ全体のテキストで確認し直す。別名と治験段階のそれぞれが出現しているか
+        分断された形で見つかり、少なくとも1つが分断されている場合だけを対象とする
+        （治験段階だけが出現するページや、別名がタグ属性にだけ出現するページは対象外）。
+        """
+        matched = {match.rule.name for match in matches}
+
+        def state(values):
+            patterns = [self._canonical[value.encode('utf-8')] for value in values]
+            if any(pattern in hits for pattern in patterns):
+                return 'hit'
+            if any(pattern in self._split and self._split[pattern].search(body) for pattern in patterns):
+                return 'split'
+            return None
+
+        rules = []
+        for rule in self.rules:
+            if rule.name in matched:
+                continue
+            states = [state(rule.aliases)] + ([state(rule.phases)] if rule.phases else [])
+            if None not in states and 'split' in states:
+                rules.append(rule)
+        return rules
+
+def _fragments(value):
+    """表記を文字種（英字・数字・その他）の変わり目で区切った先頭部分（例: 'CBP-501' → 'CBP', 'CBP-'）"""
+    def kind(char):
+        return 'alpha' if char.isalpha() else 'digit' if char.isdigit() else 'other'
+    return [value[:i] for i in range(1, len(value)) if kind(value[i - 1]) != kind(value[i])]
+
+def load_watchlist(file_path=DEFAULT_WATCHLIST_FILE):
+    """設定ファイルから監視対象リストを読み込む（無い・読めない場合は既定のCBP501のみ）"""
+    try:
+        if file_path and os.path.exists(file_path):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                watchlist = Watchlist.from_config(json.load(f))
+            logger.info(f"監視対象リストを読み込みました: {len(watchlist.rules)}件")
+            return watchlist
+    except Exception as e:
+        logger.error(f"{file_path} の読み込みに失敗したため既定の監視対象を使用します: {e}")
+    return Watchlist.from_config({'compounds': DEFAULT_WATCH_RULES})